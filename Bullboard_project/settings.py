@@ -51,6 +51,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'bboard.metrics.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -60,6 +61,9 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Add Server-Timing header with request metrics to every response
+METRICS_SERVER_TIMING = DEBUG
+
 ROOT_URLCONF = 'Bullboard_project.urls'
 
 TEMPLATES = [
@@ -88,9 +92,48 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    },
+    # Read-only views read from here, point REPLICA_DATABASE_NAME at a copy of db.sqlite3
+    # to try it locally with two files. Tests read the default test database through it.
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.getenv('REPLICA_DATABASE_NAME', BASE_DIR / 'db.sqlite3'),
+        'TEST': {
+            'MIRROR': 'default',
+        },
+    },
 }
 
+DATABASE_ROUTERS = ['bboard.replica.ReplicaRouter']
+REPLICA_DATABASE_ALIAS = 'replica'
+
+# Users read from default for this long after a write, replica responses are cached no longer
+REPLICA_PIN_TIMEOUT = 10  # secs
+
+# Cache
+# https://docs.djangoproject.com/en/4.0/topics/cache/
+
+# LocMemCache is per process, fine for a single runserver. In production both caches must be
+# shared by the web processes and the qcluster (Redis, Memcached): versions bumped by a process,
+# e.g. by bboard.tasks.make_post_thumbnail in a cluster worker, are not seen by the others,
+# which serve stale responses until TIMEOUT.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Responses of /posts/ endpoints, least recently used entries are culled past MAX_ENTRIES
+    'posts': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'posts',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000,
+        },
+    },
+}
+
+POSTS_CACHE_ALIAS = 'posts'
+
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
 
@@ -129,6 +172,18 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = 'media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Inline uploads larger than this are streamed to a temporary file instead of memory
+FILE_UPLOAD_MAX_MEMORY_SIZE = 256 * 1024
+
+# Part files of chunked uploads, see bboard.uploads
+CHUNKED_UPLOAD_DIR = os.path.join(BASE_DIR, 'upload_chunks')
+CHUNKED_UPLOAD_MAX_SIZE = 100 * 1024 * 1024
+# Uploads no chunk was sent to for this long are deleted by bboard.tasks.clear_abandoned_uploads
+CHUNKED_UPLOAD_EXPIRY = 24 * 60 * 60  # secs
+
+# Bounding box of thumbnails made from image uploads (needs Pillow, without it a warning is logged)
+THUMBNAIL_SIZE = (320, 320)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.0/ref/settings/#default-auto-field
 
@@ -136,16 +191,39 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
+        'bboard.authentication.ClaimsJWTAuthentication',
         'rest_framework.authentication.TokenAuthentication',
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
     'DEFAULT_FILTER_BACKENDS': (
         'django_filters.rest_framework.DjangoFilterBackend',
     ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
+    'DEFAULT_THROTTLE_CLASSES': (
+        'bboard.throttling.ReadRateThrottle',
+    ),
+    # See bboard.throttling, None turns a throttle off. Bulk creates count every object,
+    # one larger than the create rate is always refused
+    'DEFAULT_THROTTLE_RATES': {
+        'anon_read': '1000/min',
+        'user_read': '2000/min',
+        'post_create': '100/hour',
+        'comment_create': '300/hour',
+    },
 }
 
+# Cache of the throttle counters, must be shared by all processes to be exact
+THROTTLE_CACHE_ALIAS = 'default'
+
+# Dotted path of a bboard.search.BaseSearchBackend subclass, None picks one for the database vendor
+POST_SEARCH_BACKEND = None
+
+# Seconds other processes may serve a changed Category from bboard.categories.registry
+CATEGORY_REGISTRY_TIMEOUT = 60
+
+# Max objects per request to the bulk endpoints
+BULK_MAX_OBJECTS = 1000
+
 LOGOUT_REDIRECT_URL = '/'
 LOGIN_REDIRECT_URL = '/'
 
@@ -192,6 +270,9 @@ SIMPLE_JWT = {
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1),
 }
 
+# Users of JWTs without username/is_staff claims are cached in-process for this long, 0 disables
+JWT_USER_CACHE_TIMEOUT = 30  # secs
+
 # Custom User model
 AUTH_USER_MODEL = 'bboard.User'
 
@@ -207,5 +288,37 @@ Q_CLUSTER = {
     'has_replica': True,
 }
 
+# Users per django_q task of the weekly digest, each task reuses one mail connection
+WEEKLY_DIGEST_CHUNK_SIZE = 200
+
+# Table dumps: rows fetched and compressed per chunk, files are written under MEDIA_ROOT
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_DIR = 'exports'
+
+# NDJSON imports: rows validated and inserted per batch (at most BULK_MAX_OBJECTS), rows per transaction
+IMPORT_BATCH_SIZE = 1000
+IMPORT_TRANSACTION_SIZE = 10000
+
+# Latest comments embedded in a post detail page
+COMMENT_PREVIEW_SIZE = 5
+
+# Rows of each kind per /sync/ response
+SYNC_BATCH_SIZE = 500
+
+# Links in emails point here
+SITE_URL = os.getenv('SITE_URL', 'http://127.0.0.1:8000')
+
+# Comments on the same Post within the window are sent to its owner in one mail, 0 sends right away
+COMMENT_NOTIFICATION_WINDOW = 60  # secs
+
+# /private/stream/ of new comments: connection lifetime before the client reconnects,
+# seconds between database checks for comments written by other processes (secs) and client retry delay (ms)
+COMMENT_STREAM_TIMEOUT = 300
+COMMENT_STREAM_POLL_INTERVAL = 15
+COMMENT_STREAM_RETRY = 3000
+# Open streams per process, more get 503. Each holds a WSGI worker thread for up to
+# COMMENT_STREAM_TIMEOUT, keep it well below the threads of a process. Not served under ASGI.
+COMMENT_STREAM_MAX_CONNECTIONS = 4
+
 if DEBUG:
     EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
@@ -1,14 +1,24 @@
 from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
+from rest_framework.routers import DefaultRouter
+
+from bboard.views import ClaimsTokenObtainPairView, ClaimsTokenRefreshView, UserViewSet
+
+# djoser's users/ with the User row loaded for every request
+users_router = DefaultRouter()
+users_router.register('users', UserViewSet)
 
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api-auth/', include('rest_framework.urls')),
-    path('auth/', include('djoser.urls')),
+    path('auth/', include(users_router.urls)),
     path('auth/', include('djoser.urls.authtoken')),
+    # Overrides djoser's jwt/create/ to issue tokens with user claims
+    re_path(r'^auth/jwt/create/?', ClaimsTokenObtainPairView.as_view(), name='jwt-create'),
+    re_path(r'^auth/jwt/refresh/?', ClaimsTokenRefreshView.as_view(), name='jwt-refresh'),
     path('auth/', include('djoser.urls.jwt')),
     path('', include('bboard.urls')),
 ]
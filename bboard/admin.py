@@ -1,6 +1,8 @@
 from django.contrib import admin
+from django.db import transaction
+from django_q.tasks import async_task
 
-from .models import Post, Comment, Category, User
+from .models import Post, Comment, Category, User, Upload, WeeklyDigest, Export
 
 
 @admin.register(Post)
@@ -18,6 +20,29 @@ class CategoryAdmin(admin.ModelAdmin):
     pass
 
 
+@admin.register(Upload)
+class UploadAdmin(admin.ModelAdmin):
+    list_display = ('filename', 'owner', 'size', 'offset', 'created')
+
+
 @admin.register(User)
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ('username', 'email', 'created_at')
+    filter_horizontal = ('categories',)
+
+
+@admin.register(WeeklyDigest)
+class WeeklyDigestAdmin(admin.ModelAdmin):
+    list_display = ('week', 'created')
+
+
+@admin.register(Export)
+class ExportAdmin(admin.ModelAdmin):
+    """Adding an Export queues the dump, the file shows up once it is written"""
+    list_display = ('table', 'format', 'created', 'finished', 'file')
+    readonly_fields = ('file', 'finished')
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if not change:
+            transaction.on_commit(lambda: async_task('bboard.tasks.run_export', obj.pk))
@@ -0,0 +1,105 @@
+"""
+Async read endpoints for ASGI deployments, same JSON as their sync counterparts.
+
+Django 4.0 has no async ORM, so nothing here queries the database from the
+event loop. Post pages found in the response cache and 304 answers are
+served without leaving it; everything else (token lookup, queries,
+serialization and rendering) runs in a single sync_to_async call instead of
+one thread hop per stage.
+"""
+import math
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, HttpResponseNotAllowed, JsonResponse
+from rest_framework.exceptions import Throttled
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from bboard.cache import (GLOBAL_VERSION_KEY, LIST_VERSION_KEY, aget_cached, aget_versions, detail_cache_key,
+                          in_process, list_cache_key, not_modified, post_version_key, request_origin,
+                          response_headers)
+from bboard.throttling import ReadRateThrottle
+from bboard.views import PostViewSet, CommentCreateView
+
+post_list_view = PostViewSet.as_view({'get': 'list'}, renderer_classes=[JSONRenderer])
+post_detail_view = PostViewSet.as_view({'get': 'retrieve'}, renderer_classes=[JSONRenderer])
+comment_list_view = CommentCreateView.as_view({'get': 'list'}, renderer_classes=[JSONRenderer])
+comment_detail_view = CommentCreateView.as_view({'get': 'retrieve'}, renderer_classes=[JSONRenderer])
+
+
+def read_only(view):
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return HttpResponseNotAllowed(['GET', 'HEAD'])
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+@sync_to_async
+def render(view, request, *args, **kwargs):
+    """Run a sync DRF view and render its response in one thread hop"""
+    return view(request, *args, **kwargs).render()
+
+
+async def throttled(request):
+    """Anonymous read budget of the responses served without DRF, None if within it"""
+    throttle = ReadRateThrottle()
+    drf_request = Request(request, authenticators=())
+    if in_process(throttle.cache):
+        allowed = throttle.allow_request(drf_request, None)
+    else:
+        allowed = await sync_to_async(throttle.allow_request)(drf_request, None)
+    if allowed:
+        return None
+    wait = throttle.wait()
+    response = JsonResponse({'detail': Throttled(wait).detail}, status=429)
+    if wait is not None:
+        response['Retry-After'] = str(math.ceil(wait))
+    return response
+
+
+async def cached_or_render(request, key, version, view, *args, **kwargs):
+    if 'HTTP_AUTHORIZATION' in request.META:
+        # Authentication and the per-user budget need the sync view
+        return await render(view, request, *args, **kwargs)
+    headers = response_headers(request, key, version)
+    if not_modified(request, headers):
+        response = HttpResponse(status=304)
+    else:
+        data = await aget_cached(key)
+        if data is None:
+            # The sync view fills the cache under the same key and throttles itself
+            return await render(view, request, *args, **kwargs)
+        response = HttpResponse(JSONRenderer().render(data), content_type='application/json')
+    throttled_response = await throttled(request)
+    if throttled_response is not None:
+        return throttled_response
+    for header, value in headers.items():
+        response[header] = value
+    return response
+
+
+@read_only
+async def post_list(request):
+    versions = await aget_versions(GLOBAL_VERSION_KEY, LIST_VERSION_KEY)
+    key = list_cache_key(versions, request.build_absolute_uri())
+    return await cached_or_render(request, key, max(versions), post_list_view)
+
+
+@read_only
+async def post_detail(request, pk):
+    versions = await aget_versions(GLOBAL_VERSION_KEY, post_version_key(pk))
+    key = detail_cache_key(versions, request_origin(request), pk, request.META.get('QUERY_STRING', ''))
+    return await cached_or_render(request, key, max(versions), post_detail_view, pk=pk)
+
+
+@read_only
+async def comment_list(request):
+    return await render(comment_list_view, request)
+
+
+@read_only
+async def comment_detail(request, pk):
+    return await render(comment_detail_view, request, pk=pk)
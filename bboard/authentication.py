@@ -0,0 +1,63 @@
+import time
+
+from django.conf import settings
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+
+class UserCache:
+    """Short-lived in-process cache of users for tokens issued without claims"""
+    max_size = 10000
+
+    def __init__(self):
+        self.users = {}
+
+    def get(self, user_id):
+        entry = self.users.get(user_id)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+        return None
+
+    def set(self, user_id, user, timeout):
+        if len(self.users) >= self.max_size:
+            self.users.clear()
+        self.users[user_id] = (time.monotonic() + timeout, user)
+
+    def clear(self):
+        self.users.clear()
+
+
+user_cache = UserCache()
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication without a User query per request.
+    The signature is checked as usual, then request.user is a TokenUser built
+    from the token claims (id, username, is_staff) put by
+    ClaimsTokenObtainPairSerializer: good for permissions and `owner_id`, it
+    has no row to save. Views that read or write the User load it by pk.
+    Claims are as fresh as the token: a user deactivated or demoted keeps
+    them until the access token expires (ACCESS_TOKEN_LIFETIME), refresh
+    re-reads them, see ClaimsTokenRefreshSerializer. Tokens without the
+    claims fall back to a DB fetch cached for JWT_USER_CACHE_TIMEOUT seconds.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken('Token contained no recognizable user identification')
+
+        if 'username' in validated_token and 'is_staff' in validated_token:
+            return TokenUser(validated_token)
+
+        timeout = settings.JWT_USER_CACHE_TIMEOUT
+        user = user_cache.get(user_id) if timeout else None
+        if user is None:
+            user = super().get_user(validated_token)
+            if timeout:
+                user_cache.set(user_id, user, timeout)
+        return user
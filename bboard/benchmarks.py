@@ -0,0 +1,286 @@
+"""Scenarios for the `manage.py benchmark` command"""
+import asyncio
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import DEFAULT_DB_ALIAS, connection, connections, models
+from django.test import AsyncClient, Client
+from django.test.utils import CaptureQueriesContext
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.tokens import AccessToken
+
+from bboard.authentication import ClaimsJWTAuthentication, user_cache
+from bboard.cache import get_cache
+from bboard.categories import registry as category_registry
+from bboard.models import Post, User, Category, Comment
+from bboard.pagination import KeysetPagination
+from bboard.search import get_backend as get_search_backend
+from bboard.serializers import PostListSerializer, CommentSerializer, values_lookups
+
+SCENARIOS = {}
+
+
+def scenario(name):
+    """Register a benchmark scenario under `name`"""
+    def decorator(func):
+        SCENARIOS[name] = func
+        return func
+    return decorator
+
+
+@contextmanager
+def scratch_database():
+    """
+    Run against a throwaway test database so real data is never touched.
+    Mirrors of the default database, the replica, point at it too, as in tests.
+    """
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    mirrors = {alias: connections[alias].settings_dict.copy() for alias in connections
+               if connections[alias].settings_dict['TEST'].get('MIRROR') == DEFAULT_DB_ALIAS}
+    for alias in mirrors:
+        connections[alias].close()
+        connections[alias].creation.set_as_test_mirror(connection.settings_dict)
+    try:
+        yield
+    finally:
+        for alias, settings_dict in mirrors.items():
+            connections[alias].close()
+            connections[alias].settings_dict = settings_dict
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def without_response_cache():
+    """Measure the views themselves rather than cache hits"""
+    return override_settings(CACHES={
+        **settings.CACHES,
+        settings.POSTS_CACHE_ALIAS: {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+    })
+
+
+def without_throttling():
+    """Benchmarks send far more requests than any client is allowed to"""
+    return override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {}})
+
+
+def percentile(timings, percent):
+    """Nearest-rank percentile of sorted `timings`"""
+    return timings[max(0, -(-len(timings) * percent // 100) - 1)]
+
+
+def measure(func, repeat):
+    """Call `func` `repeat` times, return latency stats in milliseconds and throughput"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        'min': round(timings[0], 3),
+        'p50': round(percentile(timings, 50), 3),
+        'p95': round(percentile(timings, 95), 3),
+        'p99': round(percentile(timings, 99), 3),
+        'max': round(timings[-1], 3),
+        'rps': round(len(timings) * 1000 / sum(timings), 1),
+    }
+
+
+def seed_data(users=1, categories=1, posts=0, comments=0, seed=0):
+    """
+    Bulk insert the given volumes of rows, posts and comments are spread
+    over users and categories at random (reproducible with `seed`).
+    bulk_create sends no signals, so counters and the search index are
+    rebuilt once at the end.
+    """
+    rng = random.Random(seed)
+    password = make_password(None)
+    user_objs = User.objects.bulk_create(
+        (User(username=f'bench{i}', email=f'bench{i}@mail.ru', password=password) for i in range(users)),
+        batch_size=1000,
+    )
+    category_objs = Category.objects.bulk_create(
+        (Category(name=f'Category {i}') for i in range(categories)),
+        batch_size=1000,
+    )
+    Post.objects.bulk_create(
+        (Post(owner=rng.choice(user_objs), category=rng.choice(category_objs),
+              title=f'Title {i}', text=f'text {i}') for i in range(posts)),
+        batch_size=1000,
+    )
+    post_ids = list(Post.objects.values_list('pk', flat=True))
+    if post_ids:
+        Comment.objects.bulk_create(
+            (Comment(owner=rng.choice(user_objs), post_id=rng.choice(post_ids),
+                     text=f'comment {i}', accepted=rng.random() < 0.5) for i in range(comments)),
+            batch_size=1000,
+        )
+    Post.objects.recompute_comment_counters()
+    get_search_backend().rebuild()
+    category_registry.clear()
+    return user_objs
+
+
+@scenario('pagination')
+@without_response_cache()
+def pagination_scenario(options):
+    """Latency of page number vs keyset pagination across page depth"""
+    seed_data(posts=options['posts'])
+    client = Client()
+    url = reverse('posts-list')
+    page_size = KeysetPagination.page_size
+    keyset = KeysetPagination()
+    ordered = Post.objects.order_by(*keyset.ordering)
+
+    results = []
+    depth = 1
+    while depth * page_size <= options['posts']:
+        last = ordered[depth * page_size - 1]
+        cursor = keyset.encode_cursor(keyset.get_position(last))
+        results.append({
+            'page': depth + 1,
+            'page_number': measure(lambda: client.get(url, {'page': depth + 1}), options['repeat']),
+            'keyset': measure(lambda: client.get(url, {'cursor': cursor}), options['repeat']),
+        })
+        depth *= 10
+    return results
+
+
+@scenario('auth')
+def auth_scenario(options):
+    """Per-request cost of JWT authentication: DB user lookup vs token claims"""
+    user = User.objects.create_user(username='bench', email='bench@mail.ru')
+    user_cache.clear()
+    factory = APIRequestFactory()
+    results = []
+    for name, authentication, token in (
+        ('simplejwt', JWTAuthentication(), user.token),
+        ('claims', ClaimsJWTAuthentication(), user.token),
+        ('claims_without_user_claims', ClaimsJWTAuthentication(), str(AccessToken.for_user(user))),
+    ):
+        def authenticate():
+            request = Request(factory.get('/', HTTP_AUTHORIZATION=f'JWT {token}'))
+            authentication.authenticate(request)
+
+        with CaptureQueriesContext(connection) as queries:
+            authenticate()
+        results.append({
+            'authentication': name,
+            'queries': len(queries),
+            'latency': measure(authenticate, options['repeat']),
+        })
+    return results
+
+
+@scenario('api')
+@without_response_cache()
+def api_scenario(options):
+    """Latency, throughput and queries per request of the main API endpoints"""
+    users = seed_data(options['users'], options['categories'], options['posts'], options['comments'], options['seed'])
+    client = Client()
+    # The owner of most posts has the busiest private page
+    owner = User.objects.filter(pk__in=[user.pk for user in users]).annotate(
+        posts=models.Count('post')
+    ).order_by('-posts').first()
+    post = Post.objects.order_by('-comment_count').first()
+    auth = {'HTTP_AUTHORIZATION': f'JWT {owner.token}'}
+
+    requests = (
+        ('GET /posts/', lambda: client.get(reverse('posts-list'))),
+        ('GET /posts/{pk}/', lambda: client.get(reverse('posts-detail', args=(post.pk,)))),
+        ('GET /comment/', lambda: client.get(reverse('comment-list'), **auth)),
+        ('POST /comment/', lambda: client.post(reverse('comment-list'), {'post': post.pk, 'text': 'benchmark'}, **auth)),
+        ('GET /private/', lambda: client.get(reverse('private-list'), **auth)),
+    )
+    results = []
+    for name, request in requests:
+        with CaptureQueriesContext(connection) as queries:
+            response = request()
+        results.append({
+            'request': name,
+            'status': response.status_code,
+            'queries': len(queries),
+            'latency': measure(request, options['repeat']),
+        })
+    return results
+
+
+def measure_concurrent(client, url, repeat, concurrency):
+    """Send `repeat` requests through AsyncClient, `concurrency` at a time, return throughput"""
+    async def run():
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def request():
+            async with semaphore:
+                await client.get(url)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(request() for _ in range(repeat)))
+        return time.perf_counter() - start
+
+    return {'rps': round(repeat / async_to_sync(run)(), 1)}
+
+
+@scenario('asgi')
+def asgi_scenario(options):
+    """
+    Throughput of the post endpoints through the WSGI handler (sequential) and
+    the ASGI handler (concurrent), sync views vs their async counterparts,
+    with a cold and a warm response cache. In-process, so it shows handler and
+    thread hop overhead, not network-bound slow clients.
+    """
+    seed_data(options['users'], options['categories'], options['posts'], options['comments'], options['seed'])
+    post = Post.objects.order_by('-comment_count').first()
+    client = Client()
+    async_client = AsyncClient()
+
+    results = []
+    for name, args in (('posts-list', ()), ('posts-detail', (post.pk,))):
+        sync_url = reverse(name, args=args)
+        async_url = reverse(f'async-{name}', args=args)
+        for cached in (False, True):
+            with (override_settings() if cached else without_response_cache()):
+                get_cache().clear()
+                results.append({
+                    'endpoint': name,
+                    'cached': cached,
+                    'wsgi': {'rps': measure(lambda: client.get(sync_url), options['repeat'])['rps']},
+                    'asgi': measure_concurrent(async_client, sync_url, options['repeat'], options['concurrency']),
+                    'asgi_async_view': measure_concurrent(async_client, async_url, options['repeat'],
+                                                          options['concurrency']),
+                })
+    return results
+
+
+@scenario('serialization')
+def serialization_scenario(options):
+    """Per-row cost of serializing model instances vs values() rows, query included"""
+    seed_data(options['users'], options['categories'], options['posts'], options['comments'], options['seed'])
+    rows = min(options['posts'], 1000)
+    results = []
+    for serializer_class, queryset in (
+        (PostListSerializer, Post.objects.select_related('owner').order_by('-created', '-id')),
+        (CommentSerializer, Comment.objects.order_by('-created', '-id')),
+    ):
+        instances = measure(lambda: serializer_class(queryset[:rows], many=True).data, options['repeat'])
+        values = queryset.values(*values_lookups(serializer_class))
+        fast = measure(lambda: serializer_class(values[:rows], many=True).data, options['repeat'])
+        results.append({
+            'serializer': serializer_class.__name__,
+            'rows': rows,
+            'instances_us_per_row': round(instances['p50'] * 1000 / rows, 2),
+            'values_us_per_row': round(fast['p50'] * 1000 / rows, 2),
+        })
+    return results
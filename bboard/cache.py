@@ -0,0 +1,161 @@
+"""
+Response cache for the read-heavy Post endpoints.
+
+Cached entries are keyed by version stamps instead of being deleted on write:
+a write bumps the matching stamp and every key built from the old one is
+never read again and ages out of the backend (TTL/LRU are the backend's job,
+see CACHES['posts']). The stamps double as ETag and Last-Modified values, so
+conditional requests are answered before any query or serialization.
+"""
+import hashlib
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+GLOBAL_VERSION_KEY = 'posts:version'
+LIST_VERSION_KEY = 'posts:list-version'
+
+
+def get_cache():
+    return caches[settings.POSTS_CACHE_ALIAS]
+
+
+def post_version_key(pk):
+    return f'posts:version:{pk}'
+
+
+def get_versions(*keys):
+    """Return stamps for `keys`, starting a fresh one for missing or evicted keys"""
+    cache = get_cache()
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            version = time.time_ns()
+            cache.add(key, version, timeout=None)
+            # Re-read in case another process won the race, DummyCache keeps nothing
+            versions[key] = cache.get(key, version)
+    return [versions[key] for key in keys]
+
+
+def in_process(cache):
+    """In-process backends never block, async code can call them without a thread"""
+    return isinstance(cache, (LocMemCache, DummyCache))
+
+
+async def aget_versions(*keys):
+    """get_versions for async views"""
+    if not in_process(get_cache()):
+        return await sync_to_async(get_versions)(*keys)
+    return get_versions(*keys)
+
+
+async def aget_cached(key):
+    cache = get_cache()
+    if not in_process(cache):
+        return await cache.aget(key)
+    return cache.get(key)
+
+
+def list_cache_key(versions, uri):
+    return 'posts:list:{}:{}:{}'.format(*versions, hashlib.md5(uri.encode()).hexdigest())
+
+
+def request_origin(request):
+    """Responses hold absolute URLs of uploads and pages, those of other hosts are kept apart"""
+    return f'{request.scheme}://{request.get_host()}'
+
+
+def detail_cache_key(versions, origin, pk, query=''):
+    """
+    Same key for the sync and async detail views, `origin` of request_origin,
+    `query` tells apart ?fields= and ?expand= variants
+    """
+    key = 'posts:detail:{}:{}:{}:{}'.format(*versions, hashlib.md5(origin.encode()).hexdigest(), pk)
+    return f'{key}:{hashlib.md5(query.encode()).hexdigest()}' if query else key
+
+
+def response_headers(request, key, version):
+    """ETag and Last-Modified of a cached response"""
+    # Same data is rendered differently per format, keep ETags apart
+    etag = quote_etag(hashlib.md5(f'{key}:{request.META.get("HTTP_ACCEPT", "")}'.encode()).hexdigest())
+    return {'ETag': etag, 'Last-Modified': http_date(version // 10 ** 9)}
+
+
+def not_modified(request, headers):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match is not None:
+        etag = headers['ETag']
+        return etag in (tag.strip() for tag in if_none_match.split(',')) or if_none_match.strip() == '*'
+    if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    last_modified = parse_http_date_safe(headers['Last-Modified'])
+    return if_modified_since is not None and last_modified <= if_modified_since
+
+
+def bump_versions(*keys):
+    version = time.time_ns()
+    get_cache().set_many({key: version for key in keys}, timeout=None)
+
+
+def invalidate_posts(*post_ids):
+    """Post changed: post list and the detail pages of `post_ids`"""
+    bump_versions(LIST_VERSION_KEY, *(post_version_key(pk) for pk in post_ids))
+
+
+def invalidate_post_details(*post_ids):
+    """Only something embedded in the detail page changed, e.g. comments"""
+    if post_ids:
+        bump_versions(*(post_version_key(pk) for pk in post_ids))
+
+
+def invalidate_all():
+    """Something embedded everywhere changed, e.g. a Category"""
+    bump_versions(GLOBAL_VERSION_KEY)
+
+
+class CachedResponseMixin:
+    """Serve list/retrieve from the posts cache with ETag/Last-Modified support"""
+
+    def list(self, request, *args, **kwargs):
+        versions = get_versions(GLOBAL_VERSION_KEY, LIST_VERSION_KEY)
+        key = list_cache_key(versions, request.build_absolute_uri())
+        return self.cached_response(request, key, max(versions),
+                                    lambda: super(CachedResponseMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        versions = get_versions(GLOBAL_VERSION_KEY, post_version_key(pk))
+        key = detail_cache_key(versions, request_origin(request), pk, request.META.get('QUERY_STRING', ''))
+        return self.cached_response(request, key, max(versions),
+                                    lambda: super(CachedResponseMixin, self).retrieve(request, *args, **kwargs))
+
+    def cached_response(self, request, key, version, get_response):
+        headers = response_headers(request, key, version)
+        if not_modified(request, headers):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        cache = get_cache()
+        data = cache.get(key) if self.use_cached_response() else None
+        if data is None:
+            response = get_response()
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            cache.set(key, response.data, timeout=self.cached_response_timeout())
+        else:
+            response = Response(data)
+        for header, value in headers.items():
+            response[header] = value
+        return response
+
+    def use_cached_response(self):
+        return True
+
+    def cached_response_timeout(self):
+        return DEFAULT_TIMEOUT
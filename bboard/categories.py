@@ -0,0 +1,49 @@
+"""
+In-process registry of the Category table.
+
+Categories are few and nearly static, so every process keeps them all in
+memory: name filters become id lookups and serializers embed categories
+without a join. The registry is cleared by `signals.invalidate_category_cache`
+in the process that changed a Category, other processes reload it after
+CATEGORY_REGISTRY_TIMEOUT seconds.
+"""
+import time
+
+from django.conf import settings
+
+from bboard.models import Category
+
+
+class CategoryRegistry:
+    def __init__(self):
+        self.by_id = None
+        self.expires = 0
+
+    def load(self):
+        categories = {category.pk: category for category in Category.objects.all()}
+        # Swapped in at once, readers in other threads never see a half loaded registry
+        self.by_id, self.expires = categories, time.monotonic() + settings.CATEGORY_REGISTRY_TIMEOUT
+        return categories
+
+    def categories(self):
+        if self.by_id is None or self.expires < time.monotonic():
+            return self.load()
+        return self.by_id
+
+    def get(self, pk):
+        """Category by id, reloads once for a category created by another process"""
+        category = self.categories().get(pk)
+        if category is None:
+            category = self.load().get(pk)
+        return category
+
+    def ids(self, names):
+        """Ids of categories with the given names, unknown names are skipped"""
+        names = set(names)
+        return [category.pk for category in self.categories().values() if category.name in names]
+
+    def clear(self):
+        self.by_id = None
+
+
+registry = CategoryRegistry()
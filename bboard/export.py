@@ -0,0 +1,103 @@
+"""
+Gzipped NDJSON or CSV dumps of whole tables for analytics.
+
+Rows are read with `.iterator(chunk_size=EXPORT_CHUNK_SIZE)`, encoded and
+compressed one chunk at a time, so memory stays the same whatever the table
+size. The same generator feeds files in MEDIA_ROOT (management command and
+Export jobs queued from the admin) and the staff download endpoint.
+"""
+import csv
+import io
+import json
+import os
+import zlib
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from bboard.models import Category, Comment, Export, Post, User
+
+# Passwords and other credentials are never exported
+TABLES = {
+    'posts': (Post, ('id', 'owner_id', 'category_id', 'title', 'text', 'upload', 'thumbnail', 'created',
+                     'updated_at', 'comment_count', 'accepted_comment_count', 'last_comment_at')),
+    'comments': (Comment, ('id', 'post_id', 'owner_id', 'text', 'accepted', 'created', 'updated_at')),
+    'users': (User, ('id', 'username', 'email', 'is_active', 'is_staff', 'created_at', 'updated_at')),
+    'categories': (Category, ('id', 'name')),
+}
+FORMATS = tuple(format for format, _ in Export.FORMAT_CHOICES)
+
+
+def row_chunks(table):
+    """Rows of `table` as tuples, in lists of up to EXPORT_CHUNK_SIZE"""
+    model, fields = TABLES[table]
+    chunk_size = settings.EXPORT_CHUNK_SIZE
+    chunk = []
+    for row in model.objects.order_by('pk').values_list(*fields).iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def encode_ndjson(fields, chunks):
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    for chunk in chunks:
+        yield ''.join(encoder.encode(dict(zip(fields, row))) + '\n' for row in chunk).encode()
+
+
+def csv_value(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def encode_csv(fields, chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for chunk in chunks:
+        writer.writerows([csv_value(value) for value in row] for row in chunk)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        # Header of an empty table
+        yield buffer.getvalue().encode()
+
+
+def gzip_stream(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_stream(table, format):
+    """Gzipped dump of `table` in `format`, chunk by chunk"""
+    _, fields = TABLES[table]
+    encode = encode_ndjson if format == 'ndjson' else encode_csv
+    return gzip_stream(encode(fields, row_chunks(table)))
+
+
+def export_filename(table, format):
+    return f'{table}.{format}.gz'
+
+
+def export_to_file(table, format):
+    """Write the dump to MEDIA_ROOT/EXPORT_DIR and return its storage name"""
+    name = os.path.join(settings.EXPORT_DIR,
+                        f'{table}-{timezone.now():%Y%m%d-%H%M%S}-{os.getpid()}.{format}.gz')
+    path = default_storage.path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Renamed once complete, a reader never sees half a file
+    partial_path = path + '.part'
+    with open(partial_path, 'wb') as file:
+        for data in export_stream(table, format):
+            file.write(data)
+    os.replace(partial_path, path)
+    return name
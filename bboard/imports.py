@@ -0,0 +1,208 @@
+"""
+Bulk import of posts and comments from NDJSON, dumps of bboard.export or
+rows of a legacy board in the same shape.
+
+Rows are validated with the import serializers up to IMPORT_BATCH_SIZE at a
+time, related objects of a batch resolved with one query per field, and
+written with multi-row INSERTs, IMPORT_TRANSACTION_SIZE rows per transaction.
+The inserts send no signals: nothing is mailed and counters of the posts
+commented on, the search index and cached responses are brought up to date
+once by `finish_import`.
+The number of lines done is saved to a checkpoint file after every
+transaction, an interrupted import resumes right after the last commit.
+"""
+import gzip
+import json
+import os
+
+from django.core.management.color import no_style
+from django.db import connection, connections, router, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from bboard.cache import invalidate_all
+from bboard.models import Post, Comment, CommentNotification
+from bboard.search import get_backend as get_search_backend
+from bboard.serializers import CommentImportSerializer, PostImportSerializer
+
+TABLES = {
+    'posts': PostImportSerializer,
+    'comments': CommentImportSerializer,
+}
+
+
+def open_lines(path):
+    """Text lines of `path`, decompressed on the fly if it ends with .gz"""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, encoding='utf-8')
+
+
+def read_rows(table, lines, start=0):
+    """
+    (line number, row or None) of every non blank line after the first `start`,
+    foreign keys of dumps (`post_id`) are renamed to serializer fields (`post`)
+    """
+    model = TABLES[table].Meta.model
+    relations = {field.attname: field.name for field in model._meta.concrete_fields if field.is_relation}
+    for number, line in enumerate(lines, 1):
+        if number <= start or not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield number, None
+            continue
+        if isinstance(row, dict):
+            row = {relations.get(key, key): value for key, value in row.items()}
+        yield number, row
+
+
+def insert_objects(model, objects):
+    """
+    INSERT `objects` with their values as they are. Unlike bulk_create no
+    field's pre_save runs, so `created` keeps the date of the old board:
+    QuerySet._insert with raw=True, the insert of loaddata's raw saves.
+    """
+    connection = connections[router.db_for_write(model)]
+    for with_pk in (True, False):
+        batch = [obj for obj in objects if (obj.pk is not None) == with_pk]
+        fields = [field for field in model._meta.concrete_fields if with_pk or field is not model._meta.pk]
+        size = max(connection.ops.bulk_batch_size(fields, batch), 1)
+        for start in range(0, len(batch), size):
+            model.objects._insert(batch[start:start + size], fields=fields, using=connection.alias, raw=True)
+
+
+def import_batch(table, batch):
+    """
+    Validate and insert `batch` of (line number, row), return the number of
+    rows inserted, (line number, errors) of the rest and ids of the posts commented on
+    """
+    serializer_class = TABLES[table]
+    rejected = [(number, {'non_field_errors': ['Invalid JSON.']}) for number, row in batch if row is None]
+    batch = [(number, row) for number, row in batch if row is not None]
+    serializer = serializer_class(data=[row for _, row in batch], many=True)
+    if batch and not serializer.is_valid():
+        rejected += [(number, errors) for (number, _), errors in zip(batch, serializer.errors) if errors]
+        batch = [(number, row) for (number, row), errors in zip(batch, serializer.errors) if not errors]
+        serializer = serializer_class(data=[row for _, row in batch], many=True)
+        serializer.is_valid(raise_exception=True)
+    if not batch:
+        return 0, sorted(rejected), set()
+
+    model = serializer_class.Meta.model
+    ids = [attrs['id'] for attrs in serializer.validated_data if attrs.get('id') is not None]
+    # Ids already in the table or earlier in the batch would fail the whole transaction
+    taken = set(model.objects.filter(pk__in=ids).values_list('pk', flat=True)) if ids else set()
+    now = timezone.now()
+    objects = []
+    for (number, _), attrs in zip(batch, serializer.validated_data):
+        pk = attrs.get('id')
+        if pk is not None:
+            if pk in taken:
+                rejected.append((number, {'id': [f'{model._meta.verbose_name} with this id already exists.']}))
+                continue
+            taken.add(pk)
+        obj = model(**attrs)
+        obj.created = obj.created or now
+        obj.updated_at = now
+        objects.append(obj)
+    insert_objects(model, objects)
+    post_ids = {obj.post_id for obj in objects} if model is Comment else set()
+    return len(objects), sorted(rejected), post_ids
+
+
+def import_rows(table, rows, batch_size, transaction_size):
+    """
+    Import `rows` of `read_rows`, yield (last line number, rows inserted, rejected rows,
+    ids of the posts commented on) once every transaction of up to `transaction_size` rows is committed
+    """
+    batches = []
+    batch = []
+    size = 0
+    number = 0
+
+    def commit(last_number):
+        inserted = 0
+        rejected = []
+        post_ids = set()
+        with transaction.atomic():
+            for rows_batch in batches:
+                batch_inserted, batch_rejected, batch_post_ids = import_batch(table, rows_batch)
+                inserted += batch_inserted
+                rejected += batch_rejected
+                post_ids |= batch_post_ids
+        return last_number, inserted, rejected, post_ids
+
+    for number, row in rows:
+        batch.append((number, row))
+        size += 1
+        if len(batch) == batch_size or size == transaction_size:
+            batches.append(batch)
+            batch = []
+        if size == transaction_size:
+            yield commit(number)
+            batches = []
+            size = 0
+    if batch:
+        batches.append(batch)
+    if batches:
+        yield commit(number)
+
+
+def finish_import(tables, post_ids=()):
+    """
+    What signals do per row, once for the whole import: counters and the
+    notification start of `post_ids`, the posts commented on, search index and caches
+    """
+    post_ids = sorted(post_ids)
+    size = connection.features.max_query_params
+    for start in range(0, len(post_ids), size):
+        chunk = post_ids[start:start + size]
+        with transaction.atomic():
+            Post.objects.filter(pk__in=chunk).recompute_comment_counters()
+            # Imported comments are old news, owners are mailed about the ones after them
+            last_comments = (Comment.objects.filter(post_id__in=chunk).order_by().values('post')
+                             .annotate(last=Max('pk')).values_list('post', 'last'))
+            CommentNotification.objects.bulk_create(
+                [CommentNotification(post_id=post_id, last_comment_id=last) for post_id, last in last_comments],
+                ignore_conflicts=True,
+            )
+    if 'posts' in tables:
+        get_search_backend().rebuild()
+    models = [TABLES[table].Meta.model for table in tables]
+    # Rows came with their primary keys, sequences go past them (no-op on SQLite)
+    statements = connection.ops.sequence_reset_sql(no_style(), models)
+    if statements:
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+    invalidate_all()
+
+
+def checkpoint_path(path):
+    return f'{path}.checkpoint'
+
+
+def read_checkpoint(path):
+    """Progress of the interrupted import of `path`, None if there is none"""
+    try:
+        with open(checkpoint_path(path)) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+
+def write_checkpoint(path, checkpoint):
+    # Renamed once complete, an interrupted write leaves the previous checkpoint
+    partial_path = checkpoint_path(path) + '.part'
+    with open(partial_path, 'w') as file:
+        json.dump(checkpoint, file)
+    os.replace(partial_path, checkpoint_path(path))
+
+
+def remove_checkpoint(path):
+    try:
+        os.remove(checkpoint_path(path))
+    except FileNotFoundError:
+        pass
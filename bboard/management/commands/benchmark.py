@@ -0,0 +1,24 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from bboard.benchmarks import SCENARIOS, scratch_database, without_throttling
+
+
+class Command(BaseCommand):
+    help = 'Run a benchmark scenario against a throwaway database and print JSON results'
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenario', choices=sorted(SCENARIOS))
+        parser.add_argument('--users', type=int, default=100, help='Number of users to seed')
+        parser.add_argument('--categories', type=int, default=10, help='Number of categories to seed')
+        parser.add_argument('--posts', type=int, default=10000, help='Number of posts to seed')
+        parser.add_argument('--comments', type=int, default=50000, help='Number of comments to seed')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed of the data generator')
+        parser.add_argument('--repeat', type=int, default=20, help='Requests per measurement')
+        parser.add_argument('--concurrency', type=int, default=10, help='Concurrent requests under ASGI')
+
+    def handle(self, *args, **options):
+        with scratch_database(), without_throttling():
+            results = SCENARIOS[options['scenario']](options)
+        self.stdout.write(json.dumps({'scenario': options['scenario'], 'results': results}, indent=2))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from bboard.export import FORMATS, TABLES, export_to_file
+
+
+class Command(BaseCommand):
+    help = 'Write gzipped NDJSON or CSV dumps of tables to MEDIA_ROOT/EXPORT_DIR'
+
+    def add_arguments(self, parser):
+        parser.add_argument('tables', nargs='*', help=f'Tables to dump, all by default: {", ".join(TABLES)}')
+        parser.add_argument('--format', choices=FORMATS, default='ndjson', help='File format')
+
+    def handle(self, *args, **options):
+        unknown = set(options['tables']) - set(TABLES)
+        if unknown:
+            raise CommandError(f'Unknown tables: {", ".join(sorted(unknown))}')
+        for table in options['tables'] or TABLES:
+            name = export_to_file(table, options['format'])
+            self.stdout.write(f'Exported {table} to {name}')
@@ -0,0 +1,64 @@
+import time
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from bboard.imports import (TABLES, finish_import, import_rows, open_lines, read_checkpoint, read_rows,
+                            remove_checkpoint, write_checkpoint)
+
+
+class Command(BaseCommand):
+    help = 'Bulk import posts or comments from an NDJSON file (gzipped if it ends with .gz), without signals'
+
+    def add_arguments(self, parser):
+        parser.add_argument('table', choices=TABLES, help='What the file holds, posts go before their comments')
+        parser.add_argument('path', help='NDJSON file, e.g. a dump of the export command')
+        parser.add_argument('--batch-size', type=int, default=settings.IMPORT_BATCH_SIZE,
+                            help=f'Rows per validation and INSERT, at most {settings.BULK_MAX_OBJECTS}')
+        parser.add_argument('--transaction-size', type=int, default=settings.IMPORT_TRANSACTION_SIZE,
+                            help='Rows per transaction and checkpoint')
+        parser.add_argument('--resume', action='store_true', help='Continue after the last checkpoint of the file')
+
+    def handle(self, *args, **options):
+        table, path = options['table'], options['path']
+        batch_size, transaction_size = options['batch_size'], options['transaction_size']
+        if not 0 < batch_size <= settings.BULK_MAX_OBJECTS:
+            raise CommandError(f'--batch-size must be between 1 and {settings.BULK_MAX_OBJECTS}')
+        if transaction_size < 1:
+            raise CommandError('--transaction-size must be positive')
+
+        checkpoint = read_checkpoint(path)
+        if checkpoint is None:
+            checkpoint = {'table': table, 'line': 0, 'inserted': 0, 'rejected': 0}
+        elif not options['resume']:
+            raise CommandError(f'{path} was partly imported up to line {checkpoint["line"]}, '
+                               f'pass --resume to continue')
+        elif checkpoint['table'] != table:
+            raise CommandError(f'{path} was partly imported as {checkpoint["table"]}')
+
+        start = time.perf_counter()
+        rows = 0
+        post_ids = set()
+        with open_lines(path) as lines:
+            transactions = import_rows(table, read_rows(table, lines, checkpoint['line']),
+                                       batch_size, transaction_size)
+            for number, inserted, rejected, transaction_post_ids in transactions:
+                post_ids |= transaction_post_ids
+                for rejected_number, errors in rejected:
+                    self.stderr.write(f'Line {rejected_number}: {errors}')
+                rows += inserted + len(rejected)
+                checkpoint.update(line=number, inserted=checkpoint['inserted'] + inserted,
+                                  rejected=checkpoint['rejected'] + len(rejected))
+                write_checkpoint(path, checkpoint)
+                self.stdout.write(f'Line {number}: {checkpoint["inserted"]} inserted, '
+                                  f'{checkpoint["rejected"]} rejected, '
+                                  f'{rows / (time.perf_counter() - start):.0f} rows/s')
+
+        if table == 'comments' and options['resume']:
+            # Posts commented on before the interruption are not known, recount them all
+            call_command('recompute_post_counters', stdout=self.stdout)
+            post_ids = set()
+        finish_import([table], post_ids)
+        remove_checkpoint(path)
+        self.stdout.write(f'Imported {checkpoint["inserted"]} {table}, rejected {checkpoint["rejected"]}')
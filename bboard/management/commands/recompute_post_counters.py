@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+
+from bboard.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Recount comment_count, accepted_comment_count and last_comment_at of every Post'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000, help='Posts per UPDATE')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_pk = Post.objects.aggregate(last_pk=Max('pk'))['last_pk'] or 0
+        updated = 0
+        for first_pk in range(1, last_pk + 1, batch_size):
+            with transaction.atomic():
+                updated += Post.objects.filter(
+                    pk__range=(first_pk, first_pk + batch_size - 1)
+                ).recompute_comment_counters()
+        self.stdout.write(f'Recomputed counters of {updated} posts')
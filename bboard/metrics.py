@@ -0,0 +1,193 @@
+"""
+Per-view request metrics: wall time, DB queries and their time,
+serialization time and response size, kept as in-process histograms
+and exposed in Prometheus text format. Every worker process keeps its
+own numbers, Prometheus sums them up per instance.
+"""
+import asyncio
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+TIME_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000)
+
+METRICS = (
+    # name, help, buckets, key in request metrics
+    ('bboard_request_duration_seconds', 'Request wall time', TIME_BUCKETS, 'total'),
+    ('bboard_db_queries', 'DB queries per request', COUNT_BUCKETS, 'db_queries'),
+    ('bboard_db_duration_seconds', 'Time spent in DB queries per request', TIME_BUCKETS, 'db'),
+    ('bboard_serialization_duration_seconds', 'Time spent in serializers per request', TIME_BUCKETS, 'serialize'),
+    ('bboard_response_size_bytes', 'Response body size', SIZE_BUCKETS, 'size'),
+)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        with self.lock:
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[i] += 1
+                    break
+            self.sum += value
+            self.count += 1
+
+    def cumulative(self):
+        with self.lock:
+            counts = list(self.counts)
+            total = self.count
+            value_sum = self.sum
+        cumulative = []
+        running = 0
+        for bound, count in zip(self.buckets, counts):
+            running += count
+            cumulative.append((bound, running))
+        return cumulative, value_sum, total
+
+
+class Registry:
+    def __init__(self):
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def observe(self, view, values):
+        for name, help_text, buckets, key in METRICS:
+            histogram = self.histograms.get((name, view))
+            if histogram is None:
+                with self.lock:
+                    histogram = self.histograms.setdefault((name, view), Histogram(buckets))
+            histogram.observe(values[key])
+
+    def clear(self):
+        with self.lock:
+            self.histograms.clear()
+
+    def render(self):
+        """Prometheus text exposition format"""
+        lines = []
+        for name, help_text, buckets, key in METRICS:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} histogram')
+            for (metric, view), histogram in sorted(self.histograms.items()):
+                if metric != name:
+                    continue
+                cumulative, value_sum, total = histogram.cumulative()
+                for bound, count in cumulative:
+                    lines.append(f'{name}_bucket{{view="{view}",le="{bound}"}} {count}')
+                lines.append(f'{name}_bucket{{view="{view}",le="+Inf"}} {total}')
+                lines.append(f'{name}_sum{{view="{view}"}} {value_sum}')
+                lines.append(f'{name}_count{{view="{view}"}} {total}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+# Metrics of the current request, follows it into sync_to_async threads under ASGI
+current_metrics = ContextVar('request_metrics', default=None)
+
+
+def count_query(execute, sql, params, many, context):
+    metrics = current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics['db'] += time.perf_counter() - start
+        metrics['db_queries'] += 1
+
+
+def install_query_counter(connection, **kwargs):
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+connection_created.connect(install_query_counter)
+
+
+class RequestMetricsMiddleware:
+    """Collect metrics of every routed request, optionally report them in Server-Timing"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Marks the instance as a coroutine function, so under ASGI the handler awaits it without a thread
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        start, token = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.finish(request, response, start)
+
+    async def __acall__(self, request):
+        start, token = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.finish(request, response, start)
+
+    @staticmethod
+    def start(request):
+        request.metrics = {'db_queries': 0, 'db': 0.0, 'serialize': 0.0}
+        # Connections opened before this module was imported missed connection_created
+        for connection in connections.all():
+            install_query_counter(connection)
+        return time.perf_counter(), current_metrics.set(request.metrics)
+
+    @staticmethod
+    def finish(request, response, start):
+        metrics = request.metrics
+        metrics['total'] = time.perf_counter() - start
+        metrics['size'] = 0 if response.streaming else len(response.content)
+
+        if request.resolver_match is not None:
+            registry.observe(request.resolver_match.view_name, metrics)
+            if settings.METRICS_SERVER_TIMING:
+                response['Server-Timing'] = ', '.join((
+                    f'total;dur={metrics["total"] * 1000:.2f}',
+                    f'db;dur={metrics["db"] * 1000:.2f};desc="{metrics["db_queries"]} queries"',
+                    f'serialize;dur={metrics["serialize"] * 1000:.2f}',
+                ))
+        return response
+
+
+class SerializationMetricsMixin:
+    """DRF viewset hook adding serializer time to the request metrics"""
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        metrics = getattr(self.request._request, 'metrics', None)
+        if metrics is not None:
+            to_representation = serializer.to_representation
+
+            def timed_to_representation(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return to_representation(*args, **kwargs)
+                finally:
+                    metrics['serialize'] += time.perf_counter() - start
+
+            serializer.to_representation = timed_to_representation
+        return serializer
@@ -0,0 +1,28 @@
+from django.db import migrations
+
+
+def create_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        'CREATE VIRTUAL TABLE IF NOT EXISTS bboard_post_fts '
+        'USING fts5(title, text, tokenize="unicode61 remove_diacritics 2")'
+    )
+    schema_editor.execute('INSERT INTO bboard_post_fts (rowid, title, text) SELECT id, title, text FROM bboard_post')
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS bboard_post_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bboard', '0002_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.0.2 on 2026-10-18 10:09
+
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_comments(apps, schema_editor):
+    Post = apps.get_model('bboard', 'Post')
+    Comment = apps.get_model('bboard', 'Comment')
+    comments = Comment.objects.filter(post=OuterRef('pk')).order_by().values('post')
+    Post.objects.update(
+        comment_count=Coalesce(Subquery(comments.annotate(count=Count('pk')).values('count')), 0),
+        accepted_comment_count=Coalesce(
+            Subquery(comments.annotate(count=Count('pk', filter=Q(accepted=True))).values('count')), 0
+        ),
+        last_comment_at=Subquery(comments.annotate(last=Max('created')).values('last')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bboard', '0003_post_fts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='accepted_comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='last_comment_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(count_comments, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.0.2 on 2026-10-18 10:14
+
+import bboard.uploads
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bboard', '0004_post_comment_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='thumbnail',
+            field=models.FileField(blank=True, editable=False, null=True, storage=bboard.uploads.ContentAddressedStorage(), upload_to='thumbnails'),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='upload',
+            field=models.FileField(blank=True, null=True, storage=bboard.uploads.ContentAddressedStorage(), upload_to=bboard.uploads.upload_to),
+        ),
+        migrations.CreateModel(
+            name='Upload',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('filename', models.CharField(max_length=255)),
+                ('size', models.PositiveBigIntegerField()),
+                ('offset', models.PositiveBigIntegerField(default=0)),
+                ('file', models.FileField(blank=True, null=True, storage=bboard.uploads.ContentAddressedStorage(), upload_to='')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
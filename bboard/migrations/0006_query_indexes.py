@@ -0,0 +1,52 @@
+# Generated by Django 4.0.2 on 2026-10-18 10:16
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min
+import django.db.models.deletion
+
+
+def merge_duplicate_categories(apps, schema_editor):
+    """Move posts of categories with a duplicate name to the first one before adding the unique constraint"""
+    Category = apps.get_model('bboard', 'Category')
+    Post = apps.get_model('bboard', 'Post')
+    duplicates = Category.objects.values('name').annotate(count=Count('pk'), first=Min('pk')).filter(count__gt=1)
+    for duplicate in duplicates:
+        others = Category.objects.filter(name=duplicate['name']).exclude(pk=duplicate['first'])
+        Post.objects.filter(category__in=others).update(category=duplicate['first'])
+        others.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bboard', '0005_post_upload_dedup_thumbnail'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_categories, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='category',
+            name='name',
+            field=models.CharField(max_length=32, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'accepted', 'created'], name='comment_post_accepted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['owner', 'created'], name='post_owner_created_idx'),
+        ),
+        # Single column indexes are prefixes of the ones above
+        migrations.AlterField(
+            model_name='comment',
+            name='post',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='comment', to='bboard.post'),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='owner',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.0.2 on 2026-10-18 10:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bboard', '0006_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WeeklyDigest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('week', models.DateField(unique=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('posts', models.JSONField(default=list)),
+                ('fragments', models.JSONField(default=dict)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='categories',
+            field=models.ManyToManyField(blank=True, related_name='subscribers', to='bboard.Category'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.0.2 on 2026-10-18 10:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bboard', '0009_comment_post_created_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Export',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('table', models.CharField(choices=[('posts', 'Posts'), ('comments', 'Comments'), ('users', 'Users'), ('categories', 'Categories')], max_length=16)),
+                ('format', models.CharField(choices=[('ndjson', 'NDJSON'), ('csv', 'CSV')], default='ndjson', max_length=8)),
+                ('file', models.FileField(blank=True, editable=False, null=True, upload_to='')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('finished', models.DateTimeField(blank=True, editable=False, null=True)),
+            ],
+        ),
+    ]
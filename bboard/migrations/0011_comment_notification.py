@@ -0,0 +1,21 @@
+# Generated by Django 4.0.2 on 2026-10-18 10:53
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bboard', '0010_export'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CommentNotification',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='bboard.post')),
+                ('last_comment_id', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,24 @@
+from django.db import migrations
+from django.db.models import Max
+
+
+def start_after_existing_comments(apps, schema_editor):
+    """Comments left before notifications were claimed are not mailed again"""
+    Comment = apps.get_model('bboard', 'Comment')
+    CommentNotification = apps.get_model('bboard', 'CommentNotification')
+    last_comments = Comment.objects.order_by().values('post').annotate(last=Max('pk')).values_list('post', 'last')
+    CommentNotification.objects.bulk_create(
+        (CommentNotification(post_id=post_id, last_comment_id=last) for post_id, last in last_comments.iterator()),
+        batch_size=1000, ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bboard', '0011_comment_notification'),
+    ]
+
+    operations = [
+        migrations.RunPython(start_after_existing_comments, migrations.RunPython.noop),
+    ]
@@ -1,14 +1,62 @@
-from datetime import datetime, timedelta
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone as dt_timezone
 
-import jwt
-from django.conf import settings
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.db import models
+from django.db.models import Count, F, Max, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
 from django.urls import reverse
 from django.utils import timezone
 
+from bboard.uploads import upload_storage, upload_to
 
-class UserManager(BaseUserManager):
+# Posts whose delete is under way, their comments are deleted by the cascade
+_deleting_posts = ContextVar('deleting_posts', default=frozenset())
+
+
+@contextmanager
+def post_delete_scope():
+    """
+    Posts marked within are unmarked on the way out, whether the delete went
+    through or failed. Every delete that cascades to posts runs in one.
+    """
+    token = _deleting_posts.set(_deleting_posts.get())
+    try:
+        yield
+    finally:
+        _deleting_posts.reset(token)
+
+
+def mark_post_deleting(post_id):
+    _deleting_posts.set(_deleting_posts.get() | {post_id})
+
+
+def post_deleting(post_id):
+    return post_id in _deleting_posts.get()
+
+
+class PostDeleteScopeQuerySet(models.QuerySet):
+    """Querysets of the models whose delete cascades to posts"""
+
+    def delete(self):
+        with post_delete_scope():
+            return super().delete()
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+
+class PostDeleteScopeMixin:
+    """Models whose delete cascades to posts"""
+
+    def delete(self, *args, **kwargs):
+        with post_delete_scope():
+            return super().delete(*args, **kwargs)
+
+
+
+class UserManager(BaseUserManager.from_queryset(PostDeleteScopeQuerySet)):
     """
     Django требует, чтобы кастомные пользователи определяли свой собственный
     класс Manager. Унаследовавшись от BaseUserManager, мы получаем много того
@@ -42,13 +90,15 @@ class UserManager(BaseUserManager):
         return user
 
 
-class User(AbstractBaseUser, PermissionsMixin):
+class User(PostDeleteScopeMixin, AbstractBaseUser, PermissionsMixin):
     username = models.CharField(db_index=True, max_length=255, unique=True)
     email = models.EmailField(db_index=True, unique=True)
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Категории еженедельной рассылки, пустой набор - все категории
+    categories = models.ManyToManyField('Category', blank=True, related_name='subscribers')
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username']
@@ -59,6 +109,23 @@ class User(AbstractBaseUser, PermissionsMixin):
         """ Строковое представление модели """
         return f'{self.email}'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Позволяет обработчикам сигналов узнать, изменилось ли имя при сохранении
+        instance._loaded_username = instance.__dict__.get('username')
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._loaded_username = self.username
+
+    @property
+    def username_changed(self):
+        """ None, если пользователь не был загружен из базы. """
+        loaded = getattr(self, '_loaded_username', None)
+        return None if loaded is None else loaded != self.username
+
     @property
     def token(self):
         """
@@ -82,46 +149,252 @@ class User(AbstractBaseUser, PermissionsMixin):
 
     def _generate_jwt_token(self):
         """
-        Генерирует веб-токен JSON, в котором хранится идентификатор этого
-        пользователя, срок действия токена составляет 1 день от создания
+        Генерирует access-токен simplejwt с идентификатором, username и
+        is_staff пользователя, тот же что выдает /auth/jwt/create/. Такой
+        токен проверяется без запроса пользователя из базы.
         """
+        from bboard.serializers import ClaimsTokenObtainPairSerializer
 
-        token = jwt.encode({
-            'id': self.pk,
-            'exp': datetime.now(tz=timezone.utc) + timedelta(days=1)
-        }, settings.SECRET_KEY, algorithm='HS256')
+        return str(ClaimsTokenObtainPairSerializer.get_token(self).access_token)
 
-        return token
 
+class PostQuerySet(PostDeleteScopeQuerySet):
+    """Updates of the denormalized comment counters"""
 
-class Post(models.Model):
-    owner = models.ForeignKey(User, on_delete=models.CASCADE)
+    def add_comments(self, count, accepted, last_comment_at):
+        """Account for new comments, F-expressions keep concurrent writers correct"""
+        last_comment_at = Value(last_comment_at, output_field=models.DateTimeField())
+        return self.update(
+            comment_count=F('comment_count') + count,
+            accepted_comment_count=F('accepted_comment_count') + accepted,
+            last_comment_at=Greatest(Coalesce('last_comment_at', last_comment_at), last_comment_at),
+            updated_at=timezone.now(),
+        )
+
+    def accept_comments(self, count):
+        """`count` comments were accepted, negative when un-accepted"""
+        return self.update(accepted_comment_count=F('accepted_comment_count') + count, updated_at=timezone.now())
+
+    def remove_comments(self, count, accepted):
+        """Counters stay >= 0 if they were behind, e.g. after bulk_create, recompute_post_counters fixes them"""
+        return self.update(
+            comment_count=Greatest(F('comment_count') - count, 0),
+            accepted_comment_count=Greatest(F('accepted_comment_count') - accepted, 0),
+            last_comment_at=Subquery(
+                Comment.objects.filter(post=OuterRef('pk')).order_by('-created').values('created')[:1]
+            ),
+            updated_at=timezone.now(),
+        )
+
+    def recompute_comment_counters(self):
+        """
+        Recount from the comment table in one UPDATE. Only posts whose counters
+        were off are written, updated_at of the rest stays as is for /sync/.
+        """
+        comments = Comment.objects.filter(post=OuterRef('pk')).order_by().values('post')
+        counters = {
+            'comment_count': Coalesce(Subquery(comments.annotate(count=Count('pk')).values('count')), 0),
+            'accepted_comment_count': Coalesce(
+                Subquery(comments.annotate(count=Count('pk', filter=Q(accepted=True))).values('count')), 0
+            ),
+            'last_comment_at': Subquery(comments.annotate(last=Max('created')).values('last')),
+        }
+        # Posts without comments have no last_comment_at, compare it to a date no comment has
+        never = Value(datetime.min.replace(tzinfo=dt_timezone.utc))
+        changed = self.alias(
+            new_comment_count=counters['comment_count'],
+            new_accepted_comment_count=counters['accepted_comment_count'],
+            old_last_comment_at=Coalesce('last_comment_at', never),
+            new_last_comment_at=Coalesce(counters['last_comment_at'], never),
+        ).filter(
+            ~Q(comment_count=F('new_comment_count'))
+            | ~Q(accepted_comment_count=F('new_accepted_comment_count'))
+            | ~Q(old_last_comment_at=F('new_last_comment_at'))
+        )
+        return self.filter(pk__in=changed.values('pk')).update(**counters, updated_at=timezone.now())
+
+
+class Post(PostDeleteScopeMixin, models.Model):
+    # Indexed by post_owner_created_idx
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, db_index=False)
     title = models.CharField(max_length=255)
     text = models.TextField(max_length=5000)
-    upload = models.FileField(upload_to='uploads/%Y/%m/%d', blank=True, null=True)
+    upload = models.FileField(upload_to=upload_to, storage=upload_storage, blank=True, null=True)
+    # Made from an image upload by bboard.tasks.make_post_thumbnail
+    thumbnail = models.FileField(upload_to='thumbnails', storage=upload_storage, blank=True, null=True,
+                                 editable=False)
     created = models.DateTimeField(auto_now_add=True)
+    # Also set by every queryset update, see bboard.sync
+    updated_at = models.DateTimeField(auto_now=True)
     category = models.ForeignKey('Category', on_delete=models.CASCADE, related_name='category')
+    # Denormalized from Comment, maintained by bboard.signals
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+    accepted_comment_count = models.PositiveIntegerField(default=0, editable=False)
+    last_comment_at = models.DateTimeField(blank=True, null=True, editable=False)
+
+    objects = PostQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Keyset pagination on (created, id)
+            models.Index(fields=['created', 'id'], name='post_created_id_idx'),
+            # Posts of a user, newest first
+            models.Index(fields=['owner', 'created'], name='post_owner_created_idx'),
+            # Changes since a sync cursor
+            models.Index(fields=['updated_at', 'id'], name='post_updated_id_idx'),
+        ]
 
     def __str__(self):
         return f'{self.title} - {self.owner}'
 
     def get_absolute_url(self):
-        return reverse('posts', kwargs={'pk': self.pk})
+        return reverse('posts-detail', kwargs={'pk': self.pk})
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Lets signal receivers tell whether a new file was uploaded
+        instance._loaded_upload = instance.__dict__.get('upload')
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._loaded_upload = self.upload.name
+
+    @property
+    def upload_changed(self):
+        return bool(self.upload) and self.upload.name != getattr(self, '_loaded_upload', None)
 
 
 class Comment(models.Model):
     owner = models.ForeignKey(User, on_delete=models.CASCADE)
     text = models.TextField(max_length=5000)
     created = models.DateTimeField(auto_now_add=True)
+    # Also set by every queryset update, see bboard.sync
+    updated_at = models.DateTimeField(auto_now=True)
     accepted = models.BooleanField(default=False)
-    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comment')
+    # Indexed by comment_post_accepted_idx
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comment', db_index=False)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination on (created, id)
+            models.Index(fields=['created', 'id'], name='comment_created_id_idx'),
+            # Unaccepted comments of a post for notifications and counters
+            models.Index(fields=['post', 'accepted', 'created'], name='comment_post_accepted_idx'),
+            # Comments of a post in keyset order, latest ones for the detail preview
+            models.Index(fields=['post', 'created', 'id'], name='comment_post_created_idx'),
+            # Changes since a sync cursor
+            models.Index(fields=['updated_at', 'id'], name='comment_updated_id_idx'),
+        ]
 
     def __str__(self):
         return f'{self.text}'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Lets signal receivers tell whether `accepted` changed on save
+        instance._loaded_accepted = instance.__dict__.get('accepted')
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._loaded_accepted = self.accepted
+
+    @property
+    def accepted_changed(self):
+        """None when the instance was not loaded from the database"""
+        loaded = getattr(self, '_loaded_accepted', None)
+        return None if loaded is None else loaded != self.accepted
+
 
-class Category(models.Model):
-    name = models.CharField(max_length=32)
+class Category(PostDeleteScopeMixin, models.Model):
+    name = models.CharField(max_length=32, unique=True)
+
+    objects = PostDeleteScopeQuerySet.as_manager()
 
     def __str__(self):
         return f'{self.name}'
+
+
+class Upload(models.Model):
+    """Chunked upload of a file, `offset` bytes are received so far"""
+    owner = models.ForeignKey(User, on_delete=models.CASCADE)
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+    # Set once all chunks are received
+    file = models.FileField(storage=upload_storage, blank=True, null=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.filename} - {self.owner}'
+
+    @property
+    def complete(self):
+        return bool(self.file)
+
+
+class Deletion(models.Model):
+    """Deleted Post or Comment, lets sync clients drop it, logged by bboard.signals"""
+    POST = 'post'
+    COMMENT = 'comment'
+    MODEL_CHOICES = [(POST, 'Post'), (COMMENT, 'Comment')]
+
+    model = models.CharField(max_length=16, choices=MODEL_CHOICES)
+    object_id = models.PositiveBigIntegerField()
+    deleted = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.model} {self.object_id}'
+
+
+class CommentNotification(models.Model):
+    """
+    Last comment of the Post mailed to its owner, bboard.tasks.notify_about_new_comments starts after it.
+    Posts without one have had no comments mailed, those with imported comments get one by bboard.imports.
+    """
+    post = models.OneToOneField(Post, on_delete=models.CASCADE, primary_key=True)
+    last_comment_id = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.post_id}: {self.last_comment_id}'
+
+
+class Export(models.Model):
+    """Table dump queued from the admin, written by bboard.tasks.run_export"""
+    TABLE_CHOICES = [('posts', 'Posts'), ('comments', 'Comments'), ('users', 'Users'), ('categories', 'Categories')]
+    FORMAT_CHOICES = [('ndjson', 'NDJSON'), ('csv', 'CSV')]
+
+    table = models.CharField(max_length=16, choices=TABLE_CHOICES)
+    format = models.CharField(max_length=8, choices=FORMAT_CHOICES, default='ndjson')
+    # Gzipped, set once the dump is complete
+    file = models.FileField(blank=True, null=True, editable=False)
+    created = models.DateTimeField(auto_now_add=True)
+    finished = models.DateTimeField(blank=True, null=True, editable=False)
+
+    def __str__(self):
+        return f'{self.table}.{self.format} {self.created:%Y-%m-%d %H:%M}'
+
+
+class WeeklyDigest(models.Model):
+    """Posts of a week as sent to everybody, computed once by bboard.tasks.send_mail_about_new_posts"""
+    # Monday of the week
+    week = models.DateField(unique=True)
+    created = models.DateTimeField(auto_now_add=True)
+    # [{'id', 'title', 'text', 'url', 'category_id'}, ...], text truncated and url absolute
+    posts = models.JSONField(default=list)
+    # Rendered posts of each category, {'<category id>': html}
+    fragments = models.JSONField(default=dict)
+
+    def __str__(self):
+        return f'{self.week}'
+
+    def html(self, category_ids=None):
+        """Posts in `category_ids`, all of them if None, in category order"""
+        keys = sorted(self.fragments, key=int)
+        if category_ids is not None:
+            followed = {str(pk) for pk in category_ids}
+            keys = [key for key in keys if key in followed]
+        return ''.join(self.fragments[key] for key in keys)
@@ -0,0 +1,169 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Seek pagination on a unique ordering, e.g. (created, id).
+    The cursor holds the ordering values of the last row of the page,
+    so every page is a bounded index range scan and no COUNT is issued.
+    """
+    ordering = ('-created', '-id')
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        queryset = queryset.order_by(*self.ordering)
+
+        position = self.decode_cursor(request, queryset.model)
+        if position is not None:
+            queryset = queryset.filter(self.seek_filter(position))
+
+        rows = list(queryset[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def seek_filter(self, position):
+        """Rows strictly after `position` in `ordering`"""
+        condition = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        # Redundant bound on the leading column lets the database seek into
+        # the index instead of scanning it up to the cursor position
+        field = self.ordering[0]
+        bound = 'lte' if field.startswith('-') else 'gte'
+        return Q(**{f'{field.lstrip("-")}__{bound}': position[0]}) & condition
+
+    def get_position(self, instance):
+        position = []
+        for field in self.ordering:
+            name = field.lstrip('-')
+            value = instance[name] if isinstance(instance, dict) else getattr(instance, name)
+            position.append(str(value))
+        return position
+
+    def clean_position(self, model, position):
+        """`position` converted to the types of the `ordering` fields of `model`, ValueError if it isn't one"""
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise ValueError('Position does not match the ordering')
+        cleaned = []
+        for field, value in zip(self.ordering, position):
+            try:
+                value = model._meta.get_field(field.lstrip('-')).to_python(value)
+            except (TypeError, DjangoValidationError) as error:
+                raise ValueError(f'Invalid {field} in position') from error
+            if value is None:
+                raise ValueError(f'Invalid {field} in position')
+            cleaned.append(value)
+        return cleaned
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            return self.clean_position(model, json.loads(urlsafe_b64decode(encoded.encode('ascii'))))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, position):
+        return urlsafe_b64encode(json.dumps(position).encode('ascii')).decode('ascii')
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        cursor = self.encode_cursor(self.get_position(self.page[-1]))
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {
+                    'type': 'string',
+                    'nullable': True,
+                },
+                'results': schema,
+            },
+        }
+
+
+class CommentKeysetPagination(KeysetPagination):
+    """Keyset pages of comments, oldest first or newest first with `ordering=-created`"""
+    ordering_query_param = 'ordering'
+    orderings = {
+        'created': ('created', 'id'),
+        '-created': ('-created', '-id'),
+    }
+
+    def paginate_queryset(self, queryset, request, view=None):
+        value = request.query_params.get(self.ordering_query_param, 'created')
+        if value not in self.orderings:
+            raise ValidationError({self.ordering_query_param: f'One of: {", ".join(self.orderings)}.'})
+        self.ordering = self.orderings[value]
+        return super().paginate_queryset(queryset, request, view)
+
+
+class FeedPagination(PageNumberPagination):
+    """
+    Page number pagination by default.
+    Passing `cursor` (empty for the first page) switches to keyset pagination,
+    whose pages keep their own ordering, `ordering` along with it is refused.
+    """
+    keyset_class = KeysetPagination
+    ordering_query_param = api_settings.ORDERING_PARAM
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.keyset_class.cursor_query_param in request.query_params:
+            if self.ordering_query_param in request.query_params:
+                raise ValidationError({self.ordering_query_param: [
+                    f'Cannot be combined with {self.keyset_class.cursor_query_param}, '
+                    f'cursor pages are ordered by {", ".join(self.keyset_class.ordering)}.'
+                ]})
+            self.keyset = self.keyset_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_schema_operation_parameters(self, view):
+        parameters = super().get_schema_operation_parameters(view)
+        parameters.append(
+            {
+                'name': self.keyset_class.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Keyset cursor, pass it empty to start',
+                'schema': {
+                    'type': 'string',
+                },
+            }
+        )
+        return parameters
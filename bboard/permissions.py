@@ -10,5 +10,5 @@ class IsOwnerOrReadOnly(permissions.BasePermission):
         return bool(
             request.method in permissions.SAFE_METHODS or
             request.user and
-            request.user.is_authenticated and (obj.owner == request.user or request.user.is_staff)
+            request.user.is_authenticated and (obj.owner_id == request.user.pk or request.user.is_staff)
         )
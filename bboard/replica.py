@@ -0,0 +1,105 @@
+"""
+Reads from a replica database.
+
+Nothing goes to the replica by default: ReplicaRouter sends reads there only
+inside `replica_reads()`, which ReplicaReadMixin enters for list/retrieve
+and the weekly digest for its Post query. Writes always go to `default`.
+
+The replica lags behind, so a user who has just written through the API is
+pinned to `default` for REPLICA_PIN_TIMEOUT seconds and reads their own writes.
+Responses rendered from the replica may miss a write made just before, so
+they are kept in the response cache for no longer than that either.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+_replica_reads = ContextVar('replica_reads', default=False)
+
+
+def replica_configured():
+    """A replica that is the default database itself, like in tests, is not worth a second connection"""
+    alias = settings.REPLICA_DATABASE_ALIAS
+    if alias not in connections:
+        return False
+    return connections[alias].settings_dict['NAME'] != connections[DEFAULT_DB_ALIAS].settings_dict['NAME']
+
+
+@contextmanager
+def replica_reads():
+    """Send reads of the block to the replica"""
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _replica_reads.get() and replica_configured():
+            return settings.REPLICA_DATABASE_ALIAS
+        return None
+
+    def db_for_write(self, model, **hints):
+        # Otherwise Django writes an instance read from the replica back to it
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both databases hold the same rows
+        databases = {DEFAULT_DB_ALIAS, settings.REPLICA_DATABASE_ALIAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+def pin_key(user_pk):
+    return f'replica:pin:{user_pk}'
+
+
+def pin(user):
+    """Read `user`'s requests from default while the replica catches up with their write"""
+    cache.set(pin_key(user.pk), True, timeout=settings.REPLICA_PIN_TIMEOUT)
+
+
+def is_pinned(user):
+    return bool(user and user.is_authenticated and cache.get(pin_key(user.pk)))
+
+
+class ReplicaReadMixin:
+    """list/retrieve read from the replica unless the user has written within REPLICA_PIN_TIMEOUT"""
+    replica_actions = ('list', 'retrieve')
+    pinned = False
+    _replica_token = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if self.action in self.replica_actions and request.method in SAFE_METHODS and replica_configured():
+            self.pinned = is_pinned(request.user)
+            if not self.pinned:
+                self._replica_token = _replica_reads.set(True)
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            # Also after an exception DRF does not handle, the thread serves other requests
+            if self._replica_token is not None:
+                _replica_reads.reset(self._replica_token)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if request.method not in SAFE_METHODS and response.status_code < 400 and request.user.is_authenticated:
+            pin(request.user)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+    def use_cached_response(self):
+        # Entries may have been rendered from the replica before the write
+        return not self.pinned
+
+    def cached_response_timeout(self):
+        return settings.REPLICA_PIN_TIMEOUT if self._replica_token is not None else DEFAULT_TIMEOUT
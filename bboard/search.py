@@ -0,0 +1,109 @@
+"""
+Full-text search over Post title and text.
+
+SQLite gets an FTS5 inverted index (created by migration 0003), other
+databases fall back to `icontains` until they get a backend of their own.
+The index is kept in sync from `signals.posts_changed`.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+from bboard.models import Post
+
+FTS_TABLE = 'bboard_post_fts'
+
+_backend = None
+
+
+class BaseSearchBackend:
+    def update(self, post_ids):
+        """Reindex `post_ids`, posts which no longer exist are dropped from the index"""
+        raise NotImplementedError
+
+    def rebuild(self):
+        """Reindex every Post"""
+        raise NotImplementedError
+
+    def search(self, queryset, query):
+        """Filter Post `queryset` by `query`, best matches first"""
+        raise NotImplementedError
+
+    @staticmethod
+    def terms(query):
+        return re.findall(r'\w+', query)
+
+
+class DatabaseSearchBackend(BaseSearchBackend):
+    """No index, table scan with icontains"""
+
+    def update(self, post_ids):
+        pass
+
+    def rebuild(self):
+        pass
+
+    def search(self, queryset, query):
+        terms = self.terms(query)
+        if not terms:
+            return queryset.none()
+        for term in terms:
+            queryset = queryset.filter(Q(title__icontains=term) | Q(text__icontains=term))
+        return queryset.order_by('-created', '-id')
+
+
+class SQLiteSearchBackend(BaseSearchBackend):
+    """FTS5 index ranked with bm25, title weighs more than text"""
+    rank = f'bm25({FTS_TABLE}, 10.0, 1.0)'
+
+    def update(self, post_ids):
+        post_ids = list(post_ids)
+        if not post_ids:
+            return
+        placeholders = ', '.join(['%s'] * len(post_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', post_ids)
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, title, text) '
+                f'SELECT id, title, text FROM bboard_post WHERE id IN ({placeholders})',
+                post_ids,
+            )
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.execute(f'INSERT INTO {FTS_TABLE} (rowid, title, text) SELECT id, title, text FROM bboard_post')
+
+    def search(self, queryset, query):
+        terms = self.terms(query)
+        if not terms:
+            return queryset.none()
+        # Every term is quoted to escape FTS syntax and matched as a prefix
+        match = ' '.join('"{}"*'.format(term) for term in terms)
+        return queryset.extra(
+            tables=[FTS_TABLE],
+            where=[f'{FTS_TABLE}.rowid = bboard_post.id', f'{FTS_TABLE} MATCH %s'],
+            params=[match],
+            select={'rank': self.rank},
+        ).order_by('rank', '-id')
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        if settings.POST_SEARCH_BACKEND:
+            _backend = import_string(settings.POST_SEARCH_BACKEND)()
+        elif connection.vendor == 'sqlite':
+            _backend = SQLiteSearchBackend()
+        else:
+            _backend = DatabaseSearchBackend()
+    return _backend
+
+
+def search_posts(query, queryset=None):
+    if queryset is None:
+        queryset = Post.objects.all()
+    return get_backend().search(queryset, query)
@@ -1,18 +1,237 @@
+from functools import lru_cache, partial
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import models, transaction
 from rest_framework import serializers
+from rest_framework.settings import api_settings
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from bboard.categories import registry as category_registry
+from bboard.models import Post, Comment, Category, Upload, User
+
+
+class BulkListSerializer(serializers.ListSerializer):
+    """Create or update a list of objects with one bulk query in one transaction"""
+
+    def to_internal_value(self, data):
+        if isinstance(data, list) and len(data) > settings.BULK_MAX_OBJECTS:
+            raise serializers.ValidationError({
+                'non_field_errors': [f'Ensure this list has no more than {settings.BULK_MAX_OBJECTS} elements.']
+            })
+        if isinstance(data, list):
+            self.prefetch_related_fields(data)
+        validated_data = super().to_internal_value(data)
+        if self.instance is not None:
+            # Updated objects are picked by `id` of every item
+            instance_ids = {obj.pk for obj in self.instance}
+            errors = []
+            for attrs, item in zip(validated_data, data):
+                try:
+                    attrs['id'] = int(item.get('id'))
+                except (TypeError, ValueError):
+                    attrs['id'] = None
+                errors.append({} if attrs['id'] in instance_ids else {'id': ['Object not found.']})
+            if any(errors):
+                raise serializers.ValidationError(errors)
+        return validated_data
+
+    def prefetch_related_fields(self, data):
+        """Resolve primary keys of every related field with one query instead of one per item"""
+        for name, field in self.child.fields.items():
+            if not isinstance(field, serializers.PrimaryKeyRelatedField) or field.read_only:
+                continue
+            pks = {str(item[name]) for item in data if isinstance(item, dict) and item.get(name) is not None}
+            pks = [int(pk) for pk in pks if pk.isdigit()]
+            field.to_internal_value = partial(self.related_value, field, field.get_queryset().in_bulk(pks))
+
+    @staticmethod
+    def related_value(field, objects, data):
+        if isinstance(data, bool):
+            field.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            pk = int(data)
+        except (TypeError, ValueError):
+            field.fail('incorrect_type', data_type=type(data).__name__)
+        if pk not in objects:
+            field.fail('does_not_exist', pk_value=data)
+        return objects[pk]
+
+    def create(self, validated_data):
+        model = self.child.Meta.model
+        with transaction.atomic():
+            return model.objects.bulk_create([model(**attrs) for attrs in validated_data])
+
+    def update(self, instance, validated_data):
+        model = self.child.Meta.model
+        objects = {obj.pk: obj for obj in instance}
+        fields = set()
+        for attrs in validated_data:
+            obj = objects[attrs.pop('id')]
+            for attr, value in attrs.items():
+                setattr(obj, attr, value)
+                fields.add(attr)
+        if fields:
+            # bulk_update skips pre_save, set auto_now fields like save() does
+            for field in model._meta.concrete_fields:
+                if getattr(field, 'auto_now', False):
+                    for obj in objects.values():
+                        field.pre_save(obj, add=False)
+                    fields.add(field.name)
+            with transaction.atomic():
+                model.objects.bulk_update(objects.values(), fields)
+        return list(objects.values())
+
+
+class ValuesListSerializer(serializers.ListSerializer):
+    """
+    Read-only fast path for rows of `.values(*field_lookups(child))`: dicts go
+    straight to the output without model instances and attribute lookups,
+    producing the same data. Model instances take the usual per-field path.
+    """
+    identity_fields = (serializers.CharField, serializers.IntegerField, serializers.BooleanField,
+                       serializers.PrimaryKeyRelatedField)
+
+    def to_representation(self, data):
+        rows = data.all() if isinstance(data, models.Manager) else data
+        rows = rows if isinstance(rows, list) else list(rows)
+        if not rows or not isinstance(rows[0], dict):
+            return super().to_representation(rows)
+        fields = [(field.field_name, lookup, self.converter(field))
+                  for field, lookup in zip(self.child._readable_fields, field_lookups(self.child))]
+        return [
+            {name: None if row[lookup] is None else convert(row[lookup]) for name, lookup, convert in fields}
+            for row in rows
+        ]
+
+    def converter(self, field):
+        if isinstance(field, CachedCategorySerializer):
+            return lambda pk: field.to_representation(category_registry.get(pk))
+        if isinstance(field, serializers.FileField):
+            return partial(self.file_url, field, self.child.Meta.model._meta.get_field(field.source).storage)
+        if isinstance(field, self.identity_fields) and not getattr(field, 'pk_field', None):
+            return lambda value: value
+        return field.to_representation
+
+    @staticmethod
+    def file_url(field, storage, name):
+        """FileField.to_representation from the stored name"""
+        if not name:
+            return None
+        if not getattr(field, 'use_url', api_settings.UPLOADED_FILES_USE_URL):
+            return name
+        request = field.context.get('request')
+        url = storage.url(name)
+        return request.build_absolute_uri(url) if request is not None else url
+
+
+def field_lookups(serializer):
+    """`.values()` lookups of the readable fields of a serializer instance, in field order"""
+    lookups = []
+    for field in serializer._readable_fields:
+        if isinstance(field, CachedCategorySerializer):
+            # Represented from the id
+            pass
+        elif field.source == '*' or isinstance(field, (serializers.BaseSerializer, serializers.SerializerMethodField)):
+            raise ImproperlyConfigured(f'{type(serializer).__name__}.{field.field_name} has no values() lookup')
+        lookups.append('__'.join(field.source_attrs))
+    return tuple(lookups)
+
 
-from bboard.models import Post, Comment, Category
+@lru_cache(maxsize=None)
+def values_lookups(serializer_class):
+    """`.values()` lookups of the readable fields of `serializer_class`, in field order"""
+    return field_lookups(serializer_class())
+
+
+class SparseFieldsMixin:
+    """
+    `?fields=a,b` keeps only those fields, `?expand=x,y` embeds the relations of
+    Meta.expandable_fields instead of their ids, Meta.default_expand without it.
+    Views narrow their querysets to the fields left, see `model_field_names`.
+    """
+    fields_query_param = 'fields'
+    expand_query_param = 'expand'
+
+    def requested(self, param):
+        request = self.context.get('request')
+        value = request.query_params.get(param) if request is not None else None
+        if value is None:
+            return None
+        return {name.strip() for name in value.split(',') if name.strip()}
+
+    def get_fields(self):
+        fields = super().get_fields()
+        expandable = getattr(self.Meta, 'expandable_fields', {})
+        expand = self.requested(self.expand_query_param)
+        if expand is None:
+            expand = set(getattr(self.Meta, 'default_expand', ()))
+        elif expand - set(expandable):
+            raise serializers.ValidationError({self.expand_query_param: f'Expandable: {", ".join(expandable)}.'})
+        for name, (serializer_class, kwargs) in expandable.items():
+            if name in expand:
+                fields[name] = serializer_class(read_only=True, **kwargs)
+            elif name not in self.concrete_field_names():
+                # Reverse relations have no id to show
+                fields.pop(name, None)
+
+        only = self.requested(self.fields_query_param)
+        if only is not None:
+            if only - set(fields):
+                raise serializers.ValidationError({self.fields_query_param: f'Available: {", ".join(fields)}.'})
+            fields = type(fields)((name, field) for name, field in fields.items() if name in only)
+        return fields
+
+    def concrete_field_names(self):
+        return {field.name for field in self.Meta.model._meta.concrete_fields}
+
+    def model_field_names(self):
+        """Concrete model fields the serializer reads, for `.only()`"""
+        concrete_fields = self.concrete_field_names()
+        return [field.source_attrs[0] for field in self._readable_fields
+                if field.source_attrs and field.source_attrs[0] in concrete_fields]
+
+
+class BulkIdsSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False,
+                                max_length=settings.BULK_MAX_OBJECTS)
 
 
 class CommentCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Comment
         fields = ('text', 'post')
+        list_serializer_class = BulkListSerializer
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if self.instance is not None:
+            # A comment stays on its Post, the counters of both would be off otherwise
+            fields['post'].read_only = True
+        return fields
 
 
 class CommentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Comment
         fields = '__all__'
+        list_serializer_class = ValuesListSerializer
+
+
+class CommentPreviewListSerializer(ValuesListSerializer):
+    """Latest COMMENT_PREVIEW_SIZE comments of the Post, newest first, one query with a LIMIT"""
+
+    def get_attribute(self, instance):
+        comments = Comment.objects.filter(post=instance).order_by('-created', '-id')
+        return comments.values(*field_lookups(self.child))[:settings.COMMENT_PREVIEW_SIZE]
+
+
+class CommentPreviewSerializer(CommentSerializer):
+    class Meta(CommentSerializer.Meta):
+        list_serializer_class = CommentPreviewListSerializer
 
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -21,30 +240,138 @@ class CategorySerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class PostListSerializer(serializers.ModelSerializer):
+class CachedCategorySerializer(CategorySerializer):
+    """Category of the instance taken from the registry instead of the database"""
+
+    def get_attribute(self, instance):
+        return category_registry.get(instance.category_id)
+
+
+class PostListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     owner = serializers.CharField(source='owner.username', read_only=True)
 
     class Meta:
         model = Post
         fields = '__all__'
+        list_serializer_class = ValuesListSerializer
+        expandable_fields = {'category': (CachedCategorySerializer, {})}
 
 
-class PostDetailSerializer(serializers.ModelSerializer):
-    category = CategorySerializer()
-    comment = CommentSerializer(many=True)
-
+class PostDetailSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Post
         exclude = ('owner',)
+        expandable_fields = {
+            'category': (CachedCategorySerializer, {}),
+            # All of them are at /posts/{pk}/comments/
+            'comment': (CommentPreviewSerializer, {'many': True}),
+        }
+        default_expand = ('category', 'comment')
+
+
+class UploadSerializer(serializers.ModelSerializer):
+    size = serializers.IntegerField(min_value=1, max_value=settings.CHUNKED_UPLOAD_MAX_SIZE)
+
+    class Meta:
+        model = Upload
+        fields = ('id', 'filename', 'size', 'offset', 'file', 'created')
+        read_only_fields = ('offset', 'file')
+
+
+class CompleteUploadField(serializers.PrimaryKeyRelatedField):
+    """Complete chunked upload of the requesting user"""
+
+    def get_queryset(self):
+        return Upload.objects.filter(owner_id=self.context['request'].user.pk).exclude(file='').exclude(file=None)
 
 
 class PostCreateSerializer(serializers.ModelSerializer):
+    upload_id = CompleteUploadField(write_only=True, required=False,
+                                    help_text='Chunked upload to attach instead of an inline file')
+
     class Meta:
         model = Post
         exclude = ('owner',)
+        list_serializer_class = BulkListSerializer
+
+    def validate(self, attrs):
+        upload = attrs.pop('upload_id', None)
+        if upload is not None:
+            attrs['upload'] = upload.file.name
+        return attrs
+
+
+class PostImportSerializer(PostCreateSerializer):
+    """Post of an import, primary key, owner and creation date are kept"""
+    id = serializers.IntegerField(min_value=1, required=False)
+    owner = serializers.PrimaryKeyRelatedField(queryset=User.objects.all())
+    created = serializers.DateTimeField(required=False)
+    # Storage names, the files themselves are copied over separately
+    upload = serializers.CharField(max_length=100, required=False, allow_blank=True, allow_null=True)
+    thumbnail = serializers.CharField(max_length=100, required=False, allow_blank=True, allow_null=True)
+    upload_id = None
+
+    class Meta:
+        model = Post
+        fields = ('id', 'owner', 'category', 'title', 'text', 'upload', 'thumbnail', 'created')
+        list_serializer_class = BulkListSerializer
+
+
+class CommentImportSerializer(CommentCreateSerializer):
+    """Comment of an import, primary key, owner and creation date are kept"""
+    id = serializers.IntegerField(min_value=1, required=False)
+    owner = serializers.PrimaryKeyRelatedField(queryset=User.objects.all())
+    created = serializers.DateTimeField(required=False)
+
+    class Meta(CommentCreateSerializer.Meta):
+        fields = ('id', 'owner', 'post', 'text', 'accepted', 'created')
 
 
 class PrivatePageSerializer(serializers.ModelSerializer):
     class Meta:
         model = Comment
         fields = ('accepted',)
+
+
+class SubscriptionsSerializer(serializers.ModelSerializer):
+    categories = serializers.PrimaryKeyRelatedField(many=True, queryset=Category.objects.all(),
+                                                    help_text='Categories in the weekly digest, none means all')
+
+    class Meta:
+        model = User
+        fields = ('categories',)
+
+    def update(self, instance, validated_data):
+        # Only the m2m rows change, the user row is not written back
+        instance.categories.set(validated_data['categories'])
+        return instance
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Put what views need to know about the user into the token"""
+
+    @classmethod
+    def get_token(cls, user):
+        return add_claims(super().get_token(user), user)
+
+
+def add_claims(token, user):
+    token['username'] = user.username
+    token['is_staff'] = user.is_staff
+    return token
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Refresh only for active users and with their current claims, so an access
+    token is never staler than ACCESS_TOKEN_LIFETIME
+    """
+
+    def validate(self, attrs):
+        user_id = RefreshToken(attrs['refresh'])[jwt_settings.USER_ID_CLAIM]
+        user = User.objects.filter(pk=user_id, is_active=True).first()
+        if user is None:
+            raise AuthenticationFailed('No active account found for the given token', code='no_active_account')
+        data = super().validate(attrs)
+        data['access'] = str(add_claims(AccessToken(data['access']), user))
+        return data
@@ -1,5 +1,6 @@
 from django_filters import rest_framework as filters
 
+from bboard.categories import registry as category_registry
 from bboard.models import Comment
 
 
@@ -9,8 +10,20 @@ class CharFilterInFilter(filters.BaseInFilter, filters.CharFilter):
 
 class CommentFilter(filters.FilterSet):
     """Custom filtration by Category or Post"""
-    category = CharFilterInFilter(field_name='post__category__name', lookup_expr='in', label='Category')
+    category = CharFilterInFilter(method='filter_category', label='Category')
 
     class Meta:
         model = Comment
         fields = ['post_id']
+
+    def filter_category(self, queryset, name, value):
+        # Names are resolved by the registry, no join to Category
+        return queryset.filter(post__category_id__in=category_registry.ids(value))
+
+
+class PostCommentFilter(filters.FilterSet):
+    """Comments of one Post by `accepted`"""
+
+    class Meta:
+        model = Comment
+        fields = ['accepted']
@@ -1,35 +1,188 @@
+from datetime import timedelta
+
 from django.conf import settings
-from django.core.mail import send_mail
-from django.db.models.signals import post_save
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete
 from django.dispatch import receiver
+from django.utils import timezone
+from django_q.models import Schedule
+from django_q.tasks import async_task, schedule
 
-from .models import Comment, Post
+from .cache import invalidate_posts, invalidate_all
+from .categories import registry as category_registry
+from .models import Comment, Post, Category, Deletion, User, mark_post_deleting, post_deleting
+from .search import get_backend as get_search_backend
+from .stream import comment_hub, publish_comments
 
 
-@receiver(signal=post_save, sender=Comment)
-def notify_about_comment(sender, instance, **kwargs):
-    """Send mail to Post owner about new comment"""
-    # If comment accepted == False
-    if not instance.accepted:
-        post_owner = Post.objects.get(comment=instance).owner
-        send_mail(
-            subject=f'{post_owner.username} you have new comment',
-            message=f'{instance}',
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[f'{post_owner.email}'],
-            fail_silently=False
+def comment_notification_key(post_id):
+    return f'comment-notification:{post_id}'
+
+
+def queue_new_comment_notification(post_id, comment_id):
+    """
+    Queue one mail to the Post owner for all comments left within the window.
+    The first comment of a window schedules the task, the following ones only
+    see the cache key and are picked up by the same task. The key expires with
+    the window, before the task runs, so a comment past it opens a new one.
+    The cache only saves tasks: a process that does not see the key (e.g.
+    LocMemCache per process) schedules another, which mails only the comments
+    the first one did not, see bboard.tasks.notify_about_new_comments.
+    """
+    window = settings.COMMENT_NOTIFICATION_WINDOW
+    if not window:
+        async_task('bboard.tasks.notify_about_new_comments', post_id, comment_id)
+        return
+    if cache.add(comment_notification_key(post_id), comment_id, timeout=window):
+        schedule('bboard.tasks.notify_about_new_comments', post_id, comment_id,
+                 schedule_type=Schedule.ONCE,
+                 next_run=timezone.now() + timedelta(seconds=window))
+
+
+def group_by_post(comments):
+    posts = {}
+    for comment in comments:
+        posts.setdefault(comment.post_id, []).append(comment)
+    return posts
+
+
+def comments_created(comments):
+    """
+    New comments: count them on their Posts and mail Post owners, one mail per Post.
+    Also called by bulk writes that skip signals.
+    """
+    first_comment_ids = {}
+    for post_id, post_comments in group_by_post(comments).items():
+        Post.objects.filter(pk=post_id).add_comments(
+            count=len(post_comments),
+            accepted=sum(comment.accepted for comment in post_comments),
+            last_comment_at=max(comment.created for comment in post_comments),
         )
+        unaccepted = [comment.pk for comment in post_comments if not comment.accepted]
+        if unaccepted:
+            first_comment_ids[post_id] = min(unaccepted)
+
+    def queue_notifications():
+        for post_id, comment_id in first_comment_ids.items():
+            queue_new_comment_notification(post_id, comment_id)
+
+    if first_comment_ids:
+        transaction.on_commit(queue_notifications)
+    if comment_hub.has_subscribers():
+        transaction.on_commit(lambda: publish_comments(comments))
+    notify_comment_owners([comment.pk for comment in comments if comment.accepted])
+    comments_changed({comment.post_id for comment in comments})
+
+
+def comments_accepted(comments, accepted=True):
+    """`accepted` flag of `comments` was flipped, also called by bulk writes"""
+    for post_id, post_comments in group_by_post(comments).items():
+        Post.objects.filter(pk=post_id).accept_comments(len(post_comments) if accepted else -len(post_comments))
+    if accepted:
+        notify_comment_owners([comment.pk for comment in comments])
+    comments_changed({comment.post_id for comment in comments})
+
+
+def notify_comment_owners(comment_ids):
+    """Notify Comment owners that their comments are accepted, in one task"""
+    if not comment_ids:
+        return
+    transaction.on_commit(
+        lambda: async_task('bboard.tasks.notify_about_accepted_comments', list(comment_ids))
+    )
+
+
+def posts_changed(post_ids):
+    """Posts were saved or deleted, also called by bulk writes that skip signals"""
+    get_search_backend().update(post_ids)
+    invalidate_posts(*post_ids)
+
+
+def comments_changed(post_ids):
+    """Comments of `post_ids` were saved or deleted, counters on the post list changed too"""
+    if post_ids:
+        invalidate_posts(*post_ids)
 
 
 @receiver(signal=post_save, sender=Comment)
-def notify_about_comment(sender, instance, **kwargs):
-    """Send mail to Comment owner that it's accepted"""
-    if instance.accepted:
-        comment_owner = Comment.objects.get(owner=instance.owner).owner
-        send_mail(
-            subject=f'{comment_owner.username} your comment accepted',
-            message=f'Your comment:{instance.text} to post: {instance.post.text} was accepted',
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[f'{comment_owner.email}'],
-            fail_silently=False
-        )
+def notify_about_comment(sender, instance, created, **kwargs):
+    """Count and send mail to Post owner about new comment or to Comment owner that it's accepted"""
+    if created:
+        comments_created([instance])
+        return
+    accepted_changed = instance.accepted_changed
+    if accepted_changed:
+        comments_accepted([instance], accepted=instance.accepted)
+    elif accepted_changed is None and instance.accepted:
+        # Previous state is unknown, counters are left to recompute_post_counters
+        notify_comment_owners([instance.pk])
+        comments_changed([instance.post_id])
+    else:
+        comments_changed([instance.post_id])
+
+
+@receiver(signal=post_delete, sender=Comment)
+def uncount_comment(sender, instance, **kwargs):
+    """Take deleted comment off its Post counters, unless the Post goes too"""
+    if post_deleting(instance.post_id):
+        return
+    Post.objects.filter(pk=instance.post_id).remove_comments(count=1, accepted=int(instance.accepted))
+    comments_changed([instance.post_id])
+
+
+@receiver(signal=pre_delete, sender=Post)
+def mark_deleting(sender, instance, **kwargs):
+    """
+    Let receivers of the cascaded comments skip what the Post delete covers.
+    The mark lasts until the end of the delete, see bboard.models.post_delete_scope.
+    """
+    mark_post_deleting(instance.pk)
+
+
+@receiver(signal=post_delete, sender=Post)
+@receiver(signal=post_delete, sender=Comment)
+def log_deletion(sender, instance, **kwargs):
+    """Tombstone for sync clients that have a copy of the row, comments of a deleted Post go with its tombstone"""
+    if sender is Comment and post_deleting(instance.post_id):
+        return
+    Deletion.objects.create(model=Deletion.POST if sender is Post else Deletion.COMMENT, object_id=instance.pk)
+
+
+@receiver(signal=post_save, sender=Post)
+@receiver(signal=post_delete, sender=Post)
+def invalidate_post_cache(sender, instance, **kwargs):
+    """Drop cached post list and detail page"""
+    posts_changed([instance.pk])
+
+
+def queue_thumbnails(posts):
+    """Make the thumbnails of new uploads off the request, also called by bulk writes that skip signals"""
+    post_ids = [post.pk for post in posts if post.upload_changed]
+
+    def queue():
+        for post_id in post_ids:
+            async_task('bboard.tasks.make_post_thumbnail', post_id)
+
+    if post_ids:
+        transaction.on_commit(queue)
+
+
+@receiver(signal=post_save, sender=Post)
+def queue_thumbnail(sender, instance, **kwargs):
+    queue_thumbnails([instance])
+
+
+@receiver(signal=post_save, sender=Category)
+@receiver(signal=post_delete, sender=Category)
+def invalidate_category_cache(sender, instance, **kwargs):
+    """Category is embedded in every post, drop everything"""
+    category_registry.clear()
+    invalidate_all()
+
+
+@receiver(signal=post_save, sender=User)
+def invalidate_username_cache(sender, instance, created, **kwargs):
+    """Username of the owner is on the post list"""
+    if not created and instance.username_changed is not False:
+        invalidate_posts()
@@ -0,0 +1,163 @@
+"""
+Server-sent events with new comments to the Posts of a user.
+
+Comments are published to an in-process hub after their transaction commits,
+so a stream served by the same process gets them right away. Every
+COMMENT_STREAM_POLL_INTERVAL seconds without news the stream also asks the
+database for comments after the last sent id, which picks up comments
+written by other processes and doubles as a keep-alive. Event ids are
+comment ids: a reconnect with Last-Event-ID replays only what was missed.
+
+A stream is a blocking generator: under WSGI it holds a worker thread for
+up to COMMENT_STREAM_TIMEOUT, so a process serves at most
+COMMENT_STREAM_MAX_CONNECTIONS of them. It would block the event loop
+under ASGI, where the view refuses it.
+"""
+import json
+import queue
+import threading
+import time
+
+from django.conf import settings
+from rest_framework.renderers import BaseRenderer
+
+from bboard.models import Comment, Post
+from bboard.serializers import CommentSerializer, values_lookups
+
+REPLAY_BATCH_SIZE = 100
+
+
+class Hub:
+    """Fan out events to the subscribers of a key"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = {}
+        self.count = 0
+
+    def subscribe(self, key, limit=None):
+        """Queue of the events of `key`, None if `limit` subscriptions are open already"""
+        subscription = queue.SimpleQueue()
+        with self.lock:
+            if limit is not None and self.count >= limit:
+                return None
+            self.subscribers.setdefault(key, set()).add(subscription)
+            self.count += 1
+        return subscription
+
+    def unsubscribe(self, key, subscription):
+        with self.lock:
+            subscriptions = self.subscribers.get(key, set())
+            if subscription in subscriptions:
+                subscriptions.discard(subscription)
+                self.count -= 1
+            if not subscriptions:
+                self.subscribers.pop(key, None)
+
+    def has_subscribers(self):
+        return bool(self.subscribers)
+
+    def publish(self, key, event):
+        for subscription in list(self.subscribers.get(key, ())):
+            subscription.put(event)
+
+
+comment_hub = Hub()
+
+
+def publish_comments(comments):
+    """Send new comments to the streams of their Post owners, nothing to do if nobody listens"""
+    if not comment_hub.has_subscribers():
+        return
+    owners = dict(Post.objects.filter(pk__in={comment.post_id for comment in comments}).values_list('pk', 'owner_id'))
+    for comment, data in zip(comments, CommentSerializer(comments, many=True).data):
+        comment_hub.publish(owners.get(comment.post_id), (comment.pk, data))
+
+
+def format_event(pk, data):
+    return f'id: {pk}\nevent: comment\ndata: {json.dumps(data)}\n\n'
+
+
+def missed_comments(user_id, last_id):
+    """Comments to the Posts of `user_id` after `last_id`, oldest first"""
+    queryset = Comment.objects.filter(post__owner=user_id, pk__gt=last_id).order_by('pk')
+    rows = queryset.values(*values_lookups(CommentSerializer))[:REPLAY_BATCH_SIZE]
+    return CommentSerializer(rows, many=True).data
+
+
+def comment_events(user_id, subscription, last_id=None):
+    """
+    Event stream for `user_id`, ends after COMMENT_STREAM_TIMEOUT seconds and the
+    client reconnects with Last-Event-ID, so a worker is never held for good.
+    `subscription` is taken before reading the database, nothing written meanwhile is lost.
+    """
+    try:
+        if last_id is None:
+            # New client, only comments from now on
+            last_id = Comment.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+        yield f'retry: {settings.COMMENT_STREAM_RETRY}\n\n'
+        deadline = time.monotonic() + settings.COMMENT_STREAM_TIMEOUT
+        poll = True
+        while True:
+            if poll:
+                poll = False
+                comments = missed_comments(user_id, last_id)
+                for data in comments:
+                    yield format_event(data['id'], data)
+                    last_id = data['id']
+                if len(comments) == REPLAY_BATCH_SIZE:
+                    poll = True
+                    continue
+            timeout = min(settings.COMMENT_STREAM_POLL_INTERVAL, deadline - time.monotonic())
+            if timeout <= 0:
+                return
+            try:
+                pk, data = subscription.get(timeout=timeout)
+            except queue.Empty:
+                # Also tells a dead connection apart as the write fails
+                yield ': ping\n\n'
+                poll = True
+                continue
+            if pk > last_id:
+                yield format_event(pk, data)
+                last_id = pk
+    finally:
+        comment_hub.unsubscribe(user_id, subscription)
+
+
+class CommentStream:
+    """
+    comment_events of `user_id` holding one of the COMMENT_STREAM_MAX_CONNECTIONS
+    subscriptions of the process. The response closes it, which frees the
+    subscription even if the stream was never iterated.
+    """
+
+    def __init__(self, user_id, subscription, last_id=None):
+        self.user_id = user_id
+        self.subscription = subscription
+        self.events = comment_events(user_id, subscription, last_id)
+
+    @classmethod
+    def open(cls, user_id, last_id=None):
+        """Stream of `user_id`, None if the process serves as many as it may"""
+        subscription = comment_hub.subscribe(user_id, limit=settings.COMMENT_STREAM_MAX_CONNECTIONS)
+        if subscription is None:
+            return None
+        return cls(user_id, subscription, last_id)
+
+    def __iter__(self):
+        return self.events
+
+    def close(self):
+        self.events.close()
+        comment_hub.unsubscribe(self.user_id, self.subscription)
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Lets DRF negotiate text/event-stream, errors are rendered as JSON"""
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data).encode() if data is not None else b''
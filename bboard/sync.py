@@ -0,0 +1,91 @@
+"""
+Incremental sync for clients that keep a local copy of posts and comments.
+
+The `since` cursor is opaque to clients. It holds the (updated_at, id) of the
+last Post and Comment sent and the id of the last Deletion. A response has
+up to SYNC_BATCH_SIZE rows of each kind after the cursor, oldest change
+first, and the cursor to ask with next; `more` tells the client to ask
+again right away. Every read is a range scan of an (updated_at, id) index.
+Comments deleted with their Post have no tombstone of their own, clients
+drop the comments of every deleted Post.
+"""
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from rest_framework import serializers
+
+from bboard.models import Comment, Deletion, Post
+from bboard.pagination import KeysetPagination
+from bboard.serializers import CommentSerializer, PostListSerializer, values_lookups
+
+STREAMS = (
+    ('posts', Post, PostListSerializer),
+    ('comments', Comment, CommentSerializer),
+)
+
+
+class ChangesKeyset(KeysetPagination):
+    ordering = ('updated_at', 'id')
+
+
+def initial_cursor():
+    return {'posts': None, 'comments': None, 'deleted': 0}
+
+
+def decode_cursor(encoded):
+    """Cursor of the `since` query parameter, from the start if empty"""
+    if not encoded:
+        return initial_cursor()
+    keyset = ChangesKeyset()
+    try:
+        cursor = json.loads(urlsafe_b64decode(encoded.encode('ascii')))
+        valid = (isinstance(cursor, dict) and set(cursor) == set(initial_cursor())
+                 and isinstance(cursor['deleted'], int))
+        if valid:
+            # Positions stay as sent, they go back in the next cursor as they are
+            for name, model, _ in STREAMS:
+                if cursor[name] is not None:
+                    keyset.clean_position(model, cursor[name])
+    except (TypeError, ValueError):
+        valid = False
+    if not valid:
+        raise serializers.ValidationError({'since': 'Invalid cursor.'})
+    return cursor
+
+
+def encode_cursor(cursor):
+    return urlsafe_b64encode(json.dumps(cursor).encode('ascii')).decode('ascii')
+
+
+def changes(cursor, batch_size, context=None):
+    """Rows created, changed or deleted after `cursor` and the cursor past them"""
+    keyset = ChangesKeyset()
+    cursor = dict(cursor)
+    data = {}
+    more = False
+    for name, model, serializer_class in STREAMS:
+        queryset = model.objects.order_by(*keyset.ordering)
+        if cursor[name] is not None:
+            queryset = queryset.filter(keyset.seek_filter(cursor[name]))
+        rows = list(queryset.values(*values_lookups(serializer_class))[:batch_size + 1])
+        more |= len(rows) > batch_size
+        rows = rows[:batch_size]
+        if rows:
+            cursor[name] = keyset.get_position(rows[-1])
+        data[name] = serializer_class(rows, many=True, context=context).data
+
+    deletions = list(
+        Deletion.objects.filter(pk__gt=cursor['deleted']).order_by('pk')
+        .values_list('pk', 'model', 'object_id')[:batch_size + 1]
+    )
+    more |= len(deletions) > batch_size
+    deletions = deletions[:batch_size]
+    if deletions:
+        cursor['deleted'] = deletions[-1][0]
+    data['deleted'] = {
+        'posts': [object_id for _, model, object_id in deletions if model == Deletion.POST],
+        'comments': [object_id for _, model, object_id in deletions if model == Deletion.COMMENT],
+    }
+    data['since'] = encode_cursor(cursor)
+    data['more'] = more
+    return data
@@ -1,31 +1,235 @@
+import logging
+import os
+import uuid
 from datetime import timedelta
+from io import BytesIO
+from itertools import groupby
+from operator import itemgetter
 
-from django.core.mail import EmailMultiAlternatives
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.mail import EmailMessage, EmailMultiAlternatives, get_connection, send_mail
+from django.db.models import F, Q
 from django.template.loader import render_to_string
 from django.utils import timezone
+from django.utils.html import escape
+from django.utils.text import Truncator
+from django_q.tasks import async_task
 
-from Bullboard_project.settings import DEFAULT_FROM_EMAIL
-from bboard.models import Post, User
+from bboard.cache import invalidate_posts
+from bboard.categories import registry as category_registry
+from bboard.export import export_to_file
+from bboard.models import Comment, CommentNotification, Export, Post, Upload, User, WeeklyDigest
+from bboard.replica import replica_reads
+from bboard.uploads import abandoned_parts
+
+logger = logging.getLogger(__name__)
+
+
+def weekly_digest():
+    """WeeklyDigest of the current week, computed and rendered on the first call"""
+    now = timezone.now()
+    today = timezone.localdate(now)
+    week = today - timedelta(days=today.weekday())
+    digest = WeeklyDigest.objects.filter(week=week).first()
+    if digest is not None:
+        return digest
+
+    with replica_reads():
+        post_list = list(Post.objects.filter(
+            created__range=[now - timedelta(days=7), now]
+        ).order_by('created', 'id').only('id', 'title', 'text', 'category'))
+    posts = [
+        {
+            'id': post.pk,
+            'title': post.title,
+            'text': Truncator(post.text).chars(50),
+            'url': settings.SITE_URL + post.get_absolute_url(),
+            'category_id': post.category_id,
+        }
+        for post in post_list
+    ]
+    # Each category is rendered once, recipients get the categories they follow
+    fragments = {
+        str(category_id): render_to_string('bboard/weekly_email_posts.html', {
+            'category': category_registry.get(category_id),
+            'posts': list(category_posts),
+        })
+        for category_id, category_posts in groupby(sorted(posts, key=itemgetter('category_id')),
+                                                   key=itemgetter('category_id'))
+    }
+    digest, _ = WeeklyDigest.objects.get_or_create(week=week, defaults={'posts': posts, 'fragments': fragments})
+    return digest
 
 
 # Schedule configured in Django Admin panel
 def send_mail_about_new_posts():
-    """Sending every week emails with links on a Posts"""
-    post_list = Post.objects.filter(created__range=[timezone.now() - timedelta(days=7), timezone.now()])
-    user_list = User.objects.all()
-
-    for user in user_list:
-        html_content = render_to_string(
-            'bboard/weekly_email.html',
-            {
-                'posts': post_list,
-                'user': user,
-            }
-        )
+    """Sending every week emails with links on a Posts, one django_q task per chunk of users"""
+    digest = weekly_digest()
+    if not digest.posts:
+        return
+
+    chunk_size = settings.WEEKLY_DIGEST_CHUNK_SIZE
+    user_ids = User.objects.order_by('pk').values_list('pk', flat=True).iterator(chunk_size=chunk_size)
+    first_pk = last_pk = None
+    count = 0
+    for pk in user_ids:
+        if first_pk is None:
+            first_pk = pk
+        last_pk = pk
+        count += 1
+        if count == chunk_size:
+            async_task('bboard.tasks.send_weekly_digest_chunk', first_pk, last_pk, digest.pk)
+            first_pk = None
+            count = 0
+    if first_pk is not None:
+        async_task('bboard.tasks.send_weekly_digest_chunk', first_pk, last_pk, digest.pk)
+
+
+def send_weekly_digest_chunk(first_pk, last_pk, digest_id):
+    """Send the weekly digest to users with pk in [first_pk, last_pk] over a single connection"""
+    digest = WeeklyDigest.objects.get(pk=digest_id)
+    user_list = User.objects.filter(pk__range=(first_pk, last_pk)).only('username', 'email')
+    # Followed categories of the whole chunk in one query, users without any get all of them
+    subscriptions = (User.categories.through.objects.filter(user__pk__range=(first_pk, last_pk))
+                     .order_by('user_id').values_list('user_id', 'category_id'))
+    followed = {user_id: frozenset(category_id for _, category_id in rows)
+                for user_id, rows in groupby(subscriptions, key=itemgetter(0))}
+
+    # Users following the same categories get the same email but the greeting
+    placeholder = uuid.uuid4().hex
+    bodies = {}
+    messages = []
+    for user in user_list.iterator():
+        category_ids = followed.get(user.pk)
+        if category_ids not in bodies:
+            posts_html = digest.html(category_ids)
+            bodies[category_ids] = posts_html and render_to_string(
+                'bboard/weekly_email.html',
+                {
+                    'posts_html': posts_html,
+                    'user': {'username': placeholder},
+                }
+            )
+        html_content = bodies[category_ids]
+        if not html_content:
+            # Nothing new in the followed categories
+            continue
         msg = EmailMultiAlternatives(
             subject=f"[Bulletin Board]{user.username} take a look on a new posts",
-            from_email=DEFAULT_FROM_EMAIL,
+            from_email=settings.DEFAULT_FROM_EMAIL,
             to=[user.email],
         )
-        msg.attach_alternative(html_content, "text/html")
-        msg.send()
+        msg.attach_alternative(html_content.replace(placeholder, escape(user.username)), "text/html")
+        messages.append(msg)
+
+    if messages:
+        with get_connection() as connection:
+            connection.send_messages(messages)
+
+
+def notify_about_new_comments(post_id, first_comment_id):
+    """
+    Send one mail to Post owner about comments not mailed yet, the one
+    `first_comment_id` that queued the task among them. The last mailed comment
+    is claimed in the database, overlapping tasks of the same Post never mail
+    a comment twice or skip one, whichever of them runs first.
+    """
+    notification, _ = CommentNotification.objects.get_or_create(post_id=post_id)
+    last_comment_id = notification.last_comment_id
+    while True:
+        comments = list(
+            Comment.objects.filter(post_id=post_id, pk__gt=last_comment_id, accepted=False)
+            .select_related('post__owner')
+            .order_by('pk')
+        )
+        if not comments:
+            return
+        claimed = CommentNotification.objects.filter(
+            post_id=post_id, last_comment_id=last_comment_id,
+        ).update(last_comment_id=comments[-1].pk)
+        if claimed:
+            break
+        # Another task mailed some of them, take what is left
+        last_comment_id = CommentNotification.objects.get(post_id=post_id).last_comment_id
+    post_owner = comments[0].post.owner
+    subject = (f'{post_owner.username} you have new comment' if len(comments) == 1
+               else f'{post_owner.username} you have {len(comments)} new comments')
+    send_mail(
+        subject=subject,
+        message='\n'.join(f'{comment}' for comment in comments),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        recipient_list=[f'{post_owner.email}'],
+        fail_silently=False
+    )
+
+
+def notify_about_accepted_comments(comment_ids):
+    """Send mail to Comment owners that their comments are accepted over a single connection"""
+    comments = Comment.objects.filter(pk__in=comment_ids, accepted=True).select_related('owner', 'post')
+    messages = []
+    for comment in comments:
+        comment_owner = comment.owner
+        messages.append(EmailMessage(
+            subject=f'{comment_owner.username} your comment accepted',
+            body=f'Your comment:{comment.text} to post: {comment.post.text} was accepted',
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[f'{comment_owner.email}'],
+        ))
+    if messages:
+        with get_connection() as connection:
+            connection.send_messages(messages)
+
+
+def make_post_thumbnail(post_id):
+    """Save a small JPEG of an image upload to Post.thumbnail, other files get none"""
+    try:
+        from PIL import Image
+    except ImportError:
+        logger.warning('Pillow is not installed, Post %s gets no thumbnail', post_id)
+        return
+    post = Post.objects.filter(pk=post_id).only('upload').first()
+    if post is None or not post.upload:
+        return
+    name = None
+    try:
+        with post.upload.open('rb') as upload:
+            image = Image.open(upload)
+            # Lets JPEG decode at a fraction of the full size
+            image.draft('RGB', settings.THUMBNAIL_SIZE)
+            image.thumbnail(settings.THUMBNAIL_SIZE)
+            buffer = BytesIO()
+            image.convert('RGB').save(buffer, 'JPEG', quality=85)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        pass
+    else:
+        # Named after the upload which is named after its content
+        filename = os.path.splitext(os.path.basename(post.upload.name))[0] + '.jpg'
+        name = Post.thumbnail.field.generate_filename(post, filename)
+        name = Post.thumbnail.field.storage.save(name, ContentFile(buffer.getvalue()))
+    # Skipped if the upload was replaced meanwhile, its own task is queued
+    if Post.objects.filter(pk=post_id, upload=post.upload.name).update(thumbnail=name, updated_at=timezone.now()):
+        invalidate_posts(post_id)
+
+
+# Schedule configured in Django Admin panel
+def clear_abandoned_uploads():
+    """Delete chunked uploads no chunk was sent to for CHUNKED_UPLOAD_EXPIRY, with their part files"""
+    parts = abandoned_parts()
+    expired = timezone.now() - timedelta(seconds=settings.CHUNKED_UPLOAD_EXPIRY)
+    # Part files of complete or deleted uploads are leftovers too, uploads without a chunk have none
+    Upload.objects.filter(
+        Q(pk__in=[upload_id for upload_id, _ in parts], offset__lt=F('size')) | Q(offset=0, created__lt=expired)
+    ).delete()
+    for _, path in parts:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def run_export(export_id):
+    """Write the dump of an Export queued from the admin"""
+    export = Export.objects.get(pk=export_id)
+    name = export_to_file(export.table, export.format)
+    Export.objects.filter(pk=export_id).update(file=name, finished=timezone.now())
@@ -1,5 +1,8 @@
 import json
+from unittest import mock
 
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.authtoken.models import Token
@@ -8,7 +11,10 @@ from rest_framework.test import APITestCase
 from rest_framework.test import force_authenticate
 
 from bboard import views
+from bboard.cache import get_cache
+from bboard.categories import registry as category_registry
 from bboard.models import Post, User, Category, Comment
+from bboard.pagination import CommentKeysetPagination
 from bboard.serializers import PostListSerializer, CommentSerializer
 
 
@@ -139,3 +145,130 @@ class PrivateApiTestCase(APITestCase):
         serializer_data = CommentSerializer(user_comments, many=True).data
         self.assertEqual(status.HTTP_200_OK, response.status_code)
         self.assertNotEqual(serializer_data, response.data)
+
+
+class SubscriptionsApiTestCase(APITestCase):
+    def setUp(self) -> None:
+        self.user1 = User.objects.create(username='test_username', email='test1@mail.ru')
+        self.category1 = Category.objects.create(name='ДД')
+        self.client.force_authenticate(user=self.user1)
+
+    def test_get(self):
+        response = self.client.get(reverse('subscriptions'))
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual({'categories': []}, response.data)
+
+    def test_update(self):
+        response = self.client.put(reverse('subscriptions'), {'categories': [self.category1.id]}, format='json')
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual([self.category1], list(self.user1.categories.all()))
+
+    def test_unknown_category(self):
+        response = self.client.put(reverse('subscriptions'), {'categories': [0]}, format='json')
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+
+    def test_update_with_jwt(self):
+        self.client.force_authenticate(user=None)
+        self.user1.set_password('pass')
+        self.user1.save()
+        response = self.client.post(reverse('jwt-create'), data={'email': 'test1@mail.ru', 'password': 'pass'})
+        self.client.credentials(HTTP_AUTHORIZATION=f'JWT {response.data["access"]}')
+        response = self.client.put(reverse('subscriptions'), {'categories': [self.category1.id]}, format='json')
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual([self.category1], list(self.user1.categories.all()))
+        self.user1.refresh_from_db()
+        self.assertEqual('test1@mail.ru', self.user1.email)
+        self.assertEqual({'categories': [self.category1.id]}, self.client.get(reverse('subscriptions')).data)
+
+
+class SparseFieldsApiTestCase(APITestCase):
+    def setUp(self) -> None:
+        get_cache().clear()
+        self.user1 = User.objects.create(username='test_username', email='test1@mail.ru')
+        self.category1 = Category.objects.create(name='ДД')
+        self.post_1 = Post.objects.create(title='Test title',
+                                          text='test text',
+                                          category=self.category1,
+                                          owner=self.user1)
+        Comment.objects.create(owner=self.user1, text='comment', post=self.post_1)
+        category_registry.load()
+
+    def test_list_fields(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('posts-list'), data={'fields': 'id,title'})
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual([{'id': self.post_1.id, 'title': 'Test title'}], response.data['results'])
+        select = next(query['sql'] for query in queries
+                      if 'FROM "bboard_post"' in query['sql'] and 'LIMIT' in query['sql'])
+        self.assertNotIn('"text"', select)
+
+    def test_list_expand(self):
+        response = self.client.get(reverse('posts-list'), data={'fields': 'id,category', 'expand': 'category'})
+        self.assertEqual({'id': self.category1.id, 'name': 'ДД'}, response.data['results'][0]['category'])
+
+    def test_detail_default(self):
+        response = self.client.get(reverse('posts-detail', args=(self.post_1.id,)))
+        self.assertEqual('ДД', response.data['category']['name'])
+        self.assertEqual(['comment'], [comment['text'] for comment in response.data['comment']])
+
+    def test_detail_fields(self):
+        url = reverse('posts-detail', args=(self.post_1.id,))
+        # Post only, comments are not prefetched
+        with self.assertNumQueries(1):
+            response = self.client.get(url, data={'fields': 'id,title'})
+        self.assertEqual({'id': self.post_1.id, 'title': 'Test title'}, response.data)
+        # Cached apart from the full page
+        self.assertIn('comment', self.client.get(url).data)
+
+    def test_detail_expand(self):
+        url = reverse('posts-detail', args=(self.post_1.id,))
+        with self.assertNumQueries(1):
+            response = self.client.get(url, data={'expand': 'category'})
+        self.assertNotIn('comment', response.data)
+        self.assertEqual('ДД', response.data['category']['name'])
+        response = self.client.get(url, data={'expand': ''})
+        self.assertEqual(self.category1.id, response.data['category'])
+
+    def test_unknown_fields(self):
+        response = self.client.get(reverse('posts-list'), data={'fields': 'id,password'})
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        response = self.client.get(reverse('posts-detail', args=(self.post_1.id,)), data={'expand': 'owner'})
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+
+
+class PostCommentsApiTestCase(APITestCase):
+    def setUp(self) -> None:
+        self.user1 = User.objects.create(username='test_username', email='test1@mail.ru')
+        self.category1 = Category.objects.create(name='ДД')
+        self.post_1 = Post.objects.create(title='Test title',
+                                          text='test text',
+                                          category=self.category1,
+                                          owner=self.user1)
+        self.comments = [Comment.objects.create(owner=self.user1, text=f'comment {i}', post=self.post_1,
+                                                accepted=bool(i % 2))
+                         for i in range(5)]
+        self.url = reverse('posts-comments', args=(self.post_1.id,))
+
+    def test_pages(self):
+        texts = []
+        pages = 0
+        url = self.url
+        with mock.patch.object(CommentKeysetPagination, 'page_size', 2):
+            while url:
+                response = self.client.get(url)
+                self.assertEqual(status.HTTP_200_OK, response.status_code)
+                texts += [comment['text'] for comment in response.data['results']]
+                url = response.data['next']
+                pages += 1
+        self.assertEqual([f'comment {i}' for i in range(5)], texts)
+        self.assertEqual(3, pages)
+
+    def test_filter_and_ordering(self):
+        response = self.client.get(self.url, data={'accepted': 'true', 'ordering': '-created'})
+        self.assertEqual(['comment 3', 'comment 1'], [comment['text'] for comment in response.data['results']])
+
+    def test_invalid(self):
+        self.assertEqual(status.HTTP_400_BAD_REQUEST,
+                         self.client.get(self.url, data={'ordering': 'text'}).status_code)
+        self.assertEqual(status.HTTP_404_NOT_FOUND,
+                         self.client.get(reverse('posts-comments', args=(0,))).status_code)
@@ -0,0 +1,68 @@
+from django.test import TestCase
+from django.urls import reverse
+
+from bboard.cache import get_cache
+from bboard.categories import registry as category_registry
+from bboard.metrics import registry
+from bboard.models import Post, User, Category, Comment
+
+
+class AsyncViewsTestCase(TestCase):
+    """Async endpoints must answer exactly like the sync ones"""
+
+    def setUp(self) -> None:
+        get_cache().clear()
+        registry.clear()
+        self.user1 = User.objects.create(username='test_username', email='test1@mail.ru')
+        self.category1 = Category.objects.create(name='ДД')
+        self.post_1 = Post.objects.create(title='Test title',
+                                          text='test text',
+                                          category=self.category1,
+                                          owner=self.user1)
+        self.comment = Comment.objects.create(owner=self.user1, text='comment', post=self.post_1)
+        category_registry.load()
+
+    async def test_post_list(self):
+        response = await self.async_client.get(reverse('async-posts-list'))
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('Test title', response.json()['results'][0]['title'])
+
+        cached = await self.async_client.get(reverse('async-posts-list'))
+        self.assertEqual(response.content, cached.content)
+        # Cache hit is served without a query
+        self.assertIn('bboard_db_queries_bucket{view="async-posts-list",le="0"} 1', registry.render())
+        self.assertEqual(response['ETag'], cached['ETag'])
+
+        not_modified = await self.async_client.get(reverse('async-posts-list'), IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(304, not_modified.status_code)
+
+    async def test_post_detail_same_as_sync(self):
+        url = reverse('posts-detail', args=(self.post_1.id,))
+        sync_data = (await self.async_client.get(url, ACCEPT='application/json')).json()
+        for _ in range(2):
+            response = await self.async_client.get(reverse('async-posts-detail', args=(self.post_1.id,)))
+            self.assertEqual(sync_data, response.json())
+
+    async def test_post_detail_not_found(self):
+        response = await self.async_client.get(reverse('async-posts-detail', args=(100,)))
+        self.assertEqual(404, response.status_code)
+
+    async def test_comments_require_authentication(self):
+        response = await self.async_client.get(reverse('async-comment-list'))
+        self.assertEqual(401, response.status_code)
+
+    async def test_comments(self):
+        token = self.user1.token
+        response = await self.async_client.get(reverse('async-comment-list'), AUTHORIZATION=f'JWT {token}')
+        self.assertEqual(['comment'], [comment['text'] for comment in response.json()['results']])
+        response = await self.async_client.get(reverse('async-comment-detail', args=(self.comment.pk,)),
+                                               AUTHORIZATION=f'JWT {token}')
+        self.assertEqual('comment', response.json()['text'])
+
+    async def test_read_only(self):
+        response = await self.async_client.post(reverse('async-posts-list'))
+        self.assertEqual(405, response.status_code)
+
+    async def test_metrics(self):
+        await self.async_client.get(reverse('async-posts-detail', args=(self.post_1.id,)))
+        self.assertIn('bboard_db_queries_sum{view="async-posts-detail"} 2', registry.render())
@@ -0,0 +1,99 @@
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from bboard.authentication import user_cache
+from bboard.models import Post, User, Category
+
+
+class ClaimsJWTAuthenticationTestCase(APITestCase):
+    """Testing JWT authentication without User queries"""
+
+    def setUp(self) -> None:
+        user_cache.clear()
+        self.user1 = User.objects.create_user(username='test_username', email='test1@mail.ru', password='pass')
+        self.category1 = Category.objects.create(name='ДД')
+        self.post_1 = Post.objects.create(title='Test title',
+                                          text='test text',
+                                          category=self.category1,
+                                          owner=self.user1)
+
+    def obtain_token(self):
+        response = self.client.post(reverse('jwt-create'), data={'email': 'test1@mail.ru', 'password': 'pass'})
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        return response.data['access']
+
+    def test_no_user_query(self):
+        token = self.obtain_token()
+        url = reverse('private-list')
+        # COUNT of the user's comments only
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_AUTHORIZATION=f'JWT {token}')
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+
+    def test_owner_from_claims(self):
+        token = self.obtain_token()
+        response = self.client.post(reverse('posts-list'),
+                                    data={'title': 'Test title2', 'text': 'test text2', 'category': self.category1.id},
+                                    HTTP_AUTHORIZATION=f'JWT {token}')
+        self.assertEqual(status.HTTP_201_CREATED, response.status_code)
+        self.assertEqual(self.user1, Post.objects.get(pk=response.data['id']).owner)
+
+        url = reverse('posts-detail', args=(self.post_1.id,))
+        response = self.client.patch(url, data={'title': 'New title'}, HTTP_AUTHORIZATION=f'JWT {token}')
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+
+    def test_user_token_property(self):
+        url = reverse('private-list')
+        response = self.client.get(url, HTTP_AUTHORIZATION=f'JWT {self.user1.token}')
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+
+    def test_invalid_token(self):
+        url = reverse('private-list')
+        response = self.client.get(url, HTTP_AUTHORIZATION='JWT not.a.token')
+        self.assertEqual(status.HTTP_401_UNAUTHORIZED, response.status_code)
+
+    def test_token_without_claims(self):
+        token = AccessToken.for_user(self.user1)
+        url = reverse('private-list')
+        with self.assertNumQueries(2):
+            self.client.get(url, HTTP_AUTHORIZATION=f'JWT {token}')
+        with self.assertNumQueries(1):
+            self.client.get(url, HTTP_AUTHORIZATION=f'JWT {token}')
+
+    @override_settings(JWT_USER_CACHE_TIMEOUT=0)
+    def test_token_without_claims_no_cache(self):
+        token = AccessToken.for_user(self.user1)
+        url = reverse('private-list')
+        self.client.get(url, HTTP_AUTHORIZATION=f'JWT {token}')
+        with self.assertNumQueries(2):
+            self.client.get(url, HTTP_AUTHORIZATION=f'JWT {token}')
+
+    def test_user_endpoints_read_the_row(self):
+        token = self.obtain_token()
+        response = self.client.get(reverse('user-me'), HTTP_AUTHORIZATION=f'JWT {token}')
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual('test1@mail.ru', response.data['email'])
+
+        response = self.client.post(reverse('user-set-password'),
+                                    data={'current_password': 'pass', 'new_password': 'Nu8&pass-word'},
+                                    HTTP_AUTHORIZATION=f'JWT {token}')
+        self.assertEqual(status.HTTP_204_NO_CONTENT, response.status_code)
+        self.user1.refresh_from_db()
+        self.assertTrue(self.user1.check_password('Nu8&pass-word'))
+
+    def test_refresh_reads_the_row(self):
+        response = self.client.post(reverse('jwt-create'), data={'email': 'test1@mail.ru', 'password': 'pass'})
+        refresh = response.data['refresh']
+        self.user1.is_staff = True
+        self.user1.save()
+        response = self.client.post(reverse('jwt-refresh'), data={'refresh': refresh})
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertTrue(AccessToken(response.data['access'])['is_staff'])
+
+        self.user1.is_active = False
+        self.user1.save()
+        response = self.client.post(reverse('jwt-refresh'), data={'refresh': refresh})
+        self.assertEqual(status.HTTP_401_UNAUTHORIZED, response.status_code)
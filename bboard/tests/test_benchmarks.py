@@ -0,0 +1,67 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from django.conf import settings
+from django.test import SimpleTestCase, TestCase
+
+from bboard.benchmarks import SCENARIOS, percentile, seed_data
+from bboard.models import Post, User, Category, Comment
+
+
+class BenchmarksTestCase(TestCase):
+    """Testing the data generator and the api benchmark scenario on small volumes"""
+
+    def test_percentile(self):
+        timings = list(range(1, 101))
+        self.assertEqual(50, percentile(timings, 50))
+        self.assertEqual(99, percentile(timings, 99))
+        self.assertEqual(1, percentile([1], 95))
+
+    def test_seed_data(self):
+        seed_data(users=3, categories=2, posts=10, comments=30)
+        self.assertEqual(3, User.objects.count())
+        self.assertEqual(2, Category.objects.count())
+        self.assertEqual(10, Post.objects.count())
+        self.assertEqual(30, Comment.objects.count())
+        # Counters are recomputed after the bulk insert
+        self.assertEqual(30, sum(Post.objects.values_list('comment_count', flat=True)))
+
+    def test_api_scenario(self):
+        options = {'users': 2, 'categories': 2, 'posts': 5, 'comments': 10, 'seed': 0, 'repeat': 2}
+        results = SCENARIOS['api'](options)
+        self.assertEqual(5, len(results))
+        for result in results:
+            self.assertIn(result['status'], (200, 201))
+            self.assertGreater(result['queries'], 0)
+            self.assertEqual({'min', 'p50', 'p95', 'p99', 'max', 'rps'}, set(result['latency']))
+
+    def test_asgi_scenario(self):
+        options = {'users': 2, 'categories': 2, 'posts': 5, 'comments': 10, 'seed': 0, 'repeat': 2, 'concurrency': 2}
+        results = SCENARIOS['asgi'](options)
+        self.assertEqual(4, len(results))
+        for result in results:
+            self.assertGreater(result['asgi_async_view']['rps'], 0)
+
+    def test_serialization_scenario(self):
+        options = {'users': 2, 'categories': 2, 'posts': 5, 'comments': 10, 'seed': 0, 'repeat': 2}
+        results = SCENARIOS['serialization'](options)
+        self.assertEqual(['PostListSerializer', 'CommentSerializer'], [result['serializer'] for result in results])
+
+
+class BenchmarkCommandTestCase(SimpleTestCase):
+    """Running the command itself, which sets up its own scratch database"""
+
+    def test_replica_reads_scratch_database(self):
+        # A replica that is not the scratch database has no tables at all
+        with tempfile.TemporaryDirectory() as directory:
+            env = {**os.environ, 'REPLICA_DATABASE_NAME': os.path.join(directory, 'replica.sqlite3')}
+            result = subprocess.run(
+                [sys.executable, 'manage.py', 'benchmark', 'api', '--users', '2', '--categories', '2',
+                 '--posts', '5', '--comments', '10', '--repeat', '2'],
+                cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, timeout=300)
+        self.assertEqual(0, result.returncode, result.stderr)
+        results = json.loads(result.stdout)['results']
+        self.assertTrue(all(result['status'] in (200, 201) for result in results))
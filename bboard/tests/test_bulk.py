@@ -0,0 +1,113 @@
+import json
+from unittest import mock
+
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from bboard.models import Post, User, Category, Comment
+
+
+class BulkApiTestCase(APITestCase):
+    """Testing bulk endpoints of posts, comments and private page"""
+
+    def setUp(self) -> None:
+        self.user1 = User.objects.create(username='test_username', email='test1@mail.ru')
+        self.user2 = User.objects.create(username='test_username2', email='test2@mail.ru')
+        self.category1 = Category.objects.create(name='ДД')
+        self.category2 = Category.objects.create(name='Танки')
+        self.post_1 = Post.objects.create(title='Test title',
+                                          text='test text',
+                                          category=self.category1,
+                                          owner=self.user1)
+        self.post_2 = Post.objects.create(title='Test title2',
+                                          text='test text2',
+                                          category=self.category2,
+                                          owner=self.user2)
+
+    def post_json(self, url, data, method='post'):
+        return getattr(self.client, method)(url, data=json.dumps(data), content_type='application/json')
+
+    def test_create_posts(self):
+        self.client.force_authenticate(user=self.user1)
+        data = [{'title': f'Title {i}', 'text': f'text {i}', 'category': self.category1.id} for i in range(5)]
+        with self.assertNumQueries(6):  # category lookup in bulk, INSERT in a savepoint, search index
+            response = self.post_json(reverse('posts-bulk'), data)
+        self.assertEqual(status.HTTP_201_CREATED, response.status_code)
+        self.assertEqual(7, Post.objects.count())
+        self.assertEqual(5, Post.objects.filter(owner=self.user1, title__startswith='Title').count())
+        self.assertTrue(all(row['id'] for row in response.data))
+
+    def test_create_posts_invalid(self):
+        self.client.force_authenticate(user=self.user1)
+        data = [{'title': 'Title', 'text': 'text', 'category': self.category1.id},
+                {'title': 'No text', 'category': self.category2.id + 1}]
+        response = self.post_json(reverse('posts-bulk'), data)
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        self.assertEqual({}, response.data[0])
+        self.assertEqual({'text', 'category'}, set(response.data[1]))
+        self.assertEqual(2, Post.objects.count())
+
+    @override_settings(BULK_MAX_OBJECTS=2)
+    def test_create_posts_too_many(self):
+        self.client.force_authenticate(user=self.user1)
+        data = [{'title': 'Title', 'text': 'text', 'category': self.category1.id}] * 3
+        response = self.post_json(reverse('posts-bulk'), data)
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+
+    def test_create_posts_anonymous(self):
+        response = self.post_json(reverse('posts-bulk'), [])
+        self.assertEqual(status.HTTP_401_UNAUTHORIZED, response.status_code)
+
+    def test_update_posts(self):
+        post_3 = Post.objects.create(title='Test title3', text='test text3', category=self.category1, owner=self.user1)
+        self.client.force_authenticate(user=self.user1)
+        data = [{'id': self.post_1.id, 'title': 'New title'}, {'id': post_3.id, 'category': self.category2.id}]
+        response = self.post_json(reverse('posts-bulk'), data, method='patch')
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.post_1.refresh_from_db()
+        post_3.refresh_from_db()
+        self.assertEqual('New title', self.post_1.title)
+        self.assertEqual(self.category2, post_3.category)
+
+    def test_update_foreign_posts(self):
+        self.client.force_authenticate(user=self.user1)
+        data = [{'id': self.post_1.id, 'title': 'New title'}, {'id': self.post_2.id, 'title': 'New title'}]
+        response = self.post_json(reverse('posts-bulk'), data, method='patch')
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        self.post_1.refresh_from_db()
+        self.assertEqual('Test title', self.post_1.title)
+
+    def test_delete_posts(self):
+        self.client.force_authenticate(user=self.user1)
+        response = self.post_json(reverse('posts-bulk'), {'ids': [self.post_1.id, self.post_2.id]}, method='delete')
+        self.assertEqual(status.HTTP_204_NO_CONTENT, response.status_code)
+        self.assertEqual([self.post_2], list(Post.objects.all()))
+
+    @mock.patch('bboard.signals.schedule')
+    def test_create_comments(self, schedule):
+        self.client.force_authenticate(user=self.user1)
+        data = [{'text': f'comment {i}', 'post': self.post_2.id} for i in range(3)]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.post_json(reverse('comment-bulk'), data)
+        self.assertEqual(status.HTTP_201_CREATED, response.status_code)
+        self.assertEqual(3, Comment.objects.filter(owner=self.user1, post=self.post_2).count())
+        # One notification for the Post owner
+        schedule.assert_called_once()
+
+    @mock.patch('bboard.signals.async_task')
+    def test_accept_comments(self, async_task):
+        comments = [Comment.objects.create(owner=self.user2, text=f'comment {i}', post=self.post_1)
+                    for i in range(3)]
+        foreign = Comment.objects.create(owner=self.user1, text='comment', post=self.post_2)
+        self.client.force_authenticate(user=self.user1)
+        ids = [comment.id for comment in comments[:2]] + [foreign.id]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.post_json(reverse('private-accept'), {'ids': ids})
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(2, response.data['accepted'])
+        self.assertEqual({comments[0].id, comments[1].id},
+                         set(Comment.objects.filter(accepted=True).values_list('id', flat=True)))
+        async_task.assert_called_once_with('bboard.tasks.notify_about_accepted_comments',
+                                           [comments[0].id, comments[1].id])
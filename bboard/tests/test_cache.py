@@ -0,0 +1,95 @@
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from bboard.cache import get_cache
+from bboard.models import Post, User, Category, Comment
+
+
+class PostCacheTestCase(APITestCase):
+    """Testing response cache of Post endpoints"""
+
+    def setUp(self) -> None:
+        get_cache().clear()
+        self.user1 = User.objects.create(username='test_username', email='test1@mail.ru')
+        self.category1 = Category.objects.create(name='ДД')
+        self.post_1 = Post.objects.create(title='Test title',
+                                          text='test text',
+                                          category=self.category1,
+                                          owner=self.user1)
+        self.list_url = reverse('posts-list')
+        self.detail_url = reverse('posts-detail', args=(self.post_1.id,))
+
+    def test_list_cached(self):
+        self.client.get(self.list_url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.list_url)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual('Test title', response.data['results'][0]['title'])
+
+    def test_list_keyed_by_query(self):
+        self.client.get(self.list_url)
+        with self.assertNumQueries(2):
+            self.client.get(self.list_url, data={'page': 1})
+
+    def test_post_update_invalidates(self):
+        self.client.get(self.list_url)
+        self.client.get(self.detail_url)
+        self.post_1.title = 'New title'
+        self.post_1.save()
+        self.assertEqual('New title', self.client.get(self.list_url).data['results'][0]['title'])
+        self.assertEqual('New title', self.client.get(self.detail_url).data['title'])
+
+    def test_comment_invalidates_detail(self):
+        self.client.get(self.detail_url)
+        Comment.objects.create(owner=self.user1, text='test comment', post=self.post_1, accepted=False)
+        self.assertEqual(1, len(self.client.get(self.detail_url).data['comment']))
+
+    def test_category_invalidates(self):
+        self.client.get(self.detail_url)
+        self.category1.name = 'Танки'
+        self.category1.save()
+        self.assertEqual('Танки', self.client.get(self.detail_url).data['category']['name'])
+
+    def test_username_invalidates(self):
+        self.client.get(self.list_url)
+        self.client.get(self.detail_url)
+        user = User.objects.get(pk=self.user1.pk)
+        user.username = 'new_username'
+        user.save()
+        self.assertEqual('new_username', self.client.get(self.list_url).data['results'][0]['owner'])
+        # Other changes of the user keep the cache
+        user.is_active = False
+        user.save()
+        with self.assertNumQueries(0):
+            self.client.get(self.list_url)
+
+    @override_settings(ALLOWED_HOSTS=['one.example.com', 'two.example.com'])
+    def test_detail_keyed_by_host(self):
+        self.client.get(self.detail_url, HTTP_HOST='one.example.com')
+        with self.assertNumQueries(0):
+            self.client.get(self.detail_url, HTTP_HOST='one.example.com')
+        with self.assertNumQueries(2):
+            self.client.get(self.detail_url, HTTP_HOST='two.example.com')
+
+    def test_not_found_not_cached(self):
+        url = reverse('posts-detail', args=(self.post_1.id + 1,))
+        self.assertEqual(status.HTTP_404_NOT_FOUND, self.client.get(url).status_code)
+        Post.objects.create(title='Test title2', text='test text2', category=self.category1, owner=self.user1)
+        self.assertEqual(status.HTTP_200_OK, self.client.get(url).status_code)
+
+    def test_etag(self):
+        response = self.client.get(self.detail_url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(status.HTTP_304_NOT_MODIFIED, response.status_code)
+
+        self.post_1.save()
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+
+    def test_last_modified(self):
+        response = self.client.get(self.list_url)
+        response = self.client.get(self.list_url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(status.HTTP_304_NOT_MODIFIED, response.status_code)
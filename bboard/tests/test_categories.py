@@ -0,0 +1,32 @@
+from django.test import TestCase
+
+from bboard.categories import registry
+from bboard.models import Category
+
+
+class CategoryRegistryTestCase(TestCase):
+    """Testing in-process Category registry"""
+
+    def setUp(self) -> None:
+        self.category1 = Category.objects.create(name='ДД')
+        self.category2 = Category.objects.create(name='Танки')
+
+    def test_loaded_once(self):
+        registry.load()
+        with self.assertNumQueries(0):
+            self.assertEqual('ДД', registry.get(self.category1.pk).name)
+            self.assertEqual([self.category2.pk], registry.ids(['Танки', 'unknown']))
+
+    def test_invalidated_on_save_and_delete(self):
+        registry.load()
+        self.category1.name = 'Хилы'
+        self.category1.save()
+        self.assertEqual([self.category1.pk], registry.ids(['Хилы']))
+        self.category2.delete()
+        self.assertEqual([], registry.ids(['Танки']))
+
+    def test_unknown_id_reloads(self):
+        registry.load()
+        Category.objects.bulk_create([Category(name='Саппорты')])
+        category = Category.objects.get(name='Саппорты')
+        self.assertEqual('Саппорты', registry.get(category.pk).name)
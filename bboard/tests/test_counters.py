@@ -0,0 +1,133 @@
+import json
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import DatabaseError, connection, transaction
+from django.db.models.signals import post_delete
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from bboard.models import Post, User, Category, Comment, post_deleting
+
+
+class PostCommentCountersTestCase(APITestCase):
+    """Testing denormalized comment counters of Post"""
+
+    def setUp(self) -> None:
+        self.user1 = User.objects.create(username='test_username', email='test1@mail.ru')
+        self.user2 = User.objects.create(username='test_username2', email='test2@mail.ru')
+        self.category1 = Category.objects.create(name='ДД')
+        self.post_1 = Post.objects.create(title='Test title',
+                                          text='test text',
+                                          category=self.category1,
+                                          owner=self.user1)
+        self.post_2 = Post.objects.create(title='Test title2',
+                                          text='test text2',
+                                          category=self.category1,
+                                          owner=self.user2)
+
+    def create_comment(self, post, accepted=False):
+        return Comment.objects.create(owner=self.user2, text='test comment', post=post, accepted=accepted)
+
+    def assertCounters(self, post, comment_count, accepted_comment_count, last_comment_at):
+        post.refresh_from_db()
+        self.assertEqual((comment_count, accepted_comment_count, last_comment_at),
+                         (post.comment_count, post.accepted_comment_count, post.last_comment_at))
+
+    def test_create_accept_delete(self):
+        first = self.create_comment(self.post_1)
+        second = self.create_comment(self.post_1, accepted=True)
+        self.assertCounters(self.post_1, 2, 1, second.created)
+
+        first = Comment.objects.get(pk=first.pk)
+        first.accepted = True
+        first.save()
+        first.save()
+        self.assertCounters(self.post_1, 2, 2, second.created)
+
+        first.accepted = False
+        first.save()
+        self.assertCounters(self.post_1, 2, 1, second.created)
+
+        second.delete()
+        self.assertCounters(self.post_1, 1, 0, first.created)
+        first.delete()
+        self.assertCounters(self.post_1, 0, 0, None)
+        self.assertCounters(self.post_2, 0, 0, None)
+
+    def test_bulk(self):
+        self.client.force_authenticate(user=self.user1)
+        data = [{'text': f'comment {i}', 'post': post.id} for i, post in enumerate([self.post_1] * 3 + [self.post_2])]
+        self.client.post(reverse('comment-bulk'), data=json.dumps(data), content_type='application/json')
+        self.assertEqual(3, Post.objects.get(pk=self.post_1.pk).comment_count)
+        self.assertEqual(1, Post.objects.get(pk=self.post_2.pk).comment_count)
+
+        ids = list(self.post_1.comment.values_list('id', flat=True))
+        self.client.post(reverse('private-accept'), data=json.dumps({'ids': ids}), content_type='application/json')
+        self.assertEqual(3, Post.objects.get(pk=self.post_1.pk).accepted_comment_count)
+
+    def test_recompute(self):
+        comment = self.create_comment(self.post_1, accepted=True)
+        self.create_comment(self.post_2)
+        Post.objects.update(comment_count=10, accepted_comment_count=10, last_comment_at=None)
+        call_command('recompute_post_counters', batch_size=1, stdout=StringIO())
+        self.assertCounters(self.post_1, 1, 1, comment.created)
+        self.assertCounters(self.post_2, 1, 0, self.post_2.comment.get().created)
+
+    def test_counters_behind(self):
+        # bulk_create skips the signals, counters stay at 0
+        comments = Comment.objects.bulk_create([Comment(owner=self.user2, text='comment', post=self.post_1)
+                                                for _ in range(2)])
+        Comment.objects.get(pk=comments[0].pk).delete()
+        self.assertCounters(self.post_1, 0, 0, Comment.objects.get().created)
+
+    def test_cascade_queries(self):
+        Comment.objects.bulk_create([Comment(owner=self.user2, text='comment', post=self.post_1)
+                                     for _ in range(20)])
+        with CaptureQueriesContext(connection) as queries:
+            self.post_1.delete()
+        self.assertFalse([query for query in queries if query['sql'].startswith('UPDATE "bboard_post"')])
+        self.assertFalse(Post.objects.filter(pk=self.post_1.pk).exists())
+
+        # Counters are kept on other deletes in the same context
+        comment = self.create_comment(self.post_2)
+        self.create_comment(self.post_2)
+        comment.delete()
+        self.assertCounters(self.post_2, 1, 0, self.post_2.comment.get().created)
+
+    def test_failed_delete(self):
+        """A delete that fails leaves the comments of its posts counted"""
+        comment = self.create_comment(self.post_1)
+        self.create_comment(self.post_1)
+
+        def fail(**kwargs):
+            raise DatabaseError('delete failed')
+
+        post_delete.connect(fail, sender=Post, dispatch_uid='test_failed_delete')
+        self.addCleanup(post_delete.disconnect, sender=Post, dispatch_uid='test_failed_delete')
+        for delete in (self.post_1.delete, Post.objects.filter(pk=self.post_1.pk).delete,
+                       self.category1.delete, User.objects.filter(pk=self.user1.pk).delete):
+            with self.assertRaises(DatabaseError), transaction.atomic():
+                delete()
+        self.assertFalse(post_deleting(self.post_1.pk))
+        post_delete.disconnect(sender=Post, dispatch_uid='test_failed_delete')
+        comment.delete()
+        self.assertCounters(self.post_1, 1, 0, self.post_1.comment.get().created)
+
+    def test_comment_not_moved(self):
+        comment = self.create_comment(self.post_1)
+        self.client.force_authenticate(user=self.user2)
+        response = self.client.put(reverse('comment-detail', args=(comment.pk,)),
+                                   data={'text': 'edited', 'post': self.post_2.pk})
+        self.assertEqual(200, response.status_code)
+        comment.refresh_from_db()
+        self.assertEqual(('edited', self.post_1.pk), (comment.text, comment.post_id))
+        self.assertCounters(self.post_1, 1, 0, comment.created)
+        self.assertCounters(self.post_2, 0, 0, None)
+
+    def test_list_and_ordering(self):
+        self.create_comment(self.post_2)
+        response = self.client.get(reverse('posts-list'), data={'ordering': '-comment_count'})
+        self.assertEqual([self.post_2.id, self.post_1.id], [row['id'] for row in response.data['results']])
+        self.assertEqual(1, response.data['results'][0]['comment_count'])
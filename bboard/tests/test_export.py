@@ -0,0 +1,101 @@
+import csv
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django_q.conf import Conf
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from bboard.export import export_stream
+from bboard.models import Category, Comment, Export, Post, User
+
+
+class ExportTestCase(APITestCase):
+
+    def setUp(self) -> None:
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        self.user1 = User.objects.create_user(username='test_username', email='test1@mail.ru', password='secret')
+        self.category1 = Category.objects.create(name='ДД')
+        self.posts = [Post.objects.create(title=f'Title {i}',
+                                          text=f'text, "quoted"\n{i}',
+                                          category=self.category1,
+                                          owner=self.user1)
+                      for i in range(5)]
+        Comment.objects.create(owner=self.user1, text='comment', post=self.posts[0])
+
+    @staticmethod
+    def ndjson(data):
+        return [json.loads(line) for line in gzip.decompress(data).decode().splitlines()]
+
+    @staticmethod
+    def csv(data):
+        return list(csv.DictReader(io.StringIO(gzip.decompress(data).decode())))
+
+    @override_settings(EXPORT_CHUNK_SIZE=2)
+    def test_ndjson(self):
+        rows = self.ndjson(b''.join(export_stream('posts', 'ndjson')))
+        self.assertEqual([post.pk for post in self.posts], [row['id'] for row in rows])
+        self.assertEqual('text, "quoted"\n0', rows[0]['text'])
+        self.assertEqual(1, rows[0]['comment_count'])
+
+    @override_settings(EXPORT_CHUNK_SIZE=2)
+    def test_csv(self):
+        rows = self.csv(b''.join(export_stream('posts', 'csv')))
+        self.assertEqual([str(post.pk) for post in self.posts], [row['id'] for row in rows])
+        self.assertEqual('text, "quoted"\n4', rows[4]['text'])
+        self.assertEqual(self.posts[0].created.isoformat(), rows[0]['created'])
+
+    def test_empty_table(self):
+        Comment.objects.all().delete()
+        self.assertEqual([], self.ndjson(b''.join(export_stream('comments', 'ndjson'))))
+        self.assertEqual([], self.csv(b''.join(export_stream('comments', 'csv'))))
+
+    def test_no_passwords(self):
+        rows = self.ndjson(b''.join(export_stream('users', 'ndjson')))
+        self.assertEqual('test_username', rows[0]['username'])
+        self.assertNotIn('password', rows[0])
+
+    def test_command(self):
+        with override_settings(MEDIA_ROOT=self.media_root):
+            call_command('export', 'categories', '--format', 'csv', stdout=io.StringIO())
+            call_command('export', stdout=io.StringIO())
+        files = sorted(os.listdir(os.path.join(self.media_root, 'exports')))
+        self.assertEqual(5, len(files))
+        categories = next(name for name in files if name.endswith('.csv.gz'))
+        with open(os.path.join(self.media_root, 'exports', categories), 'rb') as file:
+            self.assertEqual([{'id': str(self.category1.pk), 'name': 'ДД'}], self.csv(file.read()))
+
+    @mock.patch.object(Conf, 'SYNC', True)
+    def test_admin_job(self):
+        admin = User.objects.create_superuser(username='admin', email='admin@mail.ru', password='secret')
+        self.client.force_login(admin)
+        with override_settings(MEDIA_ROOT=self.media_root), self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('admin:bboard_export_add'), {'table': 'comments', 'format': 'ndjson'})
+        self.assertEqual(302, response.status_code)
+        export = Export.objects.get()
+        self.assertIsNotNone(export.finished)
+        with open(os.path.join(self.media_root, export.file.name), 'rb') as file:
+            self.assertEqual(['comment'], [row['text'] for row in self.ndjson(file.read())])
+
+    def test_download(self):
+        url = reverse('export', args=('posts', 'ndjson'))
+        self.client.force_authenticate(user=self.user1)
+        self.assertEqual(status.HTTP_403_FORBIDDEN, self.client.get(url).status_code)
+
+        self.user1.is_staff = True
+        self.user1.save()
+        response = self.client.get(url)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual('attachment; filename="posts.ndjson.gz"', response['Content-Disposition'])
+        self.assertEqual(5, len(self.ndjson(b''.join(response.streaming_content))))
+        self.assertEqual(status.HTTP_404_NOT_FOUND,
+                         self.client.get(reverse('export', args=('tokens', 'ndjson'))).status_code)
@@ -0,0 +1,159 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from bboard.export import export_stream
+from bboard.imports import checkpoint_path, import_batch, read_rows
+from bboard.models import Category, Comment, CommentNotification, Post, User
+from bboard.search import get_backend as get_search_backend
+
+
+class ImportTestCase(TestCase):
+
+    def setUp(self) -> None:
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.user1 = User.objects.create_user(username='test_username', email='test1@mail.ru', password='secret')
+        self.category1 = Category.objects.create(name='ДД')
+
+    def write(self, name, rows):
+        path = os.path.join(self.dir, name)
+        with open(path, 'w') as file:
+            file.writelines(row if isinstance(row, str) else json.dumps(row) + '\n' for row in rows)
+        return path
+
+    def post_row(self, pk, **kwargs):
+        return {'id': pk, 'owner_id': self.user1.pk, 'category_id': self.category1.pk,
+                'title': f'Title {pk}', 'text': f'text {pk}', **kwargs}
+
+    def run_import(self, *args):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command('import_ndjson', *args, stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+
+    @mock.patch('bboard.signals.async_task')
+    def test_round_trip(self, async_task):
+        posts = [Post.objects.create(title=f'Title {i}', text=f'text {i}', category=self.category1,
+                                     owner=self.user1)
+                 for i in range(3)]
+        for accepted in (True, False):
+            Comment.objects.create(owner=self.user1, text='comment', post=posts[0], accepted=accepted)
+        # Dumps have milliseconds, keep to whole seconds
+        Post.objects.update(created='2021-01-01T00:00:00Z')
+        Post.objects.filter(pk=posts[1].pk).update(created='2020-01-01T00:00:00Z')
+        Comment.objects.update(created='2021-01-02T00:00:00Z')
+        Post.objects.recompute_comment_counters()
+        expected_posts = list(Post.objects.order_by('pk').values('id', 'title', 'created', 'comment_count',
+                                                                 'accepted_comment_count', 'last_comment_at'))
+        expected_comments = list(Comment.objects.order_by('pk').values('id', 'post', 'accepted', 'created'))
+
+        paths = {}
+        for table in ('posts', 'comments'):
+            paths[table] = os.path.join(self.dir, f'{table}.ndjson.gz')
+            with open(paths[table], 'wb') as file:
+                file.writelines(export_stream(table, 'ndjson'))
+        Post.objects.all().delete()
+        async_task.reset_mock()
+
+        self.run_import('posts', paths['posts'], '--batch-size', '2')
+        stdout, _ = self.run_import('comments', paths['comments'])
+        self.assertIn('Imported 2 comments, rejected 0', stdout)
+        self.assertEqual(expected_posts, list(Post.objects.order_by('pk').values(
+            'id', 'title', 'created', 'comment_count', 'accepted_comment_count', 'last_comment_at')))
+        self.assertEqual(expected_comments,
+                         list(Comment.objects.order_by('pk').values('id', 'post', 'accepted', 'created')))
+        self.assertEqual([posts[2].pk], list(get_search_backend().search(Post.objects.all(), 'Title 2')
+                                             .values_list('pk', flat=True)[:1]))
+        # No mails about imported comments, now or with the next one
+        async_task.assert_not_called()
+        self.assertEqual(expected_comments[-1]['id'], CommentNotification.objects.get(post=posts[0]).last_comment_id)
+        self.assertFalse(os.path.exists(checkpoint_path(paths['comments'])))
+
+    def test_counters_of_posts_commented_on(self):
+        posts = [Post.objects.create(title=f'Title {i}', text=f'text {i}', category=self.category1,
+                                     owner=self.user1)
+                 for i in range(3)]
+        Post.objects.update(updated_at='2021-01-01T00:00:00Z')
+        path = self.write('comments.ndjson', [
+            {'owner_id': self.user1.pk, 'post_id': posts[0].pk, 'text': 'comment', 'accepted': True,
+             'created': '2021-01-02T00:00:00Z'},
+        ])
+        # Counters of other posts are right, recomputing them would only flood /sync/
+        with mock.patch('bboard.management.commands.import_ndjson.call_command') as command:
+            self.run_import('comments', path)
+        command.assert_not_called()
+        posts = list(Post.objects.order_by('pk'))
+        self.assertEqual([1, 0, 0], [post.comment_count for post in posts])
+        self.assertEqual(1, posts[0].accepted_comment_count)
+        self.assertEqual(timezone.now().year, posts[0].updated_at.year)
+        self.assertEqual([2021, 2021], [post.updated_at.year for post in posts[1:]])
+
+    def test_rejected_rows(self):
+        path = self.write('posts.ndjson', [
+            self.post_row(1),
+            'not json\n',
+            '\n',
+            self.post_row(2, category_id=1000),
+            self.post_row(3, owner_id=None),
+            self.post_row(4, title=''),
+            self.post_row(5),
+        ])
+        stdout, stderr = self.run_import('posts', path)
+        self.assertEqual([1, 5], list(Post.objects.order_by('pk').values_list('pk', flat=True)))
+        # Rows without a date are stamped as usual
+        self.assertIsNotNone(Post.objects.get(pk=1).created)
+        self.assertIn('Imported 2 posts, rejected 4', stdout)
+        self.assertEqual(['Line 2', 'Line 4', 'Line 5', 'Line 6'],
+                         [line.split(':')[0] for line in stderr.splitlines()])
+
+    def test_taken_ids(self):
+        Post.objects.create(id=2, title='Title', text='text', category=self.category1, owner=self.user1)
+        path = self.write('posts.ndjson', [self.post_row(1), self.post_row(2), self.post_row(1), self.post_row(3)])
+        stdout, stderr = self.run_import('posts', path, '--batch-size', '2')
+        self.assertEqual([1, 2, 3], list(Post.objects.order_by('pk').values_list('pk', flat=True)))
+        self.assertEqual('Title', Post.objects.get(pk=2).title)
+        self.assertIn('Imported 2 posts, rejected 2', stdout)
+        self.assertEqual(['Line 2', 'Line 3'], [line.split(':')[0] for line in stderr.splitlines()])
+
+    def test_created_kept(self):
+        rows = list(read_rows('posts', [json.dumps(self.post_row(1, created='2020-01-01T00:00:00Z'))]))
+        import_batch('posts', rows)
+        self.assertEqual(2020, Post.objects.get(pk=1).created.year)
+        self.assertEqual(timezone.now().year, Post.objects.get(pk=1).updated_at.year)
+        # Nothing changed for other writes
+        post = Post.objects.create(title='Title', text='text', category=self.category1, owner=self.user1)
+        self.assertIsNotNone(post.created)
+
+    def test_resume(self):
+        path = self.write('posts.ndjson', [self.post_row(pk) for pk in range(1, 6)])
+        with mock.patch('bboard.imports.import_batch', side_effect=[(2, [], set()), RuntimeError]) as batch:
+            with self.assertRaises(RuntimeError):
+                self.run_import('posts', path, '--transaction-size', '2')
+        self.assertEqual(2, batch.call_count)
+        with open(checkpoint_path(path)) as file:
+            self.assertEqual({'table': 'posts', 'line': 2, 'inserted': 2, 'rejected': 0}, json.load(file))
+
+        with self.assertRaises(CommandError):
+            self.run_import('posts', path)
+        with self.assertRaises(CommandError):
+            self.run_import('comments', path, '--resume')
+        stdout, _ = self.run_import('posts', path, '--resume')
+        # Lines 1 and 2 are taken as done
+        self.assertEqual([3, 4, 5], list(Post.objects.order_by('pk').values_list('pk', flat=True)))
+        self.assertIn('Imported 5 posts', stdout)
+        self.assertFalse(os.path.exists(checkpoint_path(path)))
+
+    def test_batch_queries(self):
+        for size in (1, 50):
+            rows = list(read_rows('posts', [json.dumps(self.post_row(pk, created='2020-01-01T00:00:00Z'))
+                                            for pk in range(size * 10, size * 11)]))
+            # owner, category, taken ids and the INSERT
+            with self.assertNumQueries(4):
+                self.assertEqual((size, [], set()), import_batch('posts', rows))
@@ -0,0 +1,59 @@
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from bboard.cache import get_cache
+from bboard.categories import registry as category_registry
+from bboard.metrics import registry
+from bboard.models import Post, User, Category
+
+
+class RequestMetricsTestCase(APITestCase):
+    """Testing request metrics middleware and /metrics/ endpoint"""
+
+    def setUp(self) -> None:
+        registry.clear()
+        get_cache().clear()
+        self.user1 = User.objects.create(username='test_username', email='test1@mail.ru')
+        self.admin = User.objects.create(username='admin', email='admin@mail.ru', is_staff=True)
+        self.category1 = Category.objects.create(name='ДД')
+        self.post_1 = Post.objects.create(title='Test title',
+                                          text='test text',
+                                          category=self.category1,
+                                          owner=self.user1)
+        category_registry.load()
+
+    def get_metrics(self):
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(reverse('metrics'))
+        self.client.force_authenticate(user=None)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        return response.content.decode()
+
+    def test_metrics(self):
+        self.client.get(reverse('posts-list'))
+        self.client.get(reverse('posts-list'))
+        content = self.get_metrics()
+        self.assertIn('# TYPE bboard_request_duration_seconds histogram', content)
+        self.assertIn('bboard_request_duration_seconds_count{view="posts-list"} 2', content)
+        # Paginator COUNT and the page of posts, then a cache hit
+        self.assertIn('bboard_db_queries_sum{view="posts-list"} 2', content)
+        self.assertIn('bboard_serialization_duration_seconds_count{view="posts-list"} 2', content)
+        self.assertIn('bboard_response_size_bytes_bucket{view="posts-list",le="+Inf"} 2', content)
+
+    def test_admin_only(self):
+        self.client.force_authenticate(user=self.user1)
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(status.HTTP_403_FORBIDDEN, response.status_code)
+
+    @override_settings(METRICS_SERVER_TIMING=True)
+    def test_server_timing(self):
+        response = self.client.get(reverse('posts-detail', args=(self.post_1.id,)))
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('desc="2 queries"', response['Server-Timing'])
+
+    @override_settings(METRICS_SERVER_TIMING=False)
+    def test_no_server_timing(self):
+        response = self.client.get(reverse('posts-list'))
+        self.assertFalse(response.has_header('Server-Timing'))
@@ -0,0 +1,78 @@
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from bboard.models import Post, User, Category, Comment
+from bboard.pagination import KeysetPagination
+
+
+class KeysetPaginationTestCase(APITestCase):
+    """Testing opt-in keyset pagination on posts and private feeds"""
+
+    def setUp(self) -> None:
+        self.user1 = User.objects.create(username='test_username', email='test1@mail.ru')
+        self.category1 = Category.objects.create(name='ДД')
+        self.posts = [Post.objects.create(title=f'Title {i}',
+                                          text=f'text {i}',
+                                          category=self.category1,
+                                          owner=self.user1) for i in range(25)]
+        # Same timestamp for every post, ordering must fall back to id
+        Post.objects.update(created=self.posts[0].created)
+
+    def walk(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(status.HTTP_200_OK, response.status_code)
+            self.assertNotIn('count', response.data)
+            ids += [row['id'] for row in response.data['results']]
+            url = response.data['next']
+        return ids
+
+    def test_walk_posts(self):
+        url = reverse('posts-list') + '?cursor='
+        expected = sorted((post.id for post in self.posts), reverse=True)
+        self.assertEqual(expected, self.walk(url))
+
+    def test_walk_private(self):
+        comments = [Comment.objects.create(owner=self.user1,
+                                           text=f'comment {i}',
+                                           post=self.posts[i % 3],
+                                           accepted=False) for i in range(12)]
+        self.client.force_authenticate(user=self.user1)
+        url = reverse('private-list') + '?cursor='
+        expected = sorted((comment.id for comment in comments), reverse=True)
+        self.assertEqual(expected, self.walk(url))
+
+    def test_no_count_query(self):
+        url = reverse('posts-list')
+        response = self.client.get(url, data={'cursor': ''})
+        with self.assertNumQueries(1):
+            self.client.get(response.data['next'])
+
+    def test_invalid_cursor(self):
+        url = reverse('posts-list')
+        response = self.client.get(url, data={'cursor': 'not-a-cursor'})
+        self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
+
+    def test_invalid_cursor_values(self):
+        self.client.force_authenticate(user=self.user1)
+        keyset = KeysetPagination()
+        for position in (['x', 'y'], [None, 1], [str(self.posts[0].created), {}], [1]):
+            for url in (reverse('posts-list'), reverse('private-list')):
+                response = self.client.get(url, data={'cursor': keyset.encode_cursor(position)})
+                self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
+
+    def test_page_number_by_default(self):
+        url = reverse('posts-list')
+        response = self.client.get(url)
+        self.assertEqual(25, response.data['count'])
+        self.assertEqual(10, len(response.data['results']))
+
+    def test_ordering_with_cursor(self):
+        url = reverse('posts-list')
+        response = self.client.get(url, data={'cursor': '', 'ordering': 'comment_count'})
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        self.assertIn('ordering', response.data)
+        response = self.client.get(url, data={'ordering': 'comment_count'})
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
@@ -0,0 +1,94 @@
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from bboard.categories import registry as category_registry
+from bboard.models import Post, User, Category, Comment
+
+
+class PostQueryCountTestCase(APITestCase):
+    """Number of queries must not grow with page size or comment count"""
+
+    def setUp(self) -> None:
+        self.user1 = User.objects.create(username='test_username', email='test1@mail.ru')
+        self.user2 = User.objects.create(username='test_username2', email='test2@mail.ru')
+        self.category1 = Category.objects.create(name='ДД')
+        self.post_1 = Post.objects.create(title='Test title',
+                                          text='test text',
+                                          category=self.category1,
+                                          owner=self.user1)
+        category_registry.load()
+
+    def create_posts(self, count):
+        for i in range(count):
+            Post.objects.create(title=f'Title {i}',
+                                text=f'text {i}',
+                                category=self.category1,
+                                owner=self.user1 if i % 2 else self.user2)
+
+    def create_comments(self, count):
+        for i in range(count):
+            Comment.objects.create(owner=self.user2,
+                                   text=f'comment {i}',
+                                   post=self.post_1,
+                                   accepted=False)
+
+    def test_list(self):
+        url = reverse('posts-list')
+        # COUNT for paginator + page of posts joined with owners
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(1, len(response.data['results']))
+
+        self.create_posts(9)
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(10, len(response.data['results']))
+
+    @override_settings(COMMENT_PREVIEW_SIZE=5)
+    def test_retrieve(self):
+        url = reverse('posts-detail', args=(self.post_1.id,))
+        # post + latest comments, category comes from the registry
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual([], response.data['comment'])
+
+        self.create_comments(8)
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual([f'comment {i}' for i in range(7, 2, -1)], [c['text'] for c in response.data['comment']])
+
+    def test_post_comments(self):
+        url = reverse('posts-comments', args=(self.post_1.id,))
+        self.create_comments(3)
+        # post exists + page of comments, no COUNT
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(3, len(response.data['results']))
+
+    def test_private_list(self):
+        url = reverse('private-list')
+        self.client.force_authenticate(user=self.user1)
+        self.create_comments(1)
+        with self.assertNumQueries(2):
+            self.client.get(url)
+
+        self.create_comments(5)
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(6, len(response.data['results']))
+
+    def test_private_list_category_filter(self):
+        url = reverse('private-list')
+        self.client.force_authenticate(user=self.user1)
+        self.create_comments(2)
+        # Category names are resolved by the registry, no join to Category
+        with self.assertNumQueries(2) as queries:
+            response = self.client.get(url, {'category': 'ДД,Танки'})
+        self.assertEqual(2, len(response.data['results']))
+        self.assertNotIn('bboard_category', queries.captured_queries[-1]['sql'])
+
+        self.assertEqual(0, self.client.get(url, {'category': 'Танки'}).data['count'])
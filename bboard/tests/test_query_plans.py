@@ -0,0 +1,92 @@
+import re
+import unittest
+from datetime import timedelta
+
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+
+from bboard.benchmarks import seed_data
+from bboard.models import Post, Comment, Category
+from bboard.pagination import KeysetPagination
+from bboard.serializers import PostListSerializer, values_lookups
+from bboard.service import CommentFilter
+from bboard.sync import ChangesKeyset
+
+# "SCAN bboard_post" or "SCAN bboard_post USING INDEX ..." reads the whole table or index
+SCAN = re.compile(r'\bSCAN (\w+)')
+AUTOMATIC_INDEX = re.compile(r'AUTOMATIC (?:COVERING |PARTIAL )*INDEX')
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'Plans are checked with EXPLAIN QUERY PLAN of SQLite')
+class QueryPlanTestCase(TestCase):
+    """Hot queries must be answered from indexes, never by a full table scan"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = seed_data(users=5, categories=3, posts=50, comments=200)[0]
+        cls.post = Post.objects.filter(comment_count__gt=0).first()
+
+    def assertNoFullScan(self, queryset, scans=()):
+        """
+        Fail if the plan scans a table or makes a temporary index for lack of one.
+        `scans` are tables read in index order and cut by LIMIT, which is fine.
+        """
+        plan = queryset.explain()
+        for table in SCAN.findall(plan):
+            self.assertIn(table, scans, f'Full scan of {table}:\n{plan}')
+        self.assertIsNone(AUTOMATIC_INDEX.search(plan), f'Missing index:\n{plan}')
+
+    @staticmethod
+    def post_list():
+        return Post.objects.values(*values_lookups(PostListSerializer))
+
+    def test_post_list(self):
+        queryset = self.post_list().order_by('-created', '-id')[:10]
+        self.assertNoFullScan(queryset, scans=('bboard_post',))
+        self.assertIn('post_created_id_idx', queryset.explain())
+
+    def test_post_list_keyset(self):
+        pagination = KeysetPagination()
+        position = pagination.get_position(Post.objects.order_by(*pagination.ordering)[10])
+        queryset = self.post_list().filter(pagination.seek_filter(position)).order_by(*pagination.ordering)
+        self.assertNoFullScan(queryset[:10])
+
+    def test_posts_of_user(self):
+        self.assertNoFullScan(Post.objects.filter(owner=self.user).order_by('-created')[:10])
+
+    def test_weekly_digest(self):
+        now = timezone.now()
+        self.assertNoFullScan(Post.objects.filter(created__range=[now - timedelta(days=7), now]))
+
+    def test_private_page(self):
+        self.assertNoFullScan(Comment.objects.filter(post__owner=self.user))
+
+    def test_private_page_filters(self):
+        comments = Comment.objects.filter(post__owner=self.user)
+        by_category = CommentFilter({'category': 'Category 1,Category 2'}, comments).qs
+        self.assertNoFullScan(by_category)
+        by_post = CommentFilter({'post_id': self.post.pk}, comments).qs
+        self.assertNoFullScan(by_post)
+
+    def test_post_detail_comments(self):
+        self.assertNoFullScan(Comment.objects.filter(post=self.post).order_by('created', 'id'))
+
+    def test_post_comments_page(self):
+        comments = Comment.objects.filter(post=self.post)
+        self.assertNoFullScan(comments.order_by('created', 'id')[:10])
+        self.assertNoFullScan(comments.order_by('-created', '-id')[:5])
+        self.assertNoFullScan(comments.filter(accepted=True).order_by('created', 'id')[:10])
+
+    def test_new_comment_notification(self):
+        self.assertNoFullScan(Comment.objects.filter(post_id=self.post.pk, pk__gte=1, accepted=False))
+
+    def test_category_by_name(self):
+        self.assertNoFullScan(Category.objects.filter(name='Category 1'))
+
+    def test_sync(self):
+        keyset = ChangesKeyset()
+        position = keyset.get_position(Post.objects.order_by(*keyset.ordering)[10])
+        self.assertNoFullScan(Post.objects.filter(keyset.seek_filter(position)).order_by(*keyset.ordering)[:10])
+        position = keyset.get_position(Comment.objects.order_by(*keyset.ordering)[10])
+        self.assertNoFullScan(Comment.objects.filter(keyset.seek_filter(position)).order_by(*keyset.ordering)[:10])
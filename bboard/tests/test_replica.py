@@ -0,0 +1,88 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITransactionTestCase
+
+from bboard.cache import get_cache
+from bboard.models import Post, User, Category, Comment
+from bboard.replica import ReplicaRouter, replica_reads, is_pinned
+from bboard.tasks import send_mail_about_new_posts
+
+
+@mock.patch('bboard.replica.replica_configured', return_value=True)
+class ReplicaTestCase(APITransactionTestCase):
+    """
+    The test replica mirrors the default test database, queries are told apart by connection.
+    Its connection sees only committed rows, hence no TestCase transaction.
+    """
+    databases = {'default', 'replica'}
+
+    def setUp(self) -> None:
+        cache.clear()
+        get_cache().clear()
+        self.user1 = User.objects.create(username='test_username', email='test1@mail.ru')
+        self.category1 = Category.objects.create(name='ДД')
+        self.post_1 = Post.objects.create(title='Test title',
+                                          text='test text',
+                                          category=self.category1,
+                                          owner=self.user1)
+        Comment.objects.create(owner=self.user1, text='comment', post=self.post_1)
+
+    def get(self, url):
+        with CaptureQueriesContext(connections['replica']) as replica_queries:
+            with CaptureQueriesContext(connections['default']) as default_queries:
+                response = self.client.get(url)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        return len(replica_queries), len(default_queries)
+
+    def test_router(self, configured):
+        router = ReplicaRouter()
+        self.assertIsNone(router.db_for_read(Post))
+        with replica_reads():
+            self.assertEqual('replica', router.db_for_read(Post))
+            self.assertEqual('default', router.db_for_write(Post))
+        self.assertIsNone(router.db_for_read(Post))
+        configured.return_value = False
+        with replica_reads():
+            self.assertIsNone(router.db_for_read(Post))
+
+    def test_reads(self, configured):
+        replica, default = self.get(reverse('posts-list'))
+        self.assertGreater(replica, 0)
+        self.assertEqual(0, default)
+        replica, default = self.get(reverse('posts-detail', args=(self.post_1.id,)))
+        self.assertGreater(replica, 0)
+        self.assertEqual(0, default)
+
+    def test_read_your_writes(self, configured):
+        self.client.force_authenticate(user=self.user1)
+        # Cached from the replica
+        self.get(reverse('posts-detail', args=(self.post_1.id,)))
+        response = self.client.patch(reverse('posts-detail', args=(self.post_1.id,)), {'title': 'New title'})
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertTrue(is_pinned(self.user1))
+
+        replica, default = self.get(reverse('private-list'))
+        self.assertEqual(0, replica)
+        # Pinned users do not read the response cache either
+        replica, default = self.get(reverse('posts-detail', args=(self.post_1.id,)))
+        self.assertEqual(0, replica)
+        self.assertGreater(default, 0)
+
+        self.client.force_authenticate(user=None)
+        self.assertEqual((0, 0), self.get(reverse('posts-detail', args=(self.post_1.id,))))
+
+    def test_failed_write_does_not_pin(self, configured):
+        self.client.force_authenticate(user=self.user1)
+        self.client.post(reverse('posts-list'), {})
+        self.assertFalse(is_pinned(self.user1))
+
+    def test_weekly_digest(self, configured):
+        with mock.patch('bboard.tasks.async_task'):
+            with CaptureQueriesContext(connections['replica']) as replica_queries:
+                send_mail_about_new_posts()
+        self.assertIn('bboard_post', replica_queries[0]['sql'])
@@ -0,0 +1,65 @@
+import json
+
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from bboard.models import Post, User, Category
+
+
+class PostSearchTestCase(APITestCase):
+    """Testing full-text search of posts"""
+
+    def setUp(self) -> None:
+        self.user1 = User.objects.create(username='test_username', email='test1@mail.ru')
+        self.category1 = Category.objects.create(name='ДД')
+        self.post_1 = Post.objects.create(title='Продам меч',
+                                          text='Острый двуручный меч, почти новый',
+                                          category=self.category1,
+                                          owner=self.user1)
+        self.post_2 = Post.objects.create(title='Ищу гильдию',
+                                          text='Готов обменять щит на меч',
+                                          category=self.category1,
+                                          owner=self.user1)
+        self.url = reverse('posts-search')
+
+    def search(self, query):
+        response = self.client.get(self.url, data={'q': query})
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        return [row['id'] for row in response.data['results']]
+
+    def test_ranking(self):
+        # Title match goes first
+        self.assertEqual([self.post_1.id, self.post_2.id], self.search('меч'))
+
+    def test_prefix_and_case(self):
+        self.assertEqual([self.post_2.id], self.search('ГИЛЬД'))
+
+    def test_all_terms(self):
+        self.assertEqual([self.post_2.id], self.search('меч щит'))
+
+    def test_syntax_is_escaped(self):
+        self.assertEqual([self.post_1.id], self.search('"двуручный" -(*'))
+
+    def test_empty_query(self):
+        self.assertEqual([], self.search(''))
+
+    def test_update_and_delete(self):
+        self.post_2.title = 'Продам щит'
+        self.post_2.save()
+        self.assertEqual([self.post_2.id], self.search('щит продам'))
+        self.post_2.delete()
+        self.assertEqual([], self.search('щит'))
+
+    def test_bulk_create(self):
+        self.client.force_authenticate(user=self.user1)
+        data = [{'title': f'Лук {i}', 'text': 'text', 'category': self.category1.id} for i in range(3)]
+        self.client.post(reverse('posts-bulk'), data=json.dumps(data), content_type='application/json')
+        self.assertEqual(3, len(self.search('лук')))
+
+    def test_pagination(self):
+        for i in range(15):
+            Post.objects.create(title=f'Зелье {i}', text='text', category=self.category1, owner=self.user1)
+        response = self.client.get(self.url, data={'q': 'зелье'})
+        self.assertEqual(15, response.data['count'])
+        self.assertEqual(10, len(response.data['results']))
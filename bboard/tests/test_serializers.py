@@ -1,10 +1,15 @@
+import json
+
+from django.core.exceptions import ImproperlyConfigured
 from django.db.models import signals
 from django.test import TestCase
 from django.utils import timezone
 from freezegun import freeze_time
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
 
 from bboard.models import Category, User, Post, Comment
-from bboard.serializers import PostListSerializer, CommentSerializer
+from bboard.serializers import PostListSerializer, PostDetailSerializer, CommentSerializer, values_lookups
 
 
 @freeze_time("1955-11-12")
@@ -42,7 +47,12 @@ class PostSerializerTestCase(TestCase):
                 'category': 1,
                 'owner': 'test_username1',
                 'created': DateTimeField().to_representation(self.current_date_time),
+                'updated_at': DateTimeField().to_representation(self.current_date_time),
                 'upload': None,
+                'thumbnail': None,
+                'comment_count': 0,
+                'accepted_comment_count': 0,
+                'last_comment_at': None,
             },
             {
                 'id': self.user2.id,
@@ -51,7 +61,12 @@ class PostSerializerTestCase(TestCase):
                 'category': 2,
                 'owner': 'test_username2',
                 'created': DateTimeField().to_representation(self.current_date_time),
+                'updated_at': DateTimeField().to_representation(self.current_date_time),
                 'upload': None,
+                'thumbnail': None,
+                'comment_count': 0,
+                'accepted_comment_count': 0,
+                'last_comment_at': None,
             },
         ]
         self.assertEqual(expected_data, data)
@@ -63,7 +78,9 @@ class CommentSerializerTestCase(TestCase):
 
     def setUp(self) -> None:
         # disable signals
+        self.post_save_receivers = signals.post_save.receivers
         signals.post_save.receivers = []
+        signals.post_save.sender_receivers_cache.clear()
 
         self.current_date_time = timezone.now()
         self.user1 = User.objects.create_user(username='test_username1', email='test1@mail.ru')
@@ -81,6 +98,10 @@ class CommentSerializerTestCase(TestCase):
                                                 accepted=False
                                                 )
 
+    def tearDown(self) -> None:
+        signals.post_save.receivers = self.post_save_receivers
+        signals.post_save.sender_receivers_cache.clear()
+
     def test_ok(self):
         from rest_framework.fields import DateTimeField
         data = CommentSerializer(self.comment_1).data
@@ -89,9 +110,50 @@ class CommentSerializerTestCase(TestCase):
                 'id': self.comment_1.id,
                 'text': 'test text1',
                 'created': DateTimeField().to_representation(self.current_date_time),
+                'updated_at': DateTimeField().to_representation(self.current_date_time),
                 'accepted': False,
                 'owner': self.user1.id,
                 'post': self.post_1.id,
             },
         ]
         self.assertEqual(data, *expected_data)
+
+
+class ValuesSerializerTestCase(TestCase):
+    """Fast path over values() rows must produce the same data as model instances"""
+
+    def setUp(self) -> None:
+        self.factory = APIRequestFactory()
+        self.user1 = User.objects.create_user(username='test_username1', email='test1@mail.ru')
+        self.user2 = User.objects.create_user(username='test_username2', email='test2@mail.ru')
+        self.category1 = Category.objects.create(name='ДД')
+        self.post_1 = Post.objects.create(title='Test title',
+                                          text='test text',
+                                          category=self.category1,
+                                          owner=self.user1,
+                                          upload='uploads/ab/abc.png')
+        self.post_2 = Post.objects.create(title='Test title2',
+                                          text='test text2',
+                                          category=self.category1,
+                                          owner=self.user2)
+        Comment.objects.create(owner=self.user2, text='comment 1', post=self.post_1, accepted=True)
+        Comment.objects.create(owner=self.user1, text='comment 2', post=self.post_1)
+
+    def assertSameData(self, serializer_class, queryset, context):
+        from_instances = serializer_class(list(queryset), many=True, context=context).data
+        rows = queryset.values(*values_lookups(serializer_class))
+        with self.assertNumQueries(1):
+            from_values = serializer_class(rows, many=True, context=context).data
+        self.assertEqual(json.dumps(from_instances), json.dumps(from_values))
+
+    def test_post_list(self):
+        queryset = Post.objects.order_by('id')
+        self.assertSameData(PostListSerializer, queryset, {})
+        self.assertSameData(PostListSerializer, queryset, {'request': Request(self.factory.get('/posts/'))})
+
+    def test_comments(self):
+        self.assertSameData(CommentSerializer, Comment.objects.order_by('id'), {})
+
+    def test_nested_fields_are_not_supported(self):
+        with self.assertRaises(ImproperlyConfigured):
+            values_lookups(PostDetailSerializer)
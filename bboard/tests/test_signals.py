@@ -0,0 +1,113 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.core import mail
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from freezegun import freeze_time
+
+from bboard.models import Category, User, Post, Comment
+from bboard.tasks import notify_about_new_comments, notify_about_accepted_comments
+
+
+@override_settings(COMMENT_NOTIFICATION_WINDOW=60)
+class CommentNotificationTestCase(TestCase):
+    """Testing that comment notifications are queued after commit and coalesced"""
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.user1 = User.objects.create_user(username='test_username1', email='test1@mail.ru')
+        self.user2 = User.objects.create_user(username='test_username2', email='test2@mail.ru')
+        self.category1 = Category.objects.create(name='ДД')
+        self.post_1 = Post.objects.create(title='Test title',
+                                          text='test text',
+                                          category=self.category1,
+                                          owner=self.user1)
+
+    def create_comment(self, text='test comment'):
+        return Comment.objects.create(owner=self.user2, text=text, post=self.post_1, accepted=False)
+
+    @mock.patch('bboard.signals.schedule')
+    def test_nothing_sent_before_commit(self, schedule):
+        self.create_comment()
+        schedule.assert_not_called()
+        self.assertEqual([], mail.outbox)
+
+    @mock.patch('bboard.signals.schedule')
+    def test_comments_coalesced(self, schedule):
+        with self.captureOnCommitCallbacks(execute=True):
+            comment = self.create_comment()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_comment('second comment')
+        schedule.assert_called_once()
+        self.assertEqual(('bboard.tasks.notify_about_new_comments', self.post_1.pk, comment.pk),
+                         schedule.call_args.args)
+
+        notify_about_new_comments(self.post_1.pk, comment.pk)
+        self.assertEqual(1, len(mail.outbox))
+        self.assertEqual(['test1@mail.ru'], mail.outbox[0].to)
+        self.assertIn('2 new comments', mail.outbox[0].subject)
+        self.assertIn('second comment', mail.outbox[0].body)
+
+        # Window is closed, next comment schedules a new mail
+        with freeze_time(timezone.now() + timedelta(seconds=61)):
+            with self.captureOnCommitCallbacks(execute=True):
+                third = self.create_comment('third comment')
+        self.assertEqual(2, schedule.call_count)
+        notify_about_new_comments(self.post_1.pk, third.pk)
+        self.assertEqual(2, len(mail.outbox))
+        self.assertIn('you have new comment', mail.outbox[1].subject)
+        self.assertNotIn('second comment', mail.outbox[1].body)
+
+    @mock.patch('bboard.signals.schedule')
+    def test_overlapping_windows(self, schedule):
+        """Processes that do not share the cache schedule a task each, every comment is mailed once"""
+        with self.captureOnCommitCallbacks(execute=True):
+            first = self.create_comment('first comment')
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            second = self.create_comment('second comment')
+        self.assertEqual(2, schedule.call_count)
+
+        notify_about_new_comments(self.post_1.pk, first.pk)
+        self.create_comment('late comment')
+        notify_about_new_comments(self.post_1.pk, second.pk)
+        self.assertEqual(2, len(mail.outbox))
+        self.assertIn('2 new comments', mail.outbox[0].subject)
+        self.assertEqual('late comment', mail.outbox[1].body.split(' - ')[0])
+
+    @mock.patch('bboard.signals.schedule')
+    def test_later_task_first(self, schedule):
+        with self.captureOnCommitCallbacks(execute=True):
+            first = self.create_comment('first comment')
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            second = self.create_comment('second comment')
+
+        notify_about_new_comments(self.post_1.pk, second.pk)
+        notify_about_new_comments(self.post_1.pk, first.pk)
+        self.assertEqual(1, len(mail.outbox))
+        self.assertIn('2 new comments', mail.outbox[0].subject)
+        self.assertIn('first comment', mail.outbox[0].body)
+
+    @override_settings(COMMENT_NOTIFICATION_WINDOW=0)
+    @mock.patch('bboard.signals.async_task')
+    def test_no_window(self, async_task):
+        with self.captureOnCommitCallbacks(execute=True):
+            comment = self.create_comment()
+        async_task.assert_called_once_with('bboard.tasks.notify_about_new_comments', self.post_1.pk, comment.pk)
+
+    @mock.patch('bboard.signals.async_task')
+    def test_accepted(self, async_task):
+        comment = self.create_comment()
+        self.create_comment('other comment of the same owner')
+        comment.accepted = True
+        with self.captureOnCommitCallbacks(execute=True):
+            comment.save()
+        async_task.assert_called_once_with('bboard.tasks.notify_about_accepted_comments', [comment.pk])
+
+        notify_about_accepted_comments([comment.pk])
+        self.assertEqual(1, len(mail.outbox))
+        self.assertEqual(['test2@mail.ru'], mail.outbox[0].to)
+        self.assertIn('your comment accepted', mail.outbox[0].subject)
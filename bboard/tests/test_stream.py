@@ -0,0 +1,98 @@
+from django.test import AsyncRequestFactory, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase, force_authenticate
+
+from bboard.models import Post, User, Category, Comment
+from bboard.stream import comment_hub
+from bboard.views import PrivatePageView
+
+
+@override_settings(COMMENT_STREAM_POLL_INTERVAL=0.01, COMMENT_STREAM_TIMEOUT=60)
+class CommentStreamTestCase(APITestCase):
+    """Testing server-sent events with new comments"""
+
+    def setUp(self) -> None:
+        self.user1 = User.objects.create(username='test_username', email='test1@mail.ru')
+        self.user2 = User.objects.create(username='test_username2', email='test2@mail.ru')
+        self.category1 = Category.objects.create(name='ДД')
+        self.post_1 = Post.objects.create(title='Test title', text='test text', category=self.category1,
+                                          owner=self.user1)
+        self.post_2 = Post.objects.create(title='Test title2', text='test text2', category=self.category1,
+                                          owner=self.user2)
+        self.client.force_authenticate(user=self.user1)
+
+    def create_comment(self, post, text):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Comment.objects.create(owner=self.user2, text=text, post=post)
+
+    def open_stream(self, **extra):
+        response = self.client.get(reverse('private-stream'), HTTP_ACCEPT='text/event-stream', **extra)
+        self.addCleanup(response.close)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual('text/event-stream', response['Content-Type'])
+        events = iter(response.streaming_content)
+        self.assertTrue(next(events).startswith(b'retry:'))
+        return events
+
+    def test_live_comments(self):
+        events = self.open_stream()
+        comment = self.create_comment(self.post_1, 'first')
+        event = next(events).decode()
+        self.assertTrue(event.startswith(f'id: {comment.pk}\nevent: comment\n'))
+        self.assertIn('"text": "first"', event)
+
+    def test_only_comments_to_own_posts(self):
+        events = self.open_stream()
+        self.create_comment(self.post_2, 'not mine')
+        self.assertEqual(b': ping\n\n', next(events))
+        comment = self.create_comment(self.post_1, 'mine')
+        self.assertTrue(next(events).decode().startswith(f'id: {comment.pk}\n'))
+
+    def test_resume_after_last_event_id(self):
+        comments = [self.create_comment(self.post_1, f'comment {i}') for i in range(3)]
+        self.create_comment(self.post_2, 'not mine')
+        events = self.open_stream(HTTP_LAST_EVENT_ID=str(comments[0].pk))
+        self.assertTrue(next(events).decode().startswith(f'id: {comments[1].pk}\n'))
+        self.assertTrue(next(events).decode().startswith(f'id: {comments[2].pk}\n'))
+        self.assertEqual(b': ping\n\n', next(events))
+
+    def test_comments_from_other_processes(self):
+        events = self.open_stream()
+        # Written without the hub, found by the periodic database check
+        comment = Comment.objects.create(owner=self.user2, text='elsewhere', post=self.post_1)
+        self.assertTrue(next(events).decode().startswith(f'id: {comment.pk}\n'))
+
+    @override_settings(COMMENT_STREAM_TIMEOUT=0)
+    def test_stream_ends(self):
+        events = self.open_stream()
+        self.assertEqual([], list(events))
+        self.assertFalse(comment_hub.has_subscribers())
+
+    def test_authentication_required(self):
+        self.client.force_authenticate(user=None)
+        response = self.client.get(reverse('private-stream'), HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(status.HTTP_401_UNAUTHORIZED, response.status_code)
+
+    @override_settings(COMMENT_STREAM_MAX_CONNECTIONS=1)
+    def test_connection_limit(self):
+        response = self.client.get(reverse('private-stream'), HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        busy = self.client.get(reverse('private-stream'), HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(status.HTTP_503_SERVICE_UNAVAILABLE, busy.status_code)
+        self.assertEqual('3', busy['Retry-After'])
+        # Closed without reading a byte, the slot is free again
+        response.close()
+        self.assertFalse(comment_hub.has_subscribers())
+        self.open_stream()
+
+    def test_refused_under_asgi(self):
+        request = AsyncRequestFactory().get(reverse('private-stream'), HTTP_ACCEPT='text/event-stream')
+        force_authenticate(request, user=self.user1)
+        response = PrivatePageView.as_view({'get': 'stream'})(request)
+        self.assertEqual(status.HTTP_501_NOT_IMPLEMENTED, response.status_code)
+        self.assertFalse(comment_hub.has_subscribers())
+
+    def test_invalid_last_event_id(self):
+        response = self.client.get(reverse('private-stream'), HTTP_LAST_EVENT_ID='abc')
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
@@ -0,0 +1,119 @@
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from bboard.models import Post, User, Category, Comment
+from bboard.sync import encode_cursor
+
+
+class SyncApiTestCase(APITestCase):
+
+    def setUp(self) -> None:
+        self.user1 = User.objects.create(username='test_username', email='test1@mail.ru')
+        self.category1 = Category.objects.create(name='ДД')
+        self.post_1 = Post.objects.create(title='Test title',
+                                          text='test text',
+                                          category=self.category1,
+                                          owner=self.user1)
+        self.post_2 = Post.objects.create(title='Test title2',
+                                          text='test text2',
+                                          category=self.category1,
+                                          owner=self.user1)
+        self.comment = Comment.objects.create(owner=self.user1, text='comment', post=self.post_1)
+
+    def sync(self, since=''):
+        response = self.client.get(reverse('sync'), data={'since': since})
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        return response.data
+
+    def test_initial(self):
+        data = self.sync()
+        self.assertEqual({self.post_1.id, self.post_2.id}, {post['id'] for post in data['posts']})
+        self.assertEqual([self.comment.id], [comment['id'] for comment in data['comments']])
+        self.assertEqual({'posts': [], 'comments': []}, data['deleted'])
+        self.assertFalse(data['more'])
+
+        data = self.sync(data['since'])
+        self.assertEqual([], data['posts'])
+        self.assertEqual([], data['comments'])
+
+    def test_changes(self):
+        since = self.sync()['since']
+        self.post_2.title = 'New title'
+        self.post_2.save()
+        comment = Comment.objects.create(owner=self.user1, text='new comment', post=self.post_1)
+
+        data = self.sync(since)
+        # Counters of post_1 changed with the new comment
+        self.assertEqual({self.post_1.id, self.post_2.id}, {post['id'] for post in data['posts']})
+        self.assertEqual('New title', next(post for post in data['posts'] if post['id'] == self.post_2.id)['title'])
+        self.assertEqual([comment.id], [comment['id'] for comment in data['comments']])
+
+    def test_deletions(self):
+        since = self.sync()['since']
+        post_id = self.post_1.id
+        self.post_1.delete()
+        data = self.sync(since)
+        # The comment goes with the Post tombstone
+        self.assertEqual({'posts': [post_id], 'comments': []}, data['deleted'])
+        self.assertEqual([], data['comments'])
+
+        comment = Comment.objects.create(owner=self.user1, text='comment', post=self.post_2)
+        comment_id = comment.id
+        comment.delete()
+        data = self.sync(data['since'])
+        self.assertEqual({'posts': [], 'comments': [comment_id]}, data['deleted'])
+
+    def test_cascade_queries(self):
+        Comment.objects.bulk_create([Comment(owner=self.user1, text='comment', post=self.post_1)
+                                     for _ in range(20)])
+        Post.objects.recompute_comment_counters()
+        with CaptureQueriesContext(connection) as queries:
+            self.post_1.delete()
+        self.assertEqual(1, len([query for query in queries if 'INSERT INTO "bboard_deletion"' in query['sql']]))
+
+    def test_accept_and_bulk_update(self):
+        since = self.sync()['since']
+        self.client.force_authenticate(user=self.user1)
+        response = self.client.post(reverse('private-accept'), {'ids': [self.comment.id]}, format='json')
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        response = self.client.patch(reverse('posts-bulk'), [{'id': self.post_2.id, 'title': 'Bulk title'}],
+                                     format='json')
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+
+        data = self.sync(since)
+        self.assertEqual([True], [comment['accepted'] for comment in data['comments']])
+        self.assertEqual({self.post_1.id, self.post_2.id}, {post['id'] for post in data['posts']})
+
+    @override_settings(SYNC_BATCH_SIZE=1)
+    def test_batches(self):
+        comment = Comment.objects.create(owner=self.user1, text='comment', post=self.post_2)
+        comment_id = comment.id
+        comment.delete()
+        Post.objects.filter(pk=self.post_1.pk).delete()
+        posts, deleted, since, more = [], [], '', True
+        while more:
+            data = self.sync(since)
+            self.assertLessEqual(len(data['posts']), 1)
+            posts += [post['id'] for post in data['posts']]
+            self.assertLessEqual(len(data['deleted']['posts'] + data['deleted']['comments']), 1)
+            deleted += [('comment', pk) for pk in data['deleted']['comments']]
+            deleted += [('post', pk) for pk in data['deleted']['posts']]
+            since, more = data['since'], data['more']
+        self.assertEqual([self.post_2.id], posts)
+        self.assertEqual([('comment', comment_id), ('post', self.post_1.id)], deleted)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('sync'), data={'since': 'nonsense'})
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+
+    def test_invalid_cursor_values(self):
+        for position in (['x', 'y'], [None, None], ['2020-01-01T00:00:00Z', 'y']):
+            since = encode_cursor({'posts': position, 'comments': None, 'deleted': 0})
+            response = self.client.get(reverse('sync'), data={'since': since})
+            self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        since = encode_cursor({'posts': ['2020-01-01T00:00:00Z', 1], 'comments': None, 'deleted': 0})
+        self.assertEqual(status.HTTP_200_OK, self.client.get(reverse('sync'), data={'since': since}).status_code)
@@ -0,0 +1,83 @@
+from unittest import mock
+
+from django.core import mail
+from django.test import TestCase, override_settings
+from django_q.conf import Conf
+
+from bboard.categories import registry as category_registry
+from bboard.models import Category, User, Post, WeeklyDigest
+from bboard.tasks import send_mail_about_new_posts, send_weekly_digest_chunk, weekly_digest
+
+
+@override_settings(WEEKLY_DIGEST_CHUNK_SIZE=2, SITE_URL='https://bboard.example')
+@mock.patch.object(Conf, 'SYNC', True)
+class WeeklyDigestTestCase(TestCase):
+    """Testing weekly email about new posts"""
+
+    def setUp(self) -> None:
+        self.users = [User.objects.create_user(username=f'test_username{i}', email=f'test{i}@mail.ru')
+                      for i in range(5)]
+        self.category1 = Category.objects.create(name='ДД')
+        self.post_1 = Post.objects.create(title='Test title',
+                                          text='test text',
+                                          category=self.category1,
+                                          owner=self.users[0])
+
+    def test_every_user_gets_one_email(self):
+        send_mail_about_new_posts()
+        self.assertEqual(5, len(mail.outbox))
+        self.assertEqual(sorted(user.email for user in self.users),
+                         sorted(msg.to[0] for msg in mail.outbox))
+
+    def test_email_content(self):
+        send_mail_about_new_posts()
+        msg = next(msg for msg in mail.outbox if msg.to == ['test1@mail.ru'])
+        html_content = msg.alternatives[0][0]
+        self.assertIn('Hello test_username1.', html_content)
+        self.assertIn('Test title', html_content)
+        self.assertIn(f'https://bboard.example{self.post_1.get_absolute_url()}', html_content)
+
+    def test_digest_computed_once(self):
+        send_mail_about_new_posts()
+        Post.objects.create(title='Later title', text='text', category=self.category1, owner=self.users[0])
+        send_mail_about_new_posts()
+        self.assertEqual(1, WeeklyDigest.objects.count())
+        self.assertEqual([self.post_1.pk], [post['id'] for post in weekly_digest().posts])
+        self.assertNotIn('Later title', mail.outbox[-1].alternatives[0][0])
+
+    def test_greeting_escaped(self):
+        user = User.objects.create_user(username='<b>name</b>', email='b@mail.ru')
+        send_weekly_digest_chunk(user.pk, user.pk, weekly_digest().pk)
+        html_content = mail.outbox[0].alternatives[0][0]
+        self.assertIn('Hello &lt;b&gt;name&lt;/b&gt;.', html_content)
+
+    def test_subscriptions(self):
+        category2 = Category.objects.create(name='ЕЕ')
+        category3 = Category.objects.create(name='ЖЖ')
+        category_registry.clear()
+        Post.objects.create(title='Other title', text='text', category=category2, owner=self.users[0])
+        self.users[1].categories.set([category2])
+        self.users[2].categories.set([category3])
+        self.users[3].categories.set([self.category1, category2])
+        digest = weekly_digest()
+        pks = [user.pk for user in self.users]
+        # Digest, users and their subscriptions
+        with self.assertNumQueries(3):
+            send_weekly_digest_chunk(pks[0], pks[-1], digest.pk)
+        received = {msg.to[0]: msg.alternatives[0][0] for msg in mail.outbox}
+        # Nothing new in the followed category
+        self.assertNotIn('test2@mail.ru', received)
+        self.assertNotIn('Test title', received['test1@mail.ru'])
+        self.assertIn('Other title', received['test1@mail.ru'])
+        for email in ('test0@mail.ru', 'test3@mail.ru', 'test4@mail.ru'):
+            self.assertIn('Test title', received[email])
+            self.assertIn('Other title', received[email])
+
+    def test_chunks(self):
+        with mock.patch('bboard.tasks.async_task') as async_task:
+            send_mail_about_new_posts()
+        pks = [user.pk for user in self.users]
+        self.assertEqual(
+            [(pks[0], pks[1]), (pks[2], pks[3]), (pks[4], pks[4])],
+            [call.args[1:3] for call in async_task.call_args_list],
+        )
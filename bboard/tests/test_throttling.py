@@ -0,0 +1,150 @@
+import json
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.test import APITestCase, APIRequestFactory
+
+from bboard.cache import get_cache
+from bboard.models import Post, User, Category
+from bboard.throttling import ReadRateThrottle, SlidingWindowRateThrottle
+
+RATES = {
+    'anon_read': '3/min',
+    'user_read': '5/min',
+    'post_create': '2/hour',
+    'comment_create': '2/hour',
+}
+
+
+def rates(**changes):
+    return override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK,
+                                             'DEFAULT_THROTTLE_RATES': {**RATES, **changes}})
+
+
+@rates()
+class ThrottlingTestCase(APITestCase):
+
+    def setUp(self) -> None:
+        caches['default'].clear()
+        get_cache().clear()
+        self.user1 = User.objects.create(username='test_username', email='test1@mail.ru')
+        self.category1 = Category.objects.create(name='ДД')
+        self.post_1 = Post.objects.create(title='Test title',
+                                          text='test text',
+                                          category=self.category1,
+                                          owner=self.user1)
+
+    def test_anonymous_reads(self):
+        url = reverse('posts-list')
+        for _ in range(3):
+            self.assertEqual(status.HTTP_200_OK, self.client.get(url).status_code)
+        response = self.client.get(url)
+        self.assertEqual(status.HTTP_429_TOO_MANY_REQUESTS, response.status_code)
+        self.assertIn('Retry-After', response)
+
+    def test_user_budget_separate_from_ip(self):
+        url = reverse('posts-list')
+        for _ in range(3):
+            self.client.get(url)
+        self.client.force_authenticate(user=self.user1)
+        for _ in range(5):
+            self.assertEqual(status.HTTP_200_OK, self.client.get(url).status_code)
+        self.assertEqual(status.HTTP_429_TOO_MANY_REQUESTS, self.client.get(url).status_code)
+
+    def test_post_create(self):
+        self.client.force_authenticate(user=self.user1)
+        url = reverse('posts-list')
+        data = {'title': 'New', 'text': 'text', 'category': self.category1.id}
+        for _ in range(2):
+            self.assertEqual(status.HTTP_201_CREATED, self.client.post(url, data).status_code)
+        self.assertEqual(status.HTTP_429_TOO_MANY_REQUESTS, self.client.post(url, data).status_code)
+        # Reads have their own budget
+        self.assertEqual(status.HTTP_200_OK, self.client.get(url).status_code)
+
+    def test_comment_create(self):
+        self.client.force_authenticate(user=self.user1)
+        url = reverse('comment-list')
+        data = {'text': 'comment', 'post': self.post_1.id}
+        for _ in range(2):
+            self.assertEqual(status.HTTP_201_CREATED, self.client.post(url, data).status_code)
+        self.assertEqual(status.HTTP_429_TOO_MANY_REQUESTS, self.client.post(url, data).status_code)
+
+    @rates(post_create='3/hour', comment_create='3/hour')
+    def test_bulk_create(self):
+        """Every object of a bulk create counts"""
+        self.client.force_authenticate(user=self.user1)
+        posts = [{'title': 'New', 'text': 'text', 'category': self.category1.id}] * 2
+        comments = [{'text': 'comment', 'post': self.post_1.id}] * 2
+        for url, data in ((reverse('posts-bulk'), posts), (reverse('comment-bulk'), comments)):
+            response = self.client.post(url, data=json.dumps(data), content_type='application/json')
+            self.assertEqual(status.HTTP_201_CREATED, response.status_code)
+            # One left, not two
+            response = self.client.post(url, data=json.dumps(data), content_type='application/json')
+            self.assertEqual(status.HTTP_429_TOO_MANY_REQUESTS, response.status_code)
+            response = self.client.post(url, data=json.dumps(data[:1]), content_type='application/json')
+            self.assertEqual(status.HTTP_201_CREATED, response.status_code)
+        # More than the whole budget is never let through
+        response = self.client.post(reverse('posts-bulk'), data=json.dumps(posts * 2),
+                                    content_type='application/json')
+        self.assertEqual(status.HTTP_429_TOO_MANY_REQUESTS, response.status_code)
+        self.assertNotIn('Retry-After', response)
+
+    @rates(anon_read=None)
+    def test_no_rate(self):
+        url = reverse('posts-list')
+        for _ in range(5):
+            self.assertEqual(status.HTTP_200_OK, self.client.get(url).status_code)
+
+    def test_no_queries(self):
+        request = Request(APIRequestFactory().get('/'), authenticators=())
+        with CaptureQueriesContext(connection) as queries:
+            ReadRateThrottle().allow_request(request, None)
+        self.assertEqual(0, len(queries))
+
+    async def test_async_cached(self):
+        url = reverse('async-posts-list')
+        for _ in range(3):
+            response = await self.async_client.get(url)
+            self.assertEqual(status.HTTP_200_OK, response.status_code)
+        response = await self.async_client.get(url)
+        self.assertEqual(status.HTTP_429_TOO_MANY_REQUESTS, response.status_code)
+        self.assertIn('Retry-After', response)
+
+
+class SlidingWindowTestCase(APITestCase):
+    """Count over the last minute is estimated from two fixed windows"""
+
+    class Throttle(SlidingWindowRateThrottle):
+        scope = 'test'
+
+    def setUp(self) -> None:
+        caches['default'].clear()
+        self.request = Request(APIRequestFactory().get('/'), authenticators=())
+
+    def allow(self, now):
+        throttle = self.Throttle()
+        with mock.patch.object(throttle, 'timer', return_value=now):
+            return throttle.allow_request(self.request, None), throttle.wait()
+
+    @rates(test='4/min')
+    def test_window(self):
+        for now in (0, 10, 20, 30):
+            self.assertEqual((True, None), self.allow(now))
+        allowed, wait = self.allow(50)
+        self.assertFalse(allowed)
+        self.assertEqual(10, wait)
+        # Half of the previous window still counts: 4 * 0.5 = 2 of 4
+        self.assertTrue(self.allow(90)[0])
+        self.assertTrue(self.allow(90)[0])
+        allowed, wait = self.allow(90)
+        self.assertFalse(allowed)
+        # 4 * (1 - t / 60) + 2 < 4 once t > 30
+        self.assertEqual(0, wait)
+        self.assertTrue(self.allow(121)[0])
@@ -0,0 +1,183 @@
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from datetime import timedelta
+from io import BytesIO
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django_q.conf import Conf
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from bboard.models import Post, User, Category, Upload
+from bboard.tasks import clear_abandoned_uploads, make_post_thumbnail
+from bboard.uploads import chunk_path
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+class UploadTestCase(APITestCase):
+    """Testing chunked uploads, deduplication and thumbnails"""
+
+    def setUp(self) -> None:
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root,
+                                              CHUNKED_UPLOAD_DIR=os.path.join(media_root, 'chunks'))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user1 = User.objects.create(username='test_username', email='test1@mail.ru')
+        self.user2 = User.objects.create(username='test_username2', email='test2@mail.ru')
+        self.category1 = Category.objects.create(name='ДД')
+        self.client.force_authenticate(user=self.user1)
+
+    def upload(self, content, chunk_size):
+        response = self.client.post(reverse('uploads-list'), {'filename': 'File.TXT', 'size': len(content)})
+        self.assertEqual(status.HTTP_201_CREATED, response.status_code)
+        url = reverse('uploads-detail', args=(response.data['id'],))
+        for start in range(0, len(content), chunk_size):
+            chunk = content[start:start + chunk_size]
+            response = self.client.put(url, chunk, content_type='application/octet-stream',
+                                       HTTP_CONTENT_RANGE=f'bytes {start}-{start + len(chunk) - 1}/{len(content)}')
+            self.assertEqual(status.HTTP_200_OK, response.status_code)
+        return Upload.objects.get(pk=response.data['id'])
+
+    def test_chunked_upload(self):
+        content = b'0123456789' * 10
+        upload = self.upload(content, chunk_size=30)
+        digest = hashlib.sha256(content).hexdigest()
+        self.assertEqual(100, upload.offset)
+        self.assertEqual(f'uploads/{digest[:2]}/{digest}.txt', upload.file.name)
+        with upload.file.open('rb') as file:
+            self.assertEqual(content, file.read())
+        self.assertFalse(os.path.exists(chunk_path(upload)))
+
+    def test_resume(self):
+        response = self.client.post(reverse('uploads-list'), {'filename': 'file.txt', 'size': 10})
+        url = reverse('uploads-detail', args=(response.data['id'],))
+        self.client.put(url, b'01234', content_type='application/octet-stream', HTTP_CONTENT_RANGE='bytes 0-4/10')
+        # A chunk out of order is refused with the offset to resume from
+        response = self.client.put(url, b'789', content_type='application/octet-stream',
+                                   HTTP_CONTENT_RANGE='bytes 7-9/10')
+        self.assertEqual(status.HTTP_409_CONFLICT, response.status_code)
+        self.assertEqual(5, response.data['offset'])
+        self.assertEqual(5, self.client.get(url).data['offset'])
+        response = self.client.put(url, b'56789', content_type='application/octet-stream',
+                                   HTTP_CONTENT_RANGE='bytes 5-9/10')
+        self.assertEqual(10, response.data['offset'])
+        self.assertIsNotNone(response.data['file'])
+
+    def test_invalid_range(self):
+        response = self.client.post(reverse('uploads-list'), {'filename': 'file.txt', 'size': 10})
+        url = reverse('uploads-detail', args=(response.data['id'],))
+        response = self.client.put(url, b'0', content_type='application/octet-stream')
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+        response = self.client.put(url, b'0', content_type='application/octet-stream',
+                                   HTTP_CONTENT_RANGE='bytes 0-0/11')
+        self.assertEqual(status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE, response.status_code)
+
+    def test_other_users_upload(self):
+        upload = self.upload(b'content', chunk_size=7)
+        self.client.force_authenticate(user=self.user2)
+        response = self.client.get(reverse('uploads-detail', args=(upload.pk,)))
+        self.assertEqual(status.HTTP_404_NOT_FOUND, response.status_code)
+        response = self.client.post(reverse('posts-list'), {'title': 'Title', 'text': 'text',
+                                                            'category': self.category1.pk, 'upload_id': upload.pk})
+        self.assertEqual(status.HTTP_400_BAD_REQUEST, response.status_code)
+
+    def test_identical_files_are_stored_once(self):
+        first = self.upload(b'same content', chunk_size=5)
+        second = self.upload(b'same content', chunk_size=100)
+        self.assertEqual(first.file.name, second.file.name)
+        self.assertEqual([os.path.basename(first.file.name)], os.listdir(os.path.dirname(first.file.path)))
+
+        response = self.client.post(reverse('posts-list'), {
+            'title': 'Title', 'text': 'text', 'category': self.category1.pk,
+            'upload': SimpleUploadedFile('inline.txt', b'same content'),
+        }, format='multipart')
+        self.assertEqual(status.HTTP_201_CREATED, response.status_code)
+        self.assertEqual(first.file.name, Post.objects.get().upload.name)
+
+    def test_post_with_upload_id(self):
+        upload = self.upload(b'content', chunk_size=7)
+        response = self.client.post(reverse('posts-list'), {'title': 'Title', 'text': 'text',
+                                                            'category': self.category1.pk, 'upload_id': upload.pk})
+        self.assertEqual(status.HTTP_201_CREATED, response.status_code)
+        self.assertEqual(upload.file.name, Post.objects.get().upload.name)
+
+    @unittest.skipIf(Image is None, 'Pillow is not installed')
+    @mock.patch.object(Conf, 'SYNC', True)
+    def test_thumbnail(self):
+        buffer = BytesIO()
+        Image.new('RGB', (1000, 500), 'red').save(buffer, 'PNG')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('posts-list'), {
+                'title': 'Title', 'text': 'text', 'category': self.category1.pk,
+                'upload': SimpleUploadedFile('image.png', buffer.getvalue()),
+            }, format='multipart')
+        self.assertEqual(status.HTTP_201_CREATED, response.status_code)
+        post = Post.objects.get()
+        self.assertTrue(post.thumbnail.name.startswith('thumbnails/'))
+        with post.thumbnail.open('rb') as file:
+            self.assertEqual((320, 160), Image.open(file).size)
+
+    @unittest.skipIf(Image is None, 'Pillow is not installed')
+    @mock.patch.object(Conf, 'SYNC', True)
+    def test_bulk_thumbnail(self):
+        buffer = BytesIO()
+        Image.new('RGB', (100, 100), 'red').save(buffer, 'PNG')
+        upload = self.upload(buffer.getvalue(), chunk_size=1000)
+        data = [{'title': 'Title', 'text': 'text', 'category': self.category1.pk, 'upload_id': upload.pk},
+                {'title': 'Title', 'text': 'text', 'category': self.category1.pk}]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('posts-bulk'), data=json.dumps(data), content_type='application/json')
+        self.assertEqual(status.HTTP_201_CREATED, response.status_code)
+        self.assertEqual([True, False], [bool(post.thumbnail) for post in Post.objects.order_by('pk')])
+
+    @mock.patch.dict(sys.modules, {'PIL': None})
+    def test_thumbnail_without_pillow(self):
+        post = Post.objects.create(title='Title', text='text', category=self.category1, owner=self.user1)
+        with self.assertLogs('bboard.tasks', 'WARNING'):
+            make_post_thumbnail(post.pk)
+
+    def test_abandoned_uploads(self):
+        abandoned = self.client.post(reverse('uploads-list'), {'filename': 'file.txt', 'size': 10}).data['id']
+        self.client.put(reverse('uploads-detail', args=(abandoned,)), b'01234',
+                        content_type='application/octet-stream', HTTP_CONTENT_RANGE='bytes 0-4/10')
+        in_progress = self.client.post(reverse('uploads-list'), {'filename': 'file.txt', 'size': 10}).data['id']
+        self.client.put(reverse('uploads-detail', args=(in_progress,)), b'01234',
+                        content_type='application/octet-stream', HTTP_CONTENT_RANGE='bytes 0-4/10')
+        complete = self.upload(b'content', chunk_size=7)
+        # Never got a chunk, so it has no part file
+        no_chunks = self.client.post(reverse('uploads-list'), {'filename': 'file.txt', 'size': 10}).data['id']
+        a_day_ago = timezone.now() - timedelta(days=1, seconds=1)
+        Upload.objects.filter(pk__in=[abandoned, no_chunks]).update(created=a_day_ago)
+        path = chunk_path(Upload.objects.get(pk=abandoned))
+        os.utime(path, (a_day_ago.timestamp(), a_day_ago.timestamp()))
+
+        clear_abandoned_uploads()
+        self.assertEqual([in_progress, complete.pk], list(Upload.objects.order_by('pk').values_list('pk', flat=True)))
+        self.assertFalse(os.path.exists(path))
+        self.assertTrue(os.path.exists(chunk_path(Upload.objects.get(pk=in_progress))))
+
+    @unittest.skipIf(Image is None, 'Pillow is not installed')
+    @mock.patch.object(Conf, 'SYNC', True)
+    def test_no_thumbnail_for_other_files(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('posts-list'), {
+                'title': 'Title', 'text': 'text', 'category': self.category1.pk,
+                'upload': SimpleUploadedFile('file.txt', b'not an image'),
+            }, format='multipart')
+        self.assertFalse(Post.objects.get().thumbnail)
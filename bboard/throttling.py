@@ -0,0 +1,117 @@
+"""
+Throttles with a sliding window counter.
+
+DRF's SimpleRateThrottle keeps a list of request timestamps per client and
+rewrites it on every request. Here a client has one counter per fixed window,
+and the count over the last `duration` seconds is estimated from the current
+and the previous window, the previous one weighted by how much of it still
+overlaps the sliding window. That is one get_many and one add/incr per
+request, whatever the rate, and incr is atomic on shared backends.
+
+Rates come from REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'] at request time,
+a missing or None rate turns a throttle off. A request may cost more than
+one, the create throttles charge bulk creates by the number of objects.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class SlidingWindowRateThrottle(SimpleRateThrottle):
+    methods = None
+
+    def __init__(self):
+        # Rate depends on the request, see allow_request
+        self.wait_time = None
+
+    @property
+    def cache(self):
+        return caches[settings.THROTTLE_CACHE_ALIAS]
+
+    def get_scope(self, request):
+        return self.scope
+
+    def get_rate(self):
+        return api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+
+    def get_cost(self, request):
+        return 1
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = f'user:{request.user.pk}'
+        else:
+            ident = f'ip:{self.get_ident(request)}'
+        return f'throttle:{self.scope}:{ident}'
+
+    def allow_request(self, request, view):
+        if self.methods is not None and request.method not in self.methods:
+            return True
+        self.scope = self.get_scope(request)
+        self.rate = self.get_rate()
+        if self.rate is None:
+            return True
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        self.key = self.get_cache_key(request, view)
+        cost = self.get_cost(request)
+        # Requests are let through while the estimate is below it
+        limit = self.num_requests - cost + 1
+
+        now = self.timer()
+        window, elapsed = divmod(now, self.duration)
+        current_key = f'{self.key}:{int(window)}'
+        previous_key = f'{self.key}:{int(window) - 1}'
+        counts = self.cache.get_many([current_key, previous_key])
+        current = counts.get(current_key, 0)
+        previous = counts.get(previous_key, 0)
+        if previous * (1 - elapsed / self.duration) + current >= limit:
+            self.wait_time = self.get_wait(current, previous, elapsed, limit)
+            return False
+
+        # Kept for the next window where it is the previous one
+        if not self.cache.add(current_key, cost, timeout=2 * self.duration):
+            try:
+                self.cache.incr(current_key, cost)
+            except ValueError:
+                # Expired between add and incr
+                self.cache.set(current_key, cost, timeout=2 * self.duration)
+        return True
+
+    def get_wait(self, current, previous, elapsed, limit):
+        """Seconds until the estimate drops below `limit`, None if it never lets the request through"""
+        if limit <= 0:
+            return None
+        if current >= limit or not previous:
+            return self.duration - elapsed
+        return max(0, self.duration * (1 - (limit - current) / previous) - elapsed)
+
+    def wait(self):
+        return self.wait_time
+
+
+class ReadRateThrottle(SlidingWindowRateThrottle):
+    """Reads, budget per user or per IP of anonymous clients"""
+    methods = SAFE_METHODS
+
+    def get_scope(self, request):
+        return 'user_read' if request.user and request.user.is_authenticated else 'anon_read'
+
+
+class CreateRateThrottle(SlidingWindowRateThrottle):
+    """Creates, a bulk create costs as many as the objects in it"""
+    methods = ('POST',)
+
+    def get_cost(self, request):
+        if isinstance(request.data, list):
+            return len(request.data)
+        return 1
+
+
+class PostCreateRateThrottle(CreateRateThrottle):
+    scope = 'post_create'
+
+
+class CommentCreateRateThrottle(CreateRateThrottle):
+    scope = 'comment_create'
@@ -0,0 +1,99 @@
+"""
+Storage of Post uploads.
+
+Files are named after the sha256 of their content, so identical uploads
+share one file on disk. Large files can be sent in chunks (see
+`UploadViewSet`): every chunk is appended to a part file under
+CHUNKED_UPLOAD_DIR and the complete file is moved into the storage. Part
+files no chunk was written to for CHUNKED_UPLOAD_EXPIRY are removed with
+their uploads by bboard.tasks.clear_abandoned_uploads.
+"""
+import hashlib
+import os
+import time
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+READ_SIZE = 64 * 1024
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """A file of the same name has the same content, it is kept instead of saving a copy"""
+
+    def save(self, name, content, max_length=None):
+        if name is not None and self.exists(name):
+            return name
+        return super().save(name, content, max_length)
+
+
+upload_storage = ContentAddressedStorage()
+
+
+def content_hash(file):
+    digest = hashlib.sha256()
+    for chunk in file.chunks(READ_SIZE):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def content_addressed_name(file, filename):
+    digest = content_hash(file)
+    ext = os.path.splitext(filename)[1].lower()[:16]
+    return f'uploads/{digest[:2]}/{digest}{ext}'
+
+
+def upload_to(instance, filename):
+    """`upload_to` of Post.upload, hashes the file being saved"""
+    return content_addressed_name(instance.upload, filename)
+
+
+def chunk_path(upload):
+    return os.path.join(settings.CHUNKED_UPLOAD_DIR, f'{upload.pk}.part')
+
+
+def append_chunk(upload, stream, length):
+    """
+    Stream `length` bytes from `stream` to the end of the part file, return
+    the number of bytes written. Bytes past `upload.offset` left by a broken
+    request are dropped first, so a chunk can simply be resent.
+    """
+    path = chunk_path(upload)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    written = 0
+    with open(path, 'ab') as part:
+        part.truncate(upload.offset)
+        while written < length:
+            data = stream.read(min(READ_SIZE, length - written))
+            if not data:
+                break
+            part.write(data)
+            written += len(data)
+    return written
+
+
+def finish_upload(upload):
+    """Move the complete part file into the storage, return its content-addressed name"""
+    path = chunk_path(upload)
+    with open(path, 'rb') as part:
+        content = File(part)
+        name = upload_storage.save(content_addressed_name(content, upload.filename), content)
+    os.remove(path)
+    return name
+
+
+def abandoned_parts():
+    """(upload id, path) of the part files no chunk was written to for CHUNKED_UPLOAD_EXPIRY"""
+    try:
+        names = os.listdir(settings.CHUNKED_UPLOAD_DIR)
+    except FileNotFoundError:
+        return []
+    expired = time.time() - settings.CHUNKED_UPLOAD_EXPIRY
+    parts = []
+    for name in names:
+        pk, ext = os.path.splitext(name)
+        path = os.path.join(settings.CHUNKED_UPLOAD_DIR, name)
+        if ext == '.part' and pk.isdigit() and os.path.getmtime(path) < expired:
+            parts.append((int(pk), path))
+    return parts
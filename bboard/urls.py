@@ -1,7 +1,7 @@
 from django.urls import path, include
 from rest_framework import routers
 
-from bboard import views
+from bboard import views, async_views
 from .yasg import urlpatterns as doc_urls
 
 
@@ -9,9 +9,19 @@ router = routers.DefaultRouter()
 router.register(r'posts', views.PostViewSet, basename='posts')
 router.register(r'comment', views.CommentCreateView, basename='comment')
 router.register(r'private', views.PrivatePageView, basename='private')
+router.register(r'uploads', views.UploadViewSet, basename='uploads')
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('sync/', views.sync, name='sync'),
+    path('exports/<slug:table>.<slug:file_format>.gz', views.export, name='export'),
+    path('subscriptions/', views.subscriptions, name='subscriptions'),
+    path('metrics/', views.metrics, name='metrics'),
+    # Async read endpoints for ASGI deployments
+    path('async/posts/', async_views.post_list, name='async-posts-list'),
+    path('async/posts/<int:pk>/', async_views.post_detail, name='async-posts-detail'),
+    path('async/comment/', async_views.comment_list, name='async-comment-list'),
+    path('async/comment/<int:pk>/', async_views.comment_detail, name='async-comment-detail'),
 ]
 # Include swagger docs
 urlpatterns += doc_urls
@@ -1,63 +1,186 @@
+import re
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import viewsets, permissions
+from djoser import views as djoser_views
+from rest_framework.authentication import TokenAuthentication
+from rest_framework import viewsets, mixins, permissions, status, filters, serializers
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.exceptions import NotFound
+from rest_framework.generics import get_object_or_404
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
-from bboard.models import Post, Comment
+from bboard.cache import CachedResponseMixin
+from bboard.export import FORMATS, TABLES, export_filename, export_stream
+from bboard.metrics import SerializationMetricsMixin, registry
+from bboard.models import Post, Comment, Upload, User
+from bboard.pagination import CommentKeysetPagination, FeedPagination
+from bboard.search import search_posts
 from bboard.permissions import IsOwnerOrReadOnly
+from bboard.replica import ReplicaReadMixin
 from bboard.serializers import (PostListSerializer,
                                 PostDetailSerializer,
                                 CommentCreateSerializer,
                                 CommentSerializer,
                                 PostCreateSerializer,
-                                PrivatePageSerializer)
-from bboard.service import CommentFilter
+                                PrivatePageSerializer,
+                                BulkIdsSerializer,
+                                UploadSerializer,
+                                ClaimsTokenObtainPairSerializer,
+                                ClaimsTokenRefreshSerializer,
+                                SubscriptionsSerializer,
+                                field_lookups,
+                                values_lookups)
+from bboard.service import CommentFilter, PostCommentFilter
+from bboard.signals import posts_changed, comments_created, comments_accepted, queue_thumbnails
+from bboard.stream import CommentStream, EventStreamRenderer
+from bboard.sync import changes, decode_cursor
+from bboard.throttling import ReadRateThrottle, PostCreateRateThrottle, CommentCreateRateThrottle
+from bboard.uploads import append_chunk, finish_upload
 
 
-class PostViewSet(viewsets.ModelViewSet):
+class PostViewSet(SerializationMetricsMixin, ReplicaReadMixin, CachedResponseMixin, viewsets.ModelViewSet):
     """CRUD for Post model"""
     queryset = Post.objects.all()
+    pagination_class = FeedPagination
+    filter_backends = (filters.OrderingFilter,)
+    ordering_fields = ('created', 'comment_count', 'accepted_comment_count', 'last_comment_at')
+    throttle_classes = [ReadRateThrottle, PostCreateRateThrottle]
+    replica_actions = ('list', 'retrieve', 'comments')
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'retrieve':
+            # Only the columns of the requested fields
+            serializer = self.get_serializer()
+            return queryset.only(*serializer.model_field_names())
+        elif self.action in ('list', 'search'):
+            # Rows for the fast path of PostListSerializer, keyset pagination reads created and id
+            lookups = field_lookups(self.get_serializer())
+            return queryset.values(*dict.fromkeys(lookups + ('created', 'id')))
+        elif self.action == 'comments':
+            return Comment.objects.filter(post_id=self.kwargs['pk']).values(*values_lookups(CommentSerializer))
+        return queryset
 
     def get_serializer_class(self):
         if self.action == "retrieve":
             return PostDetailSerializer
         elif self.action == 'create':
             return PostCreateSerializer
+        elif self.action == 'bulk':
+            return BulkIdsSerializer if self.request.method == 'DELETE' else PostCreateSerializer
+        elif self.action == 'comments':
+            return CommentSerializer
         else:
             return PostListSerializer
 
     def get_permissions(self):
-        if self.action == 'create':
+        if self.action in ('create', 'bulk'):
             permission_classes = [permissions.IsAuthenticated]
         else:
             permission_classes = [IsOwnerOrReadOnly]
         return [permission() for permission in permission_classes]
 
     def perform_create(self, serializer):
-        serializer.save(owner=self.request.user)
+        serializer.save(owner_id=self.request.user.pk)
+
+    @action(detail=False, pagination_class=PageNumberPagination)
+    def search(self, request):
+        """Full-text search in title and text by `q`, best matches first"""
+        queryset = search_posts(request.query_params.get('q', ''), self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=True, pagination_class=CommentKeysetPagination)
+    def comments(self, request, pk=None):
+        """Comments of the Post by `cursor` pages, `accepted` filter, `ordering` created or -created"""
+        get_object_or_404(Post.objects.only('pk'), pk=pk)
+        filterset = PostCommentFilter(request.query_params, queryset=self.get_queryset(), request=request)
+        if not filterset.is_valid():
+            raise serializers.ValidationError(filterset.errors)
+        queryset = filterset.qs
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['post', 'patch', 'delete'])
+    def bulk(self, request):
+        """Create (list of Posts), update (list of Posts with id) or delete (ids) many Posts at once"""
+        if request.method == 'POST':
+            serializer = self.get_serializer(data=request.data, many=True)
+            serializer.is_valid(raise_exception=True)
+            posts = serializer.save(owner_id=request.user.pk)
+            posts_changed([post.pk for post in posts])
+            queue_thumbnails(posts)
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+        queryset = self.get_queryset()
+        if not request.user.is_staff:
+            queryset = queryset.filter(owner_id=request.user.pk)
+
+        if request.method == 'PATCH':
+            items = request.data if isinstance(request.data, list) else []
+            ids = [item.get('id') for item in items if isinstance(item, dict)]
+            instances = queryset.filter(pk__in=[pk for pk in ids if isinstance(pk, int)])
+            serializer = self.get_serializer(instances, data=request.data, many=True, partial=True)
+            serializer.is_valid(raise_exception=True)
+            posts = serializer.save()
+            posts_changed([post.pk for post in posts])
+            queue_thumbnails(posts)
+            return Response(serializer.data)
 
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        queryset.filter(pk__in=serializer.validated_data['ids']).delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
-class CommentCreateView(viewsets.ModelViewSet):
+
+class CommentCreateView(SerializationMetricsMixin, ReplicaReadMixin, viewsets.ModelViewSet):
     """Write a comment"""
     queryset = Comment.objects.all()
     serializer_class = CommentCreateSerializer
     permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [ReadRateThrottle, CommentCreateRateThrottle]
 
     def perform_create(self, serializer):
-        serializer.save(owner=self.request.user)
+        serializer.save(owner_id=self.request.user.pk)
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """Write many comments at once"""
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        comments = serializer.save(owner_id=request.user.pk)
+        comments_created(comments)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
-class PrivatePageView(viewsets.ModelViewSet):
+class PrivatePageView(SerializationMetricsMixin, ReplicaReadMixin, viewsets.ModelViewSet):
     """Private page where User can see only comments to his Posts"""
     filter_backends = (DjangoFilterBackend,)
     filterset_class = CommentFilter
+    pagination_class = FeedPagination
     permission_classes = [IsOwnerOrReadOnly]
 
     def get_queryset(self):
-        user_comments = Comment.objects.filter(post__owner=self.request.user)
+        user_comments = Comment.objects.filter(post__owner_id=self.request.user.pk)
+        if self.action == 'list':
+            return user_comments.values(*values_lookups(CommentSerializer))
         return user_comments
 
     def get_serializer_class(self):
         if self.action == 'list':
             return CommentSerializer
+        elif self.action == 'accept':
+            return BulkIdsSerializer
         elif self.action == 'update' or 'destroy' or 'retrieve' or 'partial_update':
             return PrivatePageSerializer
 
@@ -67,3 +190,133 @@ class PrivatePageView(viewsets.ModelViewSet):
         else:
             permission_classes = [permissions.IsAuthenticated]
         return [permission() for permission in permission_classes]
+
+    @action(detail=False, methods=['post'])
+    def accept(self, request):
+        """Accept many comments to own Posts with one UPDATE"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        comments = list(
+            self.get_queryset().filter(pk__in=serializer.validated_data['ids'], accepted=False).only('pk', 'post_id')
+        )
+        with transaction.atomic():
+            Comment.objects.filter(pk__in=[comment.pk for comment in comments]).update(
+                accepted=True, updated_at=timezone.now()
+            )
+            comments_accepted(comments)
+        return Response({'accepted': len(comments)})
+
+    @action(detail=False, renderer_classes=[EventStreamRenderer])
+    def stream(self, request):
+        """Server-sent events with new comments to own Posts, resumes after Last-Event-ID"""
+        last_id = request.META.get('HTTP_LAST_EVENT_ID') or request.query_params.get('last_event_id')
+        if last_id is not None:
+            try:
+                last_id = int(last_id)
+            except ValueError:
+                raise serializers.ValidationError({'last_event_id': 'A valid integer is required.'})
+        if isinstance(request._request, ASGIRequest):
+            # The stream blocks on a queue and queries the database, it would stall the event loop
+            return Response({'detail': 'Not available under ASGI.'}, status=status.HTTP_501_NOT_IMPLEMENTED)
+        stream = CommentStream.open(request.user.pk, last_id)
+        if stream is None:
+            return Response({'detail': 'Too many open streams, retry later.'},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            headers={'Retry-After': str(settings.COMMENT_STREAM_RETRY // 1000)})
+        response = StreamingHttpResponse(stream, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Tells nginx not to buffer the stream
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+class UploadViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """
+    Chunked resumable upload: create with `filename` and `size`, then PUT the
+    raw bytes of each chunk with `Content-Range: bytes start-end/size`.
+    GET tells the `offset` to resume from, a complete upload is attached to
+    a Post by its id in `upload_id`.
+    """
+    serializer_class = UploadSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    content_range = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+    def get_queryset(self):
+        return Upload.objects.filter(owner_id=self.request.user.pk)
+
+    def perform_create(self, serializer):
+        serializer.save(owner_id=self.request.user.pk)
+
+    def update(self, request, pk=None):
+        match = self.content_range.match(request.META.get('HTTP_CONTENT_RANGE', ''))
+        if match is None:
+            return Response({'detail': 'Content-Range header is required.'}, status=status.HTTP_400_BAD_REQUEST)
+        start, end, size = (int(value) for value in match.groups())
+        with transaction.atomic():
+            upload = self.get_queryset().select_for_update().get(pk=self.get_object().pk)
+            if size != upload.size or end < start or end >= size:
+                return Response({'detail': 'Invalid Content-Range.'},
+                                status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+            if upload.complete or start != upload.offset:
+                return Response(self.get_serializer(upload).data, status=status.HTTP_409_CONFLICT)
+            # Read straight from the request stream, the chunk is never held in memory
+            upload.offset += append_chunk(upload, request.stream, end - start + 1)
+            if upload.offset == upload.size:
+                upload.file = finish_upload(upload)
+            upload.save(update_fields=['offset', 'file'])
+        return Response(self.get_serializer(upload).data)
+
+
+class ClaimsTokenObtainPairView(TokenObtainPairView):
+    """Issue JWTs carrying username and is_staff claims"""
+    serializer_class = ClaimsTokenObtainPairSerializer
+
+
+class ClaimsTokenRefreshView(TokenRefreshView):
+    """Refresh JWTs with the claims read again from the User row"""
+    serializer_class = ClaimsTokenRefreshSerializer
+
+
+class UserViewSet(djoser_views.UserViewSet):
+    """djoser user endpoints authenticate with the User row, they read and save it"""
+    authentication_classes = [JWTAuthentication, TokenAuthentication]
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def export(request, table, file_format):
+    """Gzipped NDJSON or CSV dump of a whole table, streamed as it is read"""
+    if table not in TABLES or file_format not in FORMATS:
+        raise NotFound()
+    response = StreamingHttpResponse(export_stream(table, file_format), content_type='application/gzip')
+    response['Content-Disposition'] = f'attachment; filename="{export_filename(table, file_format)}"'
+    return response
+
+
+@api_view(['GET'])
+@permission_classes([permissions.AllowAny])
+def sync(request):
+    """Posts and comments created, changed or deleted since the `since` cursor of the last response"""
+    cursor = decode_cursor(request.query_params.get('since'))
+    return Response(changes(cursor, settings.SYNC_BATCH_SIZE, {'request': request}))
+
+
+@api_view(['GET', 'PUT'])
+@permission_classes([permissions.IsAuthenticated])
+def subscriptions(request):
+    """Categories the user follows in the weekly digest"""
+    # request.user may be built from token claims, the row is read here
+    user = get_object_or_404(User, pk=request.user.pk)
+    if request.method == 'GET':
+        return Response(SubscriptionsSerializer(user).data)
+    serializer = SubscriptionsSerializer(user, data=request.data)
+    serializer.is_valid(raise_exception=True)
+    serializer.save()
+    return Response(serializer.data)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def metrics(request):
+    """Per-view request metrics in Prometheus text format"""
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')